@@ -0,0 +1,117 @@
+import logging
+import time
+
+import vlc
+
+logger = logging.getLogger(__name__)
+
+
+class PlayerClock:
+    """Estimates a VLC player's position between the coarse steps in which get_time advances."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.last_time = None
+        self.changed_at = None
+
+    def position(self, player, now: float) -> float or None:
+        player_time = player.get_time()
+        if player_time < 0:
+            return None
+        if player_time != self.last_time:
+            self.last_time = player_time
+            self.changed_at = now
+        # Never extrapolate further than VLC's own update step, in case the player stalled
+        elapsed = min(now - self.changed_at, 0.5)
+        return player_time + elapsed * 1000 * (player.get_rate() or 1.0)
+
+
+class AVSyncEngine:
+    """
+    Keeps a follower VLC player in step with a leader, for playing separate video and audio streams.
+    Small drift is corrected smoothly by nudging the follower's playback rate, large drift with a seek.
+    """
+
+    def __init__(self, deadband_ms: float = 30, hard_seek_ms: float = 400, correction_ms: float = 2000,
+                 max_rate_nudge: float = 0.05, log_interval: float = 30):
+        """
+        Args:
+            deadband_ms (float): Drift that is left alone.
+            hard_seek_ms (float): Drift above which the follower is seeked instead of nudged.
+            correction_ms (float): Time over which a nudge aims to close the drift.
+            max_rate_nudge (float): Largest change of the follower's rate away from 1.0.
+            log_interval (float): Seconds between drift statistics log lines.
+        """
+        self.deadband_ms = deadband_ms
+        self.hard_seek_ms = hard_seek_ms
+        self.correction_ms = correction_ms
+        self.max_rate_nudge = max_rate_nudge
+        self.log_interval = log_interval
+        self.leader_clock = PlayerClock()
+        self.follower_clock = PlayerClock()
+        self.follower_rate = 1.0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.samples = 0
+        self.total_abs_drift = 0.0
+        self.max_abs_drift = 0.0
+        self.hard_seeks = 0
+        self.rate_changes = 0
+        self.last_log = time.monotonic()
+
+    def reset(self, follower=None):
+        """Forgets the clock history, after new media or a seek, and restores the follower's normal rate."""
+        self.leader_clock.reset()
+        self.follower_clock.reset()
+        if follower is not None and self.follower_rate != 1.0:
+            follower.set_rate(1.0)
+        self.follower_rate = 1.0
+
+    def set_follower_rate(self, follower, rate: float):
+        if abs(rate - self.follower_rate) >= 0.002:
+            follower.set_rate(rate)
+            self.follower_rate = rate
+            self.rate_changes += 1
+
+    def tick(self, leader, follower) -> float or None:
+        """Measures the drift of the follower against the leader and corrects it. Returns the drift in ms."""
+        if leader.get_state() != vlc.State.Playing or follower.get_state() != vlc.State.Playing:
+            return None
+        now = time.monotonic()
+        leader_position = self.leader_clock.position(leader, now)
+        follower_position = self.follower_clock.position(follower, now)
+        if leader_position is None or follower_position is None:
+            return None
+
+        # Positive drift means the follower is ahead of the leader
+        drift = follower_position - leader_position
+        self.samples += 1
+        self.total_abs_drift += abs(drift)
+        self.max_abs_drift = max(self.max_abs_drift, abs(drift))
+
+        # The leader's rate may itself be nudged to follow Spotify, so corrections are relative to it
+        leader_rate = leader.get_rate() or 1.0
+        if abs(drift) > self.hard_seek_ms:
+            follower.set_time(int(leader_position))
+            self.follower_clock.reset()
+            self.set_follower_rate(follower, leader_rate)
+            self.hard_seeks += 1
+        elif abs(drift) > self.deadband_ms:
+            nudge = max(-self.max_rate_nudge, min(self.max_rate_nudge, drift / self.correction_ms))
+            self.set_follower_rate(follower, leader_rate * (1.0 - nudge))
+        else:
+            self.set_follower_rate(follower, leader_rate)
+
+        if now - self.last_log >= self.log_interval:
+            self.log_stats()
+        return drift
+
+    def log_stats(self):
+        if self.samples:
+            logger.info("A/V drift over %s samples: mean %.0f ms, max %.0f ms, %s rate changes, %s hard seeks",
+                        self.samples, self.total_abs_drift / self.samples, self.max_abs_drift,
+                        self.rate_changes, self.hard_seeks)
+        self.reset_stats()
@@ -0,0 +1,64 @@
+import logging
+import threading
+from collections import OrderedDict
+
+from PyQt5 import QtCore
+
+logger = logging.getLogger(__name__)
+
+
+class EventBus(QtCore.QObject):
+    """
+    Spotify listener that hands events over to the Qt main thread through a queued signal.
+    Events that arrive while a delivery is pending are coalesced so listeners only see the latest state.
+    """
+    events_pending = QtCore.pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.listeners = []
+        self.pending = OrderedDict()
+        self.lock = threading.Lock()
+        self.events_pending.connect(self._dispatch, QtCore.Qt.QueuedConnection)
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def notify(self, event_type: str, currently_playing: dict):
+        """Queues an event for delivery on the Qt main thread. Safe to call from any thread."""
+        state = dict(currently_playing) if currently_playing else None
+        with self.lock:
+            schedule = not self.pending
+            self._coalesce(event_type, state)
+        if schedule:
+            self.events_pending.emit()
+
+    def _coalesce(self, event_type: str, state: dict):
+        pending_update = self.pending.get('track_update')
+        if event_type == 'track_scrub' and pending_update and state and pending_update['track_id'] == state['track_id']:
+            # The pending track update will start from the scrubbed position anyway
+            self.pending['track_update'] = state
+            return
+        if event_type == 'track_update':
+            self.pending.pop('track_scrub', None)
+        elif event_type in ('play', 'pause'):
+            self.pending.pop('play', None)
+            self.pending.pop('pause', None)
+        # Re-inserting keeps only the latest state and moves the event to the back of the queue
+        self.pending.pop(event_type, None)
+        self.pending[event_type] = state
+
+    @QtCore.pyqtSlot()
+    def _dispatch(self):
+        with self.lock:
+            events = list(self.pending.items())
+            self.pending.clear()
+        for event_type, state in events:
+            for listener in list(self.listeners):
+                try:
+                    listener.notify(event_type, state)
+                except Exception as e:
+                    logger.error("Error in listener %s handling %s: %s", type(listener).__name__, event_type, e)
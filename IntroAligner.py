@@ -0,0 +1,203 @@
+import glob
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5 import QtCore
+
+from SettingsPanel import get_settings, data_location
+from Metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 8000
+FRAME_RATE = 100  # Onset envelope frames per second, so offsets are found to 10 ms
+
+
+def decode_audio(source: str, start: float, duration: float, ffmpeg: str = 'ffmpeg', timeout: float = 30):
+    """Decodes a window of a file's or URL's audio to mono 16-bit samples at SAMPLE_RATE, as a float array."""
+    import numpy as np
+
+    command = [ffmpeg, '-nostdin', '-v', 'error', '-threads', '1', '-ss', str(start), '-t', str(duration),
+               '-i', source, '-vn', '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 's16le', '-']
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout, check=True)
+    return np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32)
+
+
+def onset_envelope(samples, rate: int = SAMPLE_RATE):
+    """
+    Returns the rise in log energy of each 10 ms frame, normalized to zero mean and unit variance. Onsets survive
+    the different mixes, mastering and levels of a video and its album track where the raw waveforms don't.
+    """
+    import numpy as np
+
+    hop = rate // FRAME_RATE
+    frames = samples[:len(samples) // hop * hop].reshape(-1, hop)
+    energy = np.log1p((frames ** 2).mean(axis=1))
+    onsets = np.maximum(np.diff(energy, prepend=energy[:1]), 0)
+    std = onsets.std()
+    return (onsets - onsets.mean()) / std if std else onsets - onsets.mean()
+
+
+def find_offset(haystack, needle) -> tuple:
+    """
+    Finds where an envelope best lines up inside a longer one by FFT cross-correlation.
+    Returns (frame the needle starts at, confidence as the peak's distance from the median in standard deviations).
+    """
+    import numpy as np
+
+    size = 1 << int(len(haystack) + len(needle) - 1).bit_length()
+    correlation = np.fft.irfft(np.fft.rfft(haystack, size) * np.conj(np.fft.rfft(needle, size)), size)
+    # Only lags where the needle lies wholly inside the haystack
+    correlation = correlation[:len(haystack) - len(needle) + 1]
+    if not len(correlation):
+        return 0, 0.0
+    peak = int(np.argmax(correlation))
+    spread = correlation.std()
+    return peak, float((correlation[peak] - np.median(correlation)) / spread) if spread else 0.0
+
+
+class IntroAligner(QtCore.QObject):
+    """
+    Detects how far into a music video the song starts, for videos with a cold open or skit, by cross-correlating
+    the onsets of the start of the video's audio with reference audio of the track. Offsets are cached per track
+    and video. Detection runs on a single background worker so it stays off the UI thread and within one core.
+
+    Reference audio is looked up as REFERENCE_AUDIO_DIR/<track id>.* (any format ffmpeg reads), starting at the
+    beginning of the track, or provided by the `reference` callable.
+    """
+    aligned = QtCore.pyqtSignal(str, str, float)
+    _found = QtCore.pyqtSignal(str, str, float)
+
+    def __init__(self, path: str = None, reference=None, parent=None):
+        """
+        Args:
+            path (str): File the offsets are cached in.
+            reference: Callable returning (source, seconds into the track the source starts at) for a track, or None.
+        """
+        super().__init__(parent)
+        settings = get_settings()
+        self.enabled = settings.get('INTRO_ALIGNMENT', True)
+        self.ffmpeg = shutil.which(settings.get('FFMPEG', 'ffmpeg'))
+        self.reference_dir = settings.get('REFERENCE_AUDIO_DIR') or data_location('reference_audio')
+        self.window = float(settings.get('ALIGN_WINDOW', 60))
+        self.reference_length = float(settings.get('ALIGN_REFERENCE_LENGTH', 20))
+        # The reference is taken this far into the track, so videos that cut the song's start are found too
+        self.reference_start = float(settings.get('ALIGN_REFERENCE_START', 10))
+        self.min_confidence = float(settings.get('ALIGN_MIN_CONFIDENCE', 8))
+        self.reference = reference or self.reference_file
+        self.path = path or data_location('intro_offsets.json')
+        self.offsets = {}  # "track id:video id" -> offset in ms, or None when no offset could be found
+        self.pending = set()
+        self.reported_no_reference = False
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='align')
+        self._found.connect(self.aligned, QtCore.Qt.QueuedConnection)
+        if self.enabled and not self.ffmpeg:
+            logger.info("ffmpeg not found, intro alignment is disabled")
+            self.enabled = False
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self.offsets = json.load(f)
+        except (OSError, IOError, ValueError) as e:
+            logger.warning("Error reading intro offsets: %s", e)
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            data = dict(self.offsets)
+        try:
+            # Written to a temporary file first, so a crash mid-write can't leave a truncated file
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except (OSError, IOError) as e:
+            logger.warning("Error writing intro offsets: %s", e)
+
+    @staticmethod
+    def key(track_id: str, video_id: str) -> str:
+        return f"{track_id}:{video_id}"
+
+    def reference_file(self, track: dict) -> tuple or None:
+        matches = glob.glob(os.path.join(glob.escape(self.reference_dir), f"{glob.escape(track['track_id'])}.*"))
+        return (matches[0], 0.0) if matches else None
+
+    def offset(self, track_id: str, video_id: str) -> float or None:
+        """Returns the cached offset in ms of the song in the video, or None if it is not known."""
+        with self.lock:
+            return self.offsets.get(self.key(track_id, video_id))
+
+    def align(self, track: dict, video: dict, audio_source: str) -> float or None:
+        """
+        Returns the cached offset for a video, otherwise starts detecting it and emits `aligned` with
+        (track id, video id, offset in ms) on the Qt thread when it is found.
+        Args:
+            audio_source (str): The video's audio or combined stream URL, or a local file.
+        """
+        if not self.enabled or not video or not audio_source:
+            return None
+        key = self.key(track['track_id'], video['id'])
+        with self.lock:
+            if key in self.offsets or key in self.pending:
+                return self.offsets.get(key)
+            self.pending.add(key)
+        self.executor.submit(self._detect, track, video, audio_source)
+        return None
+
+    def _detect(self, track: dict, video: dict, audio_source: str):
+        key = self.key(track['track_id'], video['id'])
+        offset_ms = None
+        try:
+            reference = self.reference(track)
+            if not reference:
+                if not self.reported_no_reference:
+                    self.reported_no_reference = True
+                    logger.info("No reference audio for %s, only tracks with reference audio in %s are aligned",
+                                track['track'], self.reference_dir)
+                else:
+                    logger.debug("No reference audio for %s", track['track'])
+                return
+            with metrics.span('intro_alignment_seconds'):
+                offset_ms = self.detect(audio_source, *reference)
+            with self.lock:
+                self.offsets[key] = offset_ms
+            self.save()
+            if offset_ms is not None:
+                logger.info("Song starts %.2f s into %s", offset_ms / 1000, video['title'])
+                self._found.emit(track['track_id'], video['id'], offset_ms)
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning("Error aligning %s: %s", video['title'], e)
+        except Exception as e:
+            logger.error("Error aligning %s: %s", video['title'], e)
+        finally:
+            with self.lock:
+                self.pending.discard(key)
+
+    def detect(self, audio_source: str, reference_source: str, reference_position: float = 0.0) -> float or None:
+        """
+        Returns the position in ms of the track's start in the video, negative if the video cuts the start,
+        or None if the reference can't be found confidently in the start of the video.
+        Args:
+            reference_position (float): Seconds into the track the reference source starts at.
+        """
+        skip = max(0.0, self.reference_start - reference_position)
+        reference = onset_envelope(decode_audio(reference_source, skip, self.reference_length, self.ffmpeg))
+        video = onset_envelope(decode_audio(audio_source, 0, self.window, self.ffmpeg))
+        if len(reference) < FRAME_RATE * 5 or len(video) <= len(reference):
+            return None
+        frame, confidence = find_offset(video, reference)
+        logger.debug("Alignment peak at %.2f s, confidence %.1f", frame / FRAME_RATE, confidence)
+        if confidence < self.min_confidence:
+            return None
+        return round((frame / FRAME_RATE - reference_position - skip) * 1000)
@@ -0,0 +1,374 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import shutil
+import threading
+import urllib.request
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from SettingsPanel import get_settings, data_location
+
+logger = logging.getLogger(__name__)
+
+
+class SegmentCache:
+    """
+    On-disk cache of fixed size segments of remote media files, with a total size cap and LRU eviction.
+    A file's directory and metadata are removed along with its last segment.
+    """
+
+    def __init__(self, directory: str = None, max_bytes: int = None, segment_size: int = 1024 * 1024, on_evict=None):
+        """
+        Args:
+            on_evict: Called with a file's key once its last segment has been evicted.
+        """
+        settings = get_settings()
+        self.directory = directory or data_location('media_cache')
+        self.max_bytes = int(max_bytes or int(settings.get('MEDIA_CACHE_MB', 2048)) * 1024 * 1024)
+        self.segment_size = segment_size
+        self.on_evict = on_evict
+        self.lock = threading.Lock()
+        self.segments = OrderedDict()  # (key, index) -> size, least recently used first
+        self.key_segments = {}  # key -> number of cached segments
+        self.total_bytes = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        found = []
+        for key in os.listdir(self.directory):
+            key_dir = os.path.join(self.directory, key)
+            if not os.path.isdir(key_dir):
+                if key.endswith('.tmp'):
+                    # Left over from an interrupted write
+                    os.remove(key_dir)
+                continue
+            segments = [name for name in os.listdir(key_dir) if name.endswith('.seg')]
+            if not segments:
+                shutil.rmtree(key_dir, ignore_errors=True)
+            for name in segments:
+                path = os.path.join(key_dir, name)
+                found.append((os.path.getmtime(path), key, int(name[:-4]), os.path.getsize(path)))
+        for _, key, index, size in sorted(found):
+            self._add(key, index, size)
+
+    def _segment_path(self, key: str, index: int) -> str:
+        return os.path.join(self.directory, key, f"{index}.seg")
+
+    def _add(self, key: str, index: int, size: int):
+        old_size = self.segments.pop((key, index), None)
+        if old_size is None:
+            self.key_segments[key] = self.key_segments.get(key, 0) + 1
+        self.total_bytes += size - (old_size or 0)
+        self.segments[(key, index)] = size
+
+    def _drop(self, key: str, index: int) -> bool:
+        """Forgets a segment, removing its file's directory if it was the last one. Returns whether it was."""
+        size = self.segments.pop((key, index), None)
+        if size is None:
+            return False
+        self.total_bytes -= size
+        self.key_segments[key] -= 1
+        if self.key_segments[key]:
+            try:
+                os.remove(self._segment_path(key, index))
+            except OSError:
+                pass
+            return False
+        del self.key_segments[key]
+        shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+        return True
+
+    def read_meta(self, key: str) -> dict or None:
+        try:
+            with open(os.path.join(self.directory, key, 'meta.json'), 'r') as f:
+                return json.load(f)
+        except (OSError, IOError, json.JSONDecodeError):
+            return None
+
+    def write_meta(self, key: str, meta: dict):
+        with self.lock:
+            os.makedirs(os.path.join(self.directory, key), exist_ok=True)
+            with open(os.path.join(self.directory, key, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+
+    def read(self, key: str, index: int, start: int = 0, end: int = None) -> bytes or None:
+        """Returns bytes [start, end) of a cached segment, or None if the segment is not cached."""
+        with self.lock:
+            if (key, index) not in self.segments:
+                return None
+            self.segments.move_to_end((key, index))
+        try:
+            with open(self._segment_path(key, index), 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return b''
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return mapped[start:end]
+        except (OSError, IOError, ValueError):
+            with self.lock:
+                emptied = self._drop(key, index)
+            if emptied and self.on_evict:
+                self.on_evict(key)
+            return None
+
+    def write(self, key: str, index: int, data: bytes):
+        # Written next to the file directories and moved in under the lock, so evicting the file can't race it
+        tmp_path = os.path.join(self.directory, f"{key}-{index}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        with self.lock:
+            os.makedirs(os.path.join(self.directory, key), exist_ok=True)
+            os.replace(tmp_path, self._segment_path(key, index))
+            self._add(key, index, len(data))
+            emptied = []
+            while self.total_bytes > self.max_bytes and len(self.segments) > 1:
+                old_key, old_index = next(iter(self.segments))
+                if self._drop(old_key, old_index):
+                    emptied.append(old_key)
+        if self.on_evict:
+            for old_key in emptied:
+                self.on_evict(old_key)
+
+    def clear(self):
+        with self.lock:
+            self.segments.clear()
+            self.key_segments.clear()
+            self.total_bytes = 0
+            shutil.rmtree(self.directory, ignore_errors=True)
+            os.makedirs(self.directory, exist_ok=True)
+
+
+class MediaProxy:
+    """
+    Local HTTP proxy that serves byte-range requests for remote media out of a SegmentCache,
+    fetching missing segments from the upstream URL and passing them on to the player as they arrive.
+    """
+    CONTENT_RANGE_PATTERN = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+    RANGE_PATTERN = re.compile(r'bytes=(\d*)-(\d*)')
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, cache: SegmentCache = None, host: str = '127.0.0.1', port: int = 0, max_upstreams: int = 256):
+        """
+        Args:
+            max_upstreams (int): How many upstream URLs to remember; the least recently used are forgotten first.
+        """
+        self.cache = cache or SegmentCache()
+        self.cache.on_evict = self.forget
+        self.max_upstreams = max_upstreams
+        self.upstreams = OrderedDict()  # key -> upstream URL, least recently used first
+        self.fetch_locks = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def address(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='media-proxy', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @staticmethod
+    def cache_key(url: str) -> str:
+        """Returns a key that stays the same when YouTube re-signs the URL of the same stream."""
+        params = parse_qs(urlparse(url).query)
+        if 'id' in params and 'itag' in params:
+            return re.sub(r'[^\w.-]', '_', f"{params['id'][0]}-{params['itag'][0]}")
+        return hashlib.sha1(url.encode()).hexdigest()
+
+    def url_for(self, upstream_url: str) -> str:
+        """Returns the proxy URL to give VLC in place of the upstream URL."""
+        key = self.cache_key(upstream_url)
+        with self.lock:
+            self.upstreams.pop(key, None)
+            self.upstreams[key] = upstream_url
+            while len(self.upstreams) > self.max_upstreams:
+                self._drop_fetch_locks(self.upstreams.popitem(last=False)[0])
+        return f"{self.address}/media/{key}"
+
+    def upstream(self, key: str) -> str or None:
+        with self.lock:
+            if key in self.upstreams:
+                self.upstreams.move_to_end(key)
+            return self.upstreams.get(key)
+
+    def forget(self, key: str):
+        """Forgets the upstream URL of a file whose segments have all been evicted."""
+        with self.lock:
+            self.upstreams.pop(key, None)
+            self._drop_fetch_locks(key)
+
+    def _drop_fetch_locks(self, key: str):
+        # Locks left behind by failed fetches of a file that is no longer served
+        for fetch_key in [fetch_key for fetch_key in self.fetch_locks if fetch_key[0] == key]:
+            del self.fetch_locks[fetch_key]
+
+    def _open(self, key: str, start: int, end: int) -> tuple:
+        """
+        Requests bytes [start, end] from upstream.
+        Returns (response, total length, content type, bytes to skip if the server ignored the range).
+        """
+        request = urllib.request.Request(self.upstream(key), headers={'Range': f"bytes={start}-{end}"})
+        response = urllib.request.urlopen(request, timeout=30)
+        match = self.CONTENT_RANGE_PATTERN.match(response.headers.get('Content-Range', ''))
+        if match and match.group(3) != '*':
+            return response, int(match.group(3)), response.headers.get('Content-Type', 'application/octet-stream'), 0
+        # The server ignored the range and sends the whole file
+        total = int(response.headers.get('Content-Length') or 0)
+        return response, total, response.headers.get('Content-Type', 'application/octet-stream'), start
+
+    def _fetch(self, key: str, start: int, end: int, on_data=None) -> bytes:
+        """Fetches bytes [start, end] from upstream, passing each chunk to `on_data` as it arrives."""
+        response, _, _, skip = self._open(key, start, end)
+        chunks, remaining = [], end - start + 1
+        with response:
+            while remaining > 0:
+                chunk = response.read1(min(self.CHUNK_SIZE, skip + remaining))
+                if not chunk:
+                    break
+                if skip:
+                    dropped = min(skip, len(chunk))
+                    chunk, skip = chunk[dropped:], skip - dropped
+                    if not chunk:
+                        continue
+                chunks.append(chunk)
+                remaining -= len(chunk)
+                if on_data:
+                    on_data(chunk)
+        if remaining > 0:
+            # The connection dropped early, so the segment mustn't be cached
+            raise IOError(f"Upstream closed after {end - start + 1 - remaining} of {end - start + 1} bytes")
+        return b''.join(chunks)
+
+    def meta(self, key: str) -> dict:
+        meta = self.cache.read_meta(key)
+        if meta is None:
+            # Only the headers are read here, the first segment is streamed like the others
+            response, total, content_type, _ = self._open(key, 0, 0)
+            response.close()
+            meta = {'length': total, 'content_type': content_type}
+            self.cache.write_meta(key, meta)
+        return meta
+
+    def _fetch_lock(self, key: str, index: int) -> threading.Lock:
+        with self.lock:
+            return self.fetch_locks.setdefault((key, index), threading.Lock())
+
+    def segment(self, key: str, index: int, length: int, on_data=None) -> bytes:
+        """
+        Returns a whole segment, from the cache or fetched from upstream. `on_data` is passed the segment's bytes
+        in order, as they arrive when it is fetched, so the player doesn't wait for the whole segment.
+        """
+        data = self.cache.read(key, index)
+        if data is None:
+            fetch_lock = self._fetch_lock(key, index)
+            with fetch_lock:
+                data = self.cache.read(key, index)
+                if data is None:
+                    start = index * self.cache.segment_size
+                    end = min(start + self.cache.segment_size, length) - 1
+                    data = self._fetch(key, start, end, on_data)
+                    self.cache.write(key, index, data)
+                    # Only dropped once the segment is cached, so after a failed fetch the next caller still
+                    # waits its turn on this lock instead of fetching alongside the others
+                    with self.lock:
+                        self.fetch_locks.pop((key, index), None)
+                    return data
+        if on_data:
+            on_data(data)
+        return data
+
+    def _make_handler(self):
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_HEAD(self):
+                self.handle_media(send_body=False)
+
+            def do_GET(self):
+                self.handle_media(send_body=True)
+
+            def handle_media(self, send_body: bool):
+                key = self.path.rsplit('/', 1)[-1]
+                if not self.path.startswith('/media/') or not proxy.upstream(key):
+                    self.send_error(404)
+                    return
+                try:
+                    meta = proxy.meta(key)
+                except Exception as e:
+                    logger.error("Media proxy upstream error: %s", e)
+                    self.send_error(502)
+                    return
+                length = meta['length']
+                start, end = 0, length - 1
+                match = proxy.RANGE_PATTERN.match(self.headers.get('Range', ''))
+                if match and (match.group(1) or match.group(2)):
+                    if match.group(1):
+                        start = int(match.group(1))
+                        end = min(int(match.group(2)), length - 1) if match.group(2) else length - 1
+                    else:
+                        start = max(0, length - int(match.group(2)))
+                    if start >= length or start > end:
+                        self.send_response(416)
+                        self.send_header('Content-Range', f"bytes */{length}")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header('Content-Range', f"bytes {start}-{end}/{length}")
+                else:
+                    self.send_response(200)
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('Content-Type', meta['content_type'])
+                self.send_header('Content-Length', str(end - start + 1))
+                self.end_headers()
+                if not send_body:
+                    return
+                self.send_range(key, start, end, length)
+
+            def segment_sink(self, first: int, last: int):
+                """Returns a callback that sends bytes [first, last] of the segment it is passed in order."""
+                offset = 0
+
+                def send(data: bytes):
+                    nonlocal offset
+                    part = data[max(first - offset, 0):max(last + 1 - offset, 0)]
+                    offset += len(data)
+                    if not part or self.disconnected:
+                        return
+                    try:
+                        self.wfile.write(part)
+                    except (BrokenPipeError, ConnectionResetError):
+                        # VLC drops connections whenever it seeks. The segment is still fetched to the end
+                        # and cached, so it isn't downloaded again.
+                        self.disconnected = True
+                return send
+
+            def send_range(self, key: str, start: int, end: int, length: int):
+                segment_size = proxy.cache.segment_size
+                self.disconnected = False
+                try:
+                    for index in range(start // segment_size, end // segment_size + 1):
+                        segment_start = index * segment_size
+                        proxy.segment(key, index, length, self.segment_sink(max(start - segment_start, 0),
+                                                                            end - segment_start))
+                        if self.disconnected:
+                            return
+                except Exception as e:
+                    logger.error("Media proxy error: %s", e)
+
+        return Handler
@@ -0,0 +1,200 @@
+import bisect
+import json
+import logging
+import logging.handlers
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from SettingsPanel import get_settings, data_location
+
+logger = logging.getLogger(__name__)
+# Span records go to their own logger, written as JSON lines to the metrics log only
+span_logger = logging.getLogger('spans')
+span_logger.propagate = False
+span_logger.setLevel(logging.WARNING)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    """Cumulative Prometheus style histogram, plus a rolling window of recent samples for quantiles."""
+
+    def __init__(self, name: str, description: str, buckets: tuple = DEFAULT_BUCKETS, window: int = 500):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+            self.recent.append(value)
+
+    def quantile(self, q: float) -> float or None:
+        with self.lock:
+            recent = sorted(self.recent)
+        if not recent:
+            return None
+        return recent[min(len(recent) - 1, int(q * len(recent)))]
+
+    def render(self) -> list:
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {count}')
+        lines.append(f"{self.name}_sum {total}")
+        lines.append(f"{self.name}_count {count}")
+        lines.append(f"# TYPE {self.name}_recent gauge")
+        for q in (0.5, 0.95):
+            value = self.quantile(q)
+            if value is not None:
+                lines.append(f'{self.name}_recent{{quantile="{q}"}} {value}')
+        return lines
+
+
+class Metrics:
+    """Registry of timing histograms and gauges, and the end-to-end trace of each zone's current track change."""
+
+    def __init__(self):
+        self.histograms = {}
+        self.gauge_sources = []
+        self.lock = threading.Lock()
+        self.traces = {}  # zone (None outside multi-zone mode) -> trace of its current track change
+
+    def histogram(self, name: str, description: str = '') -> Histogram:
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram(name, description or name)
+            return self.histograms[name]
+
+    def observe(self, name: str, seconds: float, **fields):
+        """Adds a duration to a histogram and writes it to the structured log."""
+        self.histogram(name).observe(seconds)
+        if span_logger.isEnabledFor(logging.INFO):
+            span_logger.info(json.dumps({'ts': time.time(), 'span': name, 'seconds': round(seconds, 6), **fields}))
+
+    @contextmanager
+    def span(self, name: str, **fields):
+        """Times the enclosed block into the named histogram."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **fields)
+
+    def add_gauges(self, source):
+        """Registers a callable returning a dict of gauge names to values, read on every scrape."""
+        self.gauge_sources.append(source)
+
+    def begin_track(self, track_id: str, zone: str = None):
+        """Starts the end-to-end trace of a zone's track change at the moment it is detected."""
+        with self.lock:
+            self.traces[zone] = {'track_id': track_id, 'started': time.perf_counter(), 'stages': set()}
+
+    def track_stage(self, stage: str, end: bool = False, zone: str = None):
+        """Records the time from a zone's track change being detected to a stage, once per track."""
+        with self.lock:
+            trace = self.traces.get(zone)
+            if not trace or stage in trace['stages']:
+                return
+            trace['stages'].add(stage)
+            if end:
+                del self.traces[zone]
+        fields = {'track_id': trace['track_id'], **({'zone': zone} if zone else {})}
+        self.observe(f"track_change_to_{stage}_seconds", time.perf_counter() - trace['started'], **fields)
+
+    def render(self) -> str:
+        with self.lock:
+            histograms = list(self.histograms.values())
+        lines = []
+        for histogram in histograms:
+            lines += histogram.render()
+        # Gauges may carry labels, e.g. one per zone, and the samples of each name must be grouped together
+        gauges = {}
+        for source in self.gauge_sources:
+            try:
+                for name, value in source().items():
+                    gauges.setdefault(name.split('{', 1)[0], []).append(f"{name} {value}")
+            except Exception as e:
+                logger.warning("Error reading gauges: %s", e)
+        for base_name, samples in gauges.items():
+            lines += [f"# TYPE {base_name} gauge"] + samples
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves the metrics in Prometheus text format on a local HTTP endpoint."""
+
+    def __init__(self, metrics: Metrics, port: int, host: str = '127.0.0.1'):
+        registry = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name='metrics', daemon=True).start()
+        host, port = self.server.server_address[:2]
+        logger.info("Metrics available at http://%s:%s/metrics", host, port)
+
+
+def configure_logging(level: str = 'INFO'):
+    """
+    Sets up levelled console logging, and the JSON lines metrics log unless METRICS_LOG is off. The metrics log
+    is rotated at METRICS_LOG_MB (default 10) keeping one old file, as it gets a record every poll.
+    """
+    logging.basicConfig(level=getattr(logging, level.upper(), logging.INFO),
+                        format='%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+    settings = get_settings()
+    if settings.get('METRICS_LOG', True):
+        path = data_location('metrics.jsonl')
+        if path:
+            max_bytes = int(float(settings.get('METRICS_LOG_MB', 10)) * 1024 * 1024)
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=1)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            span_logger.addHandler(handler)
+            span_logger.setLevel(logging.INFO)
+
+
+def start_metrics_server():
+    """Starts the metrics endpoint on METRICS_PORT (default 9464), unless it is set to 0."""
+    port = int(get_settings().get('METRICS_PORT', 9464))
+    if not port:
+        return None
+    try:
+        server = MetricsServer(metrics, port)
+        server.start()
+        return server
+    except OSError as e:
+        logger.warning("Could not start metrics endpoint on port %s: %s", port, e)
+        return None
+
+
+metrics = Metrics()
@@ -0,0 +1,142 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from SettingsPanel import get_settings, data_location
+from TrackResolver import TrackResolver
+
+logger = logging.getLogger(__name__)
+
+
+class OfflineManifest:
+    """Record of downloaded videos keyed by Spotify track id, stored next to the downloads."""
+
+    def __init__(self, directory: str = None):
+        self.directory = directory or get_settings().get('OFFLINE_DIR') or data_location('offline')
+        self.path = os.path.join(self.directory, 'manifest.json')
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self.entries = json.load(f)
+        except (OSError, IOError) as e:
+            logger.warning("Error reading offline manifest: %s", e)
+        except json.JSONDecodeError as e:
+            logger.warning("Error parsing offline manifest: %s", e)
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock:
+            data = json.dumps(self.entries, indent=1)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+    def get(self, track_id: str) -> dict or None:
+        with self.lock:
+            return self.entries.get(track_id)
+
+    def update(self, track_id: str, entry: dict):
+        with self.lock:
+            self.entries[track_id] = entry
+        self.save()
+
+    def local_file(self, track_id: str) -> str or None:
+        """Returns the downloaded file for a track if it exists."""
+        entry = self.get(track_id)
+        if entry and entry.get('status') == 'done' and entry.get('path') and os.path.exists(entry['path']):
+            return entry['path']
+        return None
+
+
+class OfflineDownloader:
+    """Downloads the videos for a playlist or the user's Liked Songs for playback without a network connection."""
+    # Combined formats only, so no ffmpeg is needed to merge separate streams
+    FORMAT = 'best[height<=720][vcodec!=none][acodec!=none]/18'
+
+    def __init__(self, spotify_player, resolver: TrackResolver, manifest: OfflineManifest = None, workers: int = 3):
+        self.spotify_player = spotify_player
+        self.resolver = resolver
+        self.manifest = manifest or OfflineManifest()
+        self.workers = workers
+
+    def _paginate(self, first_page) -> list:
+        """Collects the items of every page, waiting for the rate limiter before each request, the first included."""
+        self.spotify_player.throttle()
+        page = first_page()
+        items = []
+        while page:
+            items += page['items']
+            if not page.get('next'):
+                break
+            self.spotify_player.throttle()
+            page = self.spotify_player.sp.next(page)
+        return items
+
+    def playlist_tracks(self, playlist_id: str) -> list:
+        items = self._paginate(lambda: self.spotify_player.sp.playlist_items(playlist_id, additional_types=('track',)))
+        return [self.spotify_player.track_from_item(item['track']) for item in items
+                if item.get('track') and item['track'].get('id')]
+
+    def saved_tracks(self) -> list:
+        items = self._paginate(lambda: self.spotify_player.sp.current_user_saved_tracks(limit=50))
+        return [self.spotify_player.track_from_item(item['track']) for item in items if item['track'].get('id')]
+
+    def download_track(self, track: dict) -> dict:
+        """Picks and downloads the video for a track, unless it was downloaded by an earlier run."""
+        import yt_dlp
+
+        if self.manifest.local_file(track['track_id']):
+            return self.manifest.get(track['track_id'])
+        entry = {'track': track['track'], 'artists': track['artists'], 'status': 'failed'}
+        video = self.resolver.find_video(track)
+        if not video:
+            entry['error'] = 'no suitable video'
+            self.manifest.update(track['track_id'], entry)
+            return entry
+        entry['video_id'] = video['id']
+        opts = {
+            'format': self.FORMAT,
+            'outtmpl': os.path.join(self.manifest.directory, f"{track['track_id']}.%(ext)s"),
+            'quiet': True,
+            'no_warnings': True,
+            'noprogress': True,
+            'continuedl': True,  # Resume partial downloads of interrupted runs
+            'retries': 10,
+        }
+        try:
+            with yt_dlp.YoutubeDL(opts) as ydl:
+                info = ydl.extract_info(video['url'], download=True)
+                entry['path'] = ydl.prepare_filename(info)
+            entry['status'] = 'done'
+        except Exception as e:
+            entry['error'] = str(e)
+        self.manifest.update(track['track_id'], entry)
+        return entry
+
+    def run(self, tracks: list) -> dict:
+        """Downloads the tracks with a bounded worker pool. Returns the number of tracks per final status."""
+        pending = [track for track in tracks if not self.manifest.local_file(track['track_id'])]
+        logger.info("%s of %s tracks already downloaded", len(tracks) - len(pending), len(tracks))
+        counts = {'done': len(tracks) - len(pending), 'failed': 0}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='download') as executor:
+            futures = {executor.submit(self.download_track, track): track for track in pending}
+            for number, future in enumerate(as_completed(futures), 1):
+                track = futures[future]
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    entry = {'status': 'failed', 'error': str(e)}
+                counts[entry['status']] += 1
+                detail = f": {entry['error']}" if entry.get('error') else ''
+                logger.info("[%s/%s] %s %s - %s%s", number, len(pending), entry['status'],
+                            track['artists'][0], track['track'], detail)
+        return counts
@@ -0,0 +1,67 @@
+import threading
+import time
+
+
+class PlaybackClock:
+    """
+    Filtered estimate of Spotify's playback position on the local monotonic clock.
+    Each poll is treated as sampled halfway through the API round trip, and the jitter that latency adds
+    to individual samples is smoothed out over time.
+    """
+
+    def __init__(self, smoothing: float = 0.2, reset_threshold_ms: float = 1500):
+        """
+        Args:
+            smoothing (float): Weight of a new sample in the filtered estimate.
+            reset_threshold_ms (float): Disagreement beyond which a sample replaces the estimate instead of adjusting it.
+        """
+        self.smoothing = smoothing
+        self.reset_threshold_ms = reset_threshold_ms
+        self.lock = threading.Lock()
+        self.track_id = None
+        self.is_playing = False
+        self.zero_time_ms = None  # Local time at which the track would have been at position 0
+        self.paused_position_ms = None
+        self.latency_ms = None
+
+    def update(self, track: dict, request_started: float, request_finished: float):
+        """
+        Adds a poll result to the estimate.
+        Args:
+            track (dict): The track returned by SpotifyPlayer.get_current_track.
+            request_started (float): time.monotonic() before the request.
+            request_finished (float): time.monotonic() after the response arrived.
+        """
+        round_trip_ms = (request_finished - request_started) * 1000
+        sample_time_ms = request_started * 1000 + round_trip_ms / 2
+        measured_zero_ms = sample_time_ms - track['progress_ms']
+        with self.lock:
+            self.latency_ms = round_trip_ms if self.latency_ms is None else 0.8 * self.latency_ms + 0.2 * round_trip_ms
+            # Spotify's timestamp field isn't used, as it also moves on polls where nothing changed. Seeks are caught
+            # by the measured zero point jumping past the reset threshold.
+            state_changed = track['track_id'] != self.track_id or track['is_playing'] != self.is_playing
+            self.track_id = track['track_id']
+            self.is_playing = track['is_playing']
+            if not self.is_playing:
+                self.paused_position_ms = track['progress_ms']
+                self.zero_time_ms = None
+            elif state_changed or self.zero_time_ms is None or abs(measured_zero_ms - self.zero_time_ms) > self.reset_threshold_ms:
+                self.zero_time_ms = measured_zero_ms
+            else:
+                self.zero_time_ms += self.smoothing * (measured_zero_ms - self.zero_time_ms)
+
+    def position(self, now: float = None) -> float or None:
+        """Returns the estimated Spotify position in ms at time.monotonic() `now`, or None if nothing is known."""
+        with self.lock:
+            if not self.is_playing:
+                return self.paused_position_ms
+            if self.zero_time_ms is None:
+                return None
+            return (now if now is not None else time.monotonic()) * 1000 - self.zero_time_ms
+
+    def clear(self):
+        with self.lock:
+            self.track_id = None
+            self.is_playing = False
+            self.zero_time_ms = None
+            self.paused_position_ms = None
@@ -0,0 +1,153 @@
+import threading
+import time
+
+from SettingsPanel import get_settings
+
+
+class PollMetrics:
+    """Counts Spotify polls and keeps their latency statistics."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.polls = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.immediate_polls = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    def record_poll(self, latency: float):
+        with self.lock:
+            self.polls += 1
+            self.last_latency = latency
+            self.max_latency = max(self.max_latency, latency)
+            self.total_latency += latency
+
+    def record_error(self, rate_limited: bool = False):
+        with self.lock:
+            self.errors += 1
+            if rate_limited:
+                self.rate_limited += 1
+
+    def record_immediate(self):
+        with self.lock:
+            self.immediate_polls += 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                'polls': self.polls,
+                'errors': self.errors,
+                'rate_limited': self.rate_limited,
+                'immediate_polls': self.immediate_polls,
+                'last_latency_ms': round(self.last_latency * 1000, 1),
+                'max_latency_ms': round(self.max_latency * 1000, 1),
+                'avg_latency_ms': round(self.total_latency / self.polls * 1000, 1) if self.polls else 0.0,
+            }
+
+
+class AdaptivePollScheduler:
+    """Decides how long to wait between Spotify polls based on the playback state."""
+
+    def __init__(self, refresh_timeout: float = None):
+        settings = get_settings()
+        # REFRESH_TIMEOUT stays the steady-state interval while a track plays
+        self.playing_interval = float(refresh_timeout or settings.get('REFRESH_TIMEOUT', 1))
+        self.min_interval = float(settings.get('MIN_REFRESH_TIMEOUT', 0.25))
+        self.idle_interval = float(settings.get('IDLE_REFRESH_TIMEOUT', 15))
+        self.boundary_window = 2.0
+        self.burst_duration = 3.0
+        self.current_idle_interval = self.playing_interval
+        self.burst_until = 0.0
+        self.wake_event = threading.Event()
+
+    def next_interval(self, track: dict or None) -> float:
+        """
+        Returns the number of seconds until the next poll.
+        Args:
+            track (dict): The track returned by the last poll, or None if nothing is playing.
+        """
+        if time.time() < self.burst_until:
+            return self.min_interval
+        if not track or not track['is_playing']:
+            # Back off gradually while paused or idle
+            interval = self.current_idle_interval
+            self.current_idle_interval = min(self.idle_interval, self.current_idle_interval * 1.5)
+            return interval
+        self.current_idle_interval = self.playing_interval
+
+        elapsed = time.time() - track['time_of_update']
+        remaining = (track['duration_ms'] - track['progress_ms']) / 1000 - elapsed
+        if remaining <= self.boundary_window:
+            # Poll just after the predicted track boundary
+            return max(self.min_interval, min(self.playing_interval, remaining + self.min_interval))
+        # Wake as the boundary window opens, but never poll faster than min_interval on the way there
+        return max(self.min_interval, min(self.playing_interval, remaining - self.boundary_window))
+
+    def retry_after(self, headers: dict or None) -> float:
+        """Returns how long to wait after a 429 response, honouring its Retry-After header."""
+        value = (headers or {}).get('Retry-After')
+        try:
+            return max(float(value), self.min_interval) if value is not None else self.idle_interval
+        except (TypeError, ValueError):
+            return self.idle_interval
+
+    def poll_now(self):
+        """Wakes the poller immediately and polls quickly for a few seconds while the change settles."""
+        self.current_idle_interval = self.playing_interval
+        self.burst_until = time.time() + self.burst_duration
+        self.wake_event.set()
+
+    def wait(self, interval: float) -> bool:
+        """Sleeps for the interval or until poll_now is called. Returns True if woken early."""
+        woken = self.wake_event.wait(interval)
+        self.wake_event.clear()
+        return woken
+
+
+class SharedRateLimiter:
+    """
+    Token bucket shared by the Spotify players of all zones, which use one app's rate limit between them.
+    Waiting zones are served first come first served, so a busy zone can't starve the others, and a 429
+    seen by any zone pauses them all.
+    """
+
+    def __init__(self, rate: float = None, burst: int = None):
+        settings = get_settings()
+        self.rate = float(rate or settings.get('SPOTIFY_MAX_REQUESTS_PER_SECOND', 3))
+        self.burst = int(burst or max(1, round(self.rate)))
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.next_ticket = 0
+        self.serving = 0
+        self.condition = threading.Condition()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Blocks until this caller's turn comes and a request may be made."""
+        with self.condition:
+            ticket = self.next_ticket
+            self.next_ticket += 1
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if ticket == self.serving and now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    self.serving += 1
+                    self.condition.notify_all()
+                    return
+                if ticket != self.serving:
+                    self.condition.wait()
+                else:
+                    self.condition.wait(max(self.paused_until - now, (1 - self.tokens) / self.rate, 0.001))
+
+    def backoff(self, seconds: float):
+        """Pauses all zones, after a 429 response."""
+        with self.condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.condition.notify_all()
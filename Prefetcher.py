@@ -0,0 +1,59 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from SettingsPanel import get_settings
+from TrackResolver import TrackResolver
+from OfflineDownloader import OfflineManifest
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    """Listener that resolves the next tracks in the Spotify queue in the background so track changes find them cached."""
+
+    def __init__(self, spotify_player, resolver: TrackResolver, video_player=None, depth: int = None, workers: int = 2,
+                 offline_manifest: OfflineManifest = None):
+        """
+        Args:
+            offline_manifest (OfflineManifest): Downloaded tracks, which play from disk and are not prefetched.
+        """
+        settings = get_settings()
+        self.spotify_player = spotify_player
+        self.resolver = resolver
+        self.video_player = video_player
+        self.offline_manifest = offline_manifest or OfflineManifest()
+        self.depth = int(depth or settings.get('PREFETCH_DEPTH', 2))
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch')
+        self.in_flight = set()
+        self.lock = threading.Lock()
+
+    def notify(self, event_type: str, currently_playing: dict):
+        # 'skip' and 'previous' come from the player's shortcuts, before Spotify reports the new track
+        if event_type in ('track_update', 'skip', 'previous'):
+            self.executor.submit(self.prefetch_queue)
+
+    def prefetch_queue(self):
+        """Reads the upcoming tracks and schedules the ones that are neither downloaded nor already being resolved."""
+        for index, track in enumerate(self.spotify_player.get_upcoming_tracks(self.depth)):
+            if self.offline_manifest.local_file(track['track_id']):
+                continue
+            with self.lock:
+                if track['track_id'] in self.in_flight:
+                    continue
+                self.in_flight.add(track['track_id'])
+            self.executor.submit(self.prefetch_track, track, index == 0)
+
+    def prefetch_track(self, track: dict, preload: bool = False):
+        """Resolves a track, and pre-buffers it on the video player's standby players if it is up next."""
+        try:
+            video, streams = self.resolver.resolve(track)
+            if video and any(streams):
+                logger.debug("Prefetched: %s -> %s", track['track'], video['title'])
+                if preload and self.video_player:
+                    self.video_player.preload_requested.emit(streams)
+        except Exception as e:
+            logger.warning("Error prefetching %s: %s", track['track'], e)
+        finally:
+            with self.lock:
+                self.in_flight.discard(track['track_id'])
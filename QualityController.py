@@ -0,0 +1,120 @@
+import json
+import logging
+import os
+import threading
+from typing import NamedTuple
+
+from SettingsPanel import get_settings, data_location
+
+logger = logging.getLogger(__name__)
+
+
+class Quality(NamedTuple):
+    """
+    The stream quality asked of yt-dlp: the maximum height, and the video codecs to prefer, best first. The codecs
+    only break ties between streams of the same height, unless light_codec puts them ahead of the height.
+    """
+    height: int
+    codecs: tuple
+    light_codec: bool = False
+
+
+DEFAULT_QUALITY = Quality(720, ())
+# avc1 is the codec with hardware decoding nearly everywhere, so it is what struggling decoders fall back to
+LIGHT_CODECS = ('avc1',)
+
+
+class QualityController:
+    """
+    Picks the stream quality for the next track from how the previous tracks played. Dropped frames or a busy
+    CPU first switch to the lightest codec and then step down in resolution; stalls or too little bandwidth for
+    the stream step down in resolution. After a run of tracks that played comfortably it steps back up.
+    """
+    HEIGHTS = (2160, 1440, 1080, 720, 480, 360)
+
+    def __init__(self, path: str = None):
+        settings = get_settings()
+        max_height = int(settings.get('MAX_RESOLUTION', 1080))
+        self.heights = [height for height in self.HEIGHTS if height <= max_height] or [360]
+        self.codecs = tuple(codec.strip() for codec in settings.get('VIDEO_CODECS', 'avc1,vp09').split(',') if codec.strip())
+        self.adaptive = settings.get('ADAPTIVE_QUALITY', True)
+        self.max_drop_ratio = float(settings.get('MAX_DROPPED_FRAMES', 0.05))
+        self.max_cpu = float(settings.get('MAX_CPU_LOAD', 0.85))
+        self.step_up_after = 3
+        self.path = path or data_location('quality.json')
+        self.lock = threading.Lock()
+        self.level = self._closest_level(int(settings.get('START_RESOLUTION', 720)))
+        self.light_codec = False
+        self.good_tracks = 0
+        self.load()
+
+    def _closest_level(self, height: int) -> int:
+        return min(range(len(self.heights)), key=lambda index: abs(self.heights[index] - height))
+
+    def load(self):
+        if not self.adaptive or not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self.level = self._closest_level(int(data['height']))
+            self.light_codec = bool(data.get('light_codec', False))
+        except (OSError, IOError, KeyError, ValueError) as e:
+            logger.warning("Error reading quality state: %s", e)
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'w') as f:
+                json.dump({'height': self.heights[self.level], 'light_codec': self.light_codec}, f)
+        except (OSError, IOError) as e:
+            logger.warning("Error writing quality state: %s", e)
+
+    def current(self) -> Quality:
+        """The quality to resolve the next track's streams at."""
+        with self.lock:
+            if self.light_codec:
+                return Quality(self.heights[self.level], LIGHT_CODECS, True)
+            return Quality(self.heights[self.level], self.codecs)
+
+    def record(self, stats: dict):
+        """
+        Adjusts the quality from the playback statistics of a finished track.
+        Args:
+            stats (dict): seconds played, dropped frame ratio, process CPU load as a fraction of all cores,
+                stalls, mean network read rate and the stream's bitrate in bytes/s, as collected by the video player.
+        """
+        if not self.adaptive or stats.get('seconds', 0) < 10:
+            return
+        drop_ratio = stats.get('drop_ratio', 0.0)
+        cpu = stats.get('cpu', 0.0)
+        stalls = stats.get('stalls', 0)
+        input_bps, media_bps = stats.get('input_bps'), stats.get('media_bps')
+        bandwidth_short = bool(input_bps and media_bps and input_bps < media_bps * 1.2)
+        with self.lock:
+            before = (self.level, self.light_codec)
+            if drop_ratio > self.max_drop_ratio or cpu > self.max_cpu:
+                # The decoder can't keep up
+                if not self.light_codec and self.codecs != LIGHT_CODECS:
+                    self.light_codec = True
+                else:
+                    self.level = min(self.level + 1, len(self.heights) - 1)
+                self.good_tracks = 0
+            elif stalls >= 2 or bandwidth_short:
+                self.level = min(self.level + 1, len(self.heights) - 1)
+                self.good_tracks = 0
+            elif drop_ratio < self.max_drop_ratio / 5 and cpu < self.max_cpu / 2 and not stalls \
+                    and (not input_bps or not media_bps or input_bps > media_bps * 3):
+                self.good_tracks += 1
+                if self.good_tracks >= self.step_up_after:
+                    self.good_tracks = 0
+                    if self.level > 0:
+                        self.level -= 1
+                    else:
+                        self.light_codec = False
+            changed = (self.level, self.light_codec) != before
+        if changed:
+            logger.info("Stream quality now %s (dropped %.1f%%, CPU %.0f%%, %s stalls)",
+                        self.current(), drop_ratio * 100, cpu * 100, stalls)
+            self.save()
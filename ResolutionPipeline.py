@@ -0,0 +1,69 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5 import QtCore
+
+from TrackResolver import TrackResolver
+
+logger = logging.getLogger(__name__)
+
+
+class ResolutionPipeline(QtCore.QObject):
+    """
+    Resolves tracks on a worker pool. Every submitted track gets a new generation, and work for older
+    generations is cancelled or discarded so only the newest track's result is delivered.
+    """
+    resolved = QtCore.pyqtSignal(object, object, object)
+    _finished = QtCore.pyqtSignal(int, object, object, object)
+
+    def __init__(self, resolver: TrackResolver, workers: int = 3, parent=None, executor: ThreadPoolExecutor = None):
+        """
+        Args:
+            executor (ThreadPoolExecutor): Worker pool to share with other zones' pipelines in multi-zone mode.
+        """
+        super().__init__(parent)
+        self.resolver = resolver
+        self.executor = executor or ThreadPoolExecutor(max_workers=workers, thread_name_prefix='resolve')
+        self.generation = 0
+        self.futures = []
+        self.lock = threading.Lock()
+        self._finished.connect(self._deliver, QtCore.Qt.QueuedConnection)
+
+    def submit(self, track: dict) -> int:
+        """Starts resolving a track and supersedes any earlier request. Returns the request's generation."""
+        with self.lock:
+            generation = self._supersede()
+            self.futures = [self.executor.submit(self._run, generation, track)]
+        return generation
+
+    def cancel(self):
+        """Cancels or discards all requests, for when a track is played without resolving it."""
+        with self.lock:
+            self._supersede()
+
+    def _supersede(self) -> int:
+        self.generation += 1
+        for future in self.futures:
+            future.cancel()
+        self.futures = []
+        return self.generation
+
+    def is_current(self, generation: int) -> bool:
+        return generation == self.generation
+
+    def _run(self, generation: int, track: dict):
+        try:
+            video, streams = self.resolver.resolve(track, cancelled=lambda: not self.is_current(generation))
+            if not self.is_current(generation):
+                logger.debug("Discarding stale resolution for %s", track['track'])
+                return
+            self._finished.emit(generation, track, video, streams)
+        except Exception as e:
+            logger.error("Error resolving %s: %s", track['track'], e)
+
+    @QtCore.pyqtSlot(int, object, object, object)
+    def _deliver(self, generation, track, video, streams):
+        # A newer track may have been submitted while this result was queued
+        if self.is_current(generation):
+            self.resolved.emit(track, video, streams)
@@ -0,0 +1,197 @@
+import json
+import logging
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from SettingsPanel import get_settings
+from TrackResolver import TrackResolver, NO_STREAMS
+from QualityController import Quality, QualityController, DEFAULT_QUALITY
+from Metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+TRACK_FIELDS = ('track_id', 'track', 'artists', 'duration_ms')
+
+
+def quality_to_json(quality: Quality) -> dict:
+    return {'height': quality.height, 'codecs': list(quality.codecs), 'light_codec': quality.light_codec}
+
+
+def quality_from_json(data: dict or None) -> Quality or None:
+    if not data:
+        return None
+    return Quality(int(data['height']), tuple(data.get('codecs') or ()), bool(data.get('light_codec', False)))
+
+
+def request_error(path: str, request) -> str or None:
+    """Returns why the body of a request to a route is invalid, or None if it is valid."""
+    if not isinstance(request, dict) or not isinstance(request.get('track'), dict):
+        return "Request needs a track object"
+    missing = [field for field in TRACK_FIELDS if field not in request['track']]
+    if missing:
+        return f"Track is missing {', '.join(missing)}"
+    if path == '/reject' and not (isinstance(request.get('video'), dict) and request['video'].get('id')):
+        return "Request needs a video object with an id"
+    quality = request.get('quality')
+    if path == '/resolve' and quality and not (isinstance(quality, dict) and isinstance(quality.get('height'), int)
+                                               and isinstance(quality.get('codecs') or [], list)):
+        return "Quality needs a height and optionally a list of codecs"
+    return None
+
+
+class ResolverService:
+    """
+    Serves a TrackResolver over an HTTP/JSON API, so several players share one set of caches and one
+    YouTube search per track. Requests are handled on their own threads and concurrent requests for the same
+    track are merged by the resolver.
+
+        POST /resolve  {"track": {...}, "quality": {"height": 720, "codecs": ["avc1"], "light_codec": true}}
+                       -> {"video": {...} or null, "streams": [video, audio, combined]}
+        POST /find     {"track": {...}} -> {"video": {...} or null}, without extracting streams
+        POST /reject   {"track": {...}, "video": {...}}
+        GET  /health   -> {"in_flight": 2}
+    """
+
+    def __init__(self, resolver: TrackResolver, host: str = None, port: int = None):
+        """
+        Args:
+            host (str): Address to listen on, RESOLVER_HOST, default 127.0.0.1. Use 0.0.0.0 to serve other machines.
+            port (int): Port to listen on, RESOLVER_PORT, default 8765.
+        """
+        settings = get_settings()
+        self.resolver = resolver
+        host = host or settings.get('RESOLVER_HOST', '127.0.0.1')
+        port = int(port if port is not None else settings.get('RESOLVER_PORT', 8765))
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+
+    @property
+    def address(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name='resolver-service', daemon=True).start()
+        logger.info("Resolver service listening on %s", self.address)
+
+    def serve_forever(self):
+        logger.info("Resolver service listening on %s", self.address)
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def resolve(self, request: dict) -> dict:
+        track = request['track']
+        with metrics.span('resolver_service_request_seconds'):
+            video, streams = self.resolver.resolve(track, quality=quality_from_json(request.get('quality')))
+        return {'video': video, 'streams': list(streams)}
+
+    def find(self, request: dict) -> dict:
+        return {'video': self.resolver.find_video(request['track'])}
+
+    def reject(self, request: dict) -> dict:
+        self.resolver.reject(request['track'], request['video'])
+        return {}
+
+    def health(self) -> dict:
+        return {'in_flight': len(self.resolver.in_flight)}
+
+    def _make_handler(self):
+        service = self
+        routes = {'/resolve': service.resolve, '/find': service.find, '/reject': service.reject}
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                logger.debug("%s - %s", self.address_string(), format % args)
+
+            def send_json(self, status: int, data: dict):
+                body = json.dumps(data, default=str).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path != '/health':
+                    self.send_error(404)
+                    return
+                self.send_json(200, service.health())
+
+            def do_POST(self):
+                route = routes.get(self.path)
+                if not route:
+                    self.send_error(404)
+                    return
+                try:
+                    request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                except ValueError as e:
+                    self.send_json(400, {'error': f"Invalid request: {e}"})
+                    return
+                error = request_error(self.path, request)
+                if error:
+                    self.send_json(400, {'error': error})
+                    return
+                try:
+                    self.send_json(200, route(request))
+                except Exception as e:
+                    logger.exception("Error handling %s", self.path)
+                    self.send_json(500, {'error': str(e)})
+
+        return Handler
+
+
+class RemoteResolver:
+    """
+    Resolves tracks through a ResolverService instead of in-process, with the same interface as TrackResolver.
+    Stream URLs are bound to the address that extracted them, so the service should run on the same network.
+    """
+
+    def __init__(self, url: str = None, quality: QualityController = None, timeout: float = None):
+        """
+        Args:
+            url (str): The service's base URL, RESOLVER_URL by default.
+            quality (QualityController): Picks the resolution and codecs streams are resolved at.
+            timeout (float): Seconds to wait for a resolution, RESOLVER_TIMEOUT, default 60.
+        """
+        settings = get_settings()
+        self.url = (url or settings['RESOLVER_URL']).rstrip('/')
+        self.quality = quality
+        self.timeout = float(timeout or settings.get('RESOLVER_TIMEOUT', 60))
+
+    def _post(self, path: str, data: dict) -> dict:
+        request = urllib.request.Request(self.url + path, data=json.dumps(data, default=str).encode(),
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.load(response)
+
+    def current_quality(self) -> Quality:
+        return self.quality.current() if self.quality else DEFAULT_QUALITY
+
+    def resolve(self, track: dict, cancelled=None, quality: Quality = None) -> tuple:
+        """Returns the video for a track and its stream URLs, or (None, (None, None, None)) if the service failed."""
+        if cancelled and cancelled():
+            return None, NO_STREAMS
+        try:
+            result = self._post('/resolve', {'track': track, 'quality': quality_to_json(quality or self.current_quality())})
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            logger.error("Error resolving %s through %s: %s", track['track'], self.url, e)
+            return None, NO_STREAMS
+        return result['video'], tuple(result['streams'])
+
+    def find_video(self, track: dict) -> dict or None:
+        try:
+            return self._post('/find', {'track': track})['video']
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            logger.error("Error finding a video for %s through %s: %s", track['track'], self.url, e)
+            return None
+
+    def reject(self, track: dict, video: dict):
+        try:
+            self._post('/reject', {'track': track, 'video': video})
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            logger.error("Error rejecting %s through %s: %s", video['id'], self.url, e)
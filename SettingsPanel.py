@@ -1,14 +1,29 @@
 import json
+import logging
 import os
+import re
 from PyQt5 import QtWidgets, QtCore
 from platformdirs import user_data_dir
 
+logger = logging.getLogger(__name__)
+
+_data_dir = None
+
+
+def set_data_dir(path: str or None):
+    """Keeps the settings and data in another directory, e.g. a scratch one, or in the default one if None."""
+    global _data_dir
+    _data_dir = path
+
+
+def data_dir() -> str:
+    return _data_dir or user_data_dir("spotify-video-player")
 
 
 class SettingsPanel(QtWidgets.QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.settings_dir = user_data_dir("spotify-video-player") # Directory for the settings file
+        self.settings_dir = data_dir() # Directory for the settings file
         self.settings_file = os.path.join(self.settings_dir, 'settings.json')
         self.setWindowTitle("Settings")
         self.setModal(True)
@@ -27,7 +42,8 @@ class SettingsPanel(QtWidgets.QDialog):
                 'CLIENT_SECRET': '',
                 'REFRESH_TIMEOUT': '1',
                 'START_MUTED': False,
-                'START_FULLSCREEN': False
+                'START_FULLSCREEN': False,
+                'DOUBLE_BUFFER': False
             }
 
     def save_settings(self):
@@ -43,6 +59,8 @@ class SettingsPanel(QtWidgets.QDialog):
         self.start_muted.setChecked(self.settings.get('START_MUTED', False))
         self.start_fullscreen = QtWidgets.QCheckBox("Start Fullscreen")
         self.start_fullscreen.setChecked(self.settings.get('START_FULLSCREEN', False))
+        self.double_buffer = QtWidgets.QCheckBox("Pre-buffer Next Video")
+        self.double_buffer.setChecked(self.settings.get('DOUBLE_BUFFER', False))
 
         self.layout.addWidget(QtWidgets.QLabel("Spotify Client ID:"))
         self.layout.addWidget(self.client_id)
@@ -52,6 +70,7 @@ class SettingsPanel(QtWidgets.QDialog):
         self.layout.addWidget(self.refresh_timeout)
         self.layout.addWidget(self.start_muted)
         self.layout.addWidget(self.start_fullscreen)
+        self.layout.addWidget(self.double_buffer)
 
         self.save_button = QtWidgets.QPushButton("Save")
         self.save_button.clicked.connect(self.on_save)
@@ -63,33 +82,46 @@ class SettingsPanel(QtWidgets.QDialog):
         self.settings['REFRESH_TIMEOUT'] = self.refresh_timeout.text()
         self.settings['START_MUTED'] = self.start_muted.isChecked()
         self.settings['START_FULLSCREEN'] = self.start_fullscreen.isChecked()
+        self.settings['DOUBLE_BUFFER'] = self.double_buffer.isChecked()
         self.save_settings()
         self.accept()
 
 @staticmethod
 def get_settings():
-    settings_file = os.path.join(user_data_dir("spotify-video-player"), 'settings.json')
+    settings_file = os.path.join(data_dir(), 'settings.json')
     try:
         if os.path.exists(settings_file):
             with open(settings_file, 'r') as f:
                 return json.load(f)
     except (OSError, IOError) as e:
-        print(f"Error reading file: {e}")
+        logger.warning("Error reading file: %s", e)
     except json.JSONDecodeError as e:
-        print(f"Error parsing JSON: {e}")
+        logger.warning("Error parsing JSON: %s", e)
     return {}
 
 @staticmethod
-def cache_location():
+def cache_location(zone=None):
+    """Returns the Spotify OAuth token cache, one per zone in multi-zone mode."""
     try:
-        cache_path = os.path.join(user_data_dir("spotify-video-player"), '.spotify_cache')
+        name = '.spotify_cache-' + re.sub(r'[^\w-]', '_', zone) if zone else '.spotify_cache'
+        cache_path = os.path.join(data_dir(), name)
         os.makedirs(os.path.dirname(cache_path), exist_ok=True)
         return cache_path
     except (OSError, IOError) as e:
-        print(f"Error creating cache directory: {e}")
+        logger.error("Error creating cache directory: %s", e)
         return None
 
 def show_settings_panel(parent=None):
     dialog = SettingsPanel(parent)
     result = dialog.exec_()
-    return result == QtWidgets.QDialog.Accepted
\ No newline at end of file
+    return result == QtWidgets.QDialog.Accepted
+
+def data_location(filename):
+    """Returns the path of a file in the app's data directory, creating the directory if needed."""
+    try:
+        directory = data_dir()
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, filename)
+    except (OSError, IOError) as e:
+        logger.error("Error creating data directory: %s", e)
+        return None
@@ -0,0 +1,432 @@
+"""
+Local stand-ins for Spotify, yt-dlp and VLC, for running the player headless in soak and load tests.
+
+    FakeSpotify     replaces spotipy.Spotify, passed to SpotifyPlayer(client=...)
+    FixtureYoutube  answers searches and stream lookups from recorded fixtures, via YoutubeSearcher(ydl_factory=...)
+    NullVLCInstance replaces vlc.Instance, passed to MusicVideoPlayer(vlc_instance=...)
+"""
+import copy
+import heapq
+import json
+import logging
+import threading
+import time
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+import vlc
+
+logger = logging.getLogger(__name__)
+
+
+class FakeSpotify:
+    """
+    Plays a list of tracks on a virtual clock and answers the spotipy calls SpotifyPlayer makes.
+    The timeline is a list of (seconds after start, action, value) tuples, with actions 'skip', 'previous',
+    'pause', 'resume' and 'scrub' (value is the position in ms). Tracks also advance when they end.
+    Args:
+        tracks (list): Track dicts as built by SpotifyPlayer.track_from_item.
+        timeline (list): The scripted actions.
+        latency (float): Seconds each API call takes.
+    """
+
+    def __init__(self, tracks: list, timeline: list = (), latency: float = 0.0):
+        self.tracks = tracks
+        self.timeline = sorted(timeline, key=lambda step: step[0])
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.updated = self.started
+        self.index = 0
+        self.progress_ms = 0.0
+        self.playing = True
+        self.volume_percent = 100
+        self.next_step = 0
+        self.changes = [(self.started, tracks[0]['track_id'])]  # (monotonic time, track id) of every track change
+        self.calls = 0
+
+    @staticmethod
+    def item(track: dict) -> dict:
+        return {
+            'type': 'track',
+            'id': track['track_id'],
+            'name': track['track'],
+            'artists': [{'name': artist} for artist in track['artists']],
+            'album': {'name': track.get('album')},
+            'external_ids': {'isrc': track['isrc']} if track.get('isrc') else {},
+            'duration_ms': track['duration_ms'],
+        }
+
+    def _change_track(self, index: int, at: float):
+        self.index = index % len(self.tracks)
+        self.progress_ms = 0.0
+        self.changes.append((at, self.tracks[self.index]['track_id']))
+
+    def _play_until(self, until: float):
+        """Advances playback to a point in time, moving on to the next track whenever one ends."""
+        while self.playing:
+            remaining_ms = self.tracks[self.index]['duration_ms'] - self.progress_ms
+            ends = self.updated + remaining_ms / 1000
+            if ends > until:
+                break
+            self.updated = ends
+            self._change_track(self.index + 1, ends)
+        if self.playing:
+            self.progress_ms += (until - self.updated) * 1000
+        self.updated = until
+
+    def _apply(self, action: str, value, at: float):
+        if action == 'skip':
+            self._change_track(self.index + 1, at)
+        elif action == 'previous':
+            self._change_track(self.index - 1, at)
+        elif action == 'pause':
+            self.playing = False
+        elif action == 'resume':
+            self.playing = True
+        elif action == 'scrub':
+            self.progress_ms = float(value)
+        else:
+            raise ValueError(f"Unknown timeline action: {action}")
+
+    def _advance(self):
+        now = time.monotonic()
+        while self.next_step < len(self.timeline) and self.started + self.timeline[self.next_step][0] <= now:
+            offset, action, value = self.timeline[self.next_step]
+            self._play_until(self.started + offset)
+            self._apply(action, value, self.started + offset)
+            self.next_step += 1
+        self._play_until(now)
+
+    def _call(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def last_change(self) -> tuple:
+        with self.lock:
+            self._advance()
+            return self.changes[-1]
+
+    def current_playback(self) -> dict:
+        self._call()
+        with self.lock:
+            self._advance()
+            return {
+                'item': self.item(self.tracks[self.index]),
+                'timestamp': int(time.time() * 1000),
+                'progress_ms': int(self.progress_ms),
+                'is_playing': self.playing,
+                'context': {'uri': 'spotify:playlist:simulated'},
+                'device': {'volume_percent': self.volume_percent},
+            }
+
+    def next_track(self):
+        self._call()
+        with self.lock:
+            self._advance()
+            self._change_track(self.index + 1, time.monotonic())
+
+    def previous_track(self):
+        self._call()
+        with self.lock:
+            self._advance()
+            self._change_track(self.index - 1, time.monotonic())
+
+    def volume(self, volume_percent: int):
+        self._call()
+        self.volume_percent = volume_percent
+
+    def queue(self) -> dict:
+        self._call()
+        with self.lock:
+            self._advance()
+            upcoming = [self.tracks[(self.index + offset) % len(self.tracks)] for offset in range(1, 11)]
+            return {'currently_playing': self.item(self.tracks[self.index]),
+                    'queue': [self.item(track) for track in upcoming]}
+
+    def playlist_items(self, playlist_id: str, **kwargs) -> dict:
+        self._call()
+        return {'items': [{'track': self.item(track)} for track in self.tracks], 'next': None}
+
+    def album_tracks(self, album_id: str, **kwargs) -> dict:
+        self._call()
+        return {'items': [self.item(track) for track in self.tracks], 'next': None}
+
+    def current_user_saved_tracks(self, **kwargs) -> dict:
+        return self.playlist_items('saved')
+
+    def next(self, page: dict):
+        return None
+
+
+class FixtureYoutube:
+    """
+    Answers yt-dlp searches with recorded results and stream lookups with made up stream URLs.
+    The fixtures use the benchmark corpus format: cases with a 'track' and its recorded 'search_results'.
+    Args:
+        cases (list): The fixture cases.
+        search_latency (float): Seconds each search takes.
+        extract_latency (float): Seconds each stream lookup takes.
+    """
+
+    def __init__(self, cases: list, search_latency: float = 0.0, extract_latency: float = 0.0):
+        self.cases = cases
+        self.search_latency = search_latency
+        self.extract_latency = extract_latency
+        self.searches = 0
+        self.extractions = 0
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> 'FixtureYoutube':
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f)['cases'], **kwargs)
+
+    def tracks(self) -> list:
+        return [case['track'] for case in self.cases]
+
+    def factory(self, opts: dict) -> 'FixtureYoutubeDL':
+        """Creates a YoutubeDL stand-in, for YoutubeSearcher(ydl_factory=...)."""
+        return FixtureYoutubeDL(self, opts)
+
+    def search(self, query: str) -> dict:
+        self.searches += 1
+        time.sleep(self.search_latency)
+        prefix, terms = query.split(':', 1)
+        count = int(prefix[len('ytsearch'):] or 1)
+        for case in self.cases:
+            track = case['track']
+            if (track['track'] in terms and track['artists'][0] in terms) or \
+                    (track.get('isrc') and track['isrc'] in terms):
+                results = copy.deepcopy(case['search_results'])
+                results['entries'] = results['entries'][:count]
+                return results
+        return {'entries': []}
+
+    def extract(self, url: str) -> dict:
+        self.extractions += 1
+        time.sleep(self.extract_latency)
+        video_id = parse_qs(urlparse(url).query).get('v', [url.rsplit('/', 1)[-1]])[0]
+        expire = int(time.time()) + 6 * 3600
+
+        def stream(kind: str) -> str:
+            return f"https://fixture.invalid/{video_id}/{kind}?expire={expire}&id={video_id}"
+
+        return {
+            'id': video_id,
+            'formats': [
+                {'format_id': '136', 'url': stream('video'), 'vcodec': 'avc1', 'acodec': 'none', 'height': 720, 'vbr': 2000,
+                 'protocol': 'https'},
+                {'format_id': '140', 'url': stream('audio'), 'vcodec': 'none', 'acodec': 'mp4a', 'abr': 128,
+                 'protocol': 'https'},
+                {'format_id': '18', 'url': stream('combined'), 'vcodec': 'avc1', 'acodec': 'mp4a', 'height': 360,
+                 'protocol': 'https'},
+                {'format_id': '95', 'url': stream('hls'), 'vcodec': 'avc1', 'acodec': 'mp4a', 'height': 720,
+                 'protocol': 'm3u8_native'},
+            ],
+        }
+
+
+class FixtureYoutubeDL:
+    """The part of the yt_dlp.YoutubeDL interface YoutubeSearcher uses, backed by FixtureYoutube."""
+
+    def __init__(self, backend: FixtureYoutube, opts: dict):
+        self.backend = backend
+        self.opts = opts
+
+    def get_info_extractor(self, name: str):
+        return None
+
+    def extract_info(self, query: str, download: bool = False) -> dict:
+        if query.startswith('ytsearch'):
+            return self.backend.search(query)
+        return self.backend.extract(query)
+
+
+class NullEventManager:
+    def __init__(self):
+        self.callbacks = {}
+
+    def event_attach(self, event_type, callback, *args):
+        self.callbacks.setdefault(event_type, []).append((callback, args))
+
+    def emit(self, event_type, **fields):
+        event = SimpleNamespace(type=event_type, u=SimpleNamespace(**fields))
+        for callback, args in self.callbacks.get(event_type, []):
+            callback(event, *args)
+
+
+class NullMedia:
+    def __init__(self, mrl: str):
+        self.mrl = mrl
+        self.options = []
+
+    def add_option(self, option: str):
+        self.options.append(option)
+
+    def get_mrl(self) -> str:
+        return self.mrl
+
+    def get_stats(self, stats) -> bool:
+        return False
+
+
+class NullMediaPlayer:
+    """A VLC media player that renders nothing but keeps VLC's states, clock and events."""
+
+    def __init__(self, instance: 'NullVLCInstance'):
+        self.instance = instance
+        self.events = NullEventManager()
+        self.lock = threading.Lock()
+        self.media = None
+        self.state = vlc.State.NothingSpecial
+        self.time_ms = 0.0
+        self.updated = time.monotonic()
+        self.rate = 1.0
+        self.muted = False
+        self.opening = 0
+
+    def event_manager(self) -> NullEventManager:
+        return self.events
+
+    def _sync_clock(self):
+        now = time.monotonic()
+        if self.state == vlc.State.Playing:
+            self.time_ms += (now - self.updated) * 1000 * self.rate
+        self.updated = now
+
+    def set_media(self, media: NullMedia):
+        with self.lock:
+            self.media = media
+            self.state = vlc.State.NothingSpecial
+            self.time_ms = 0.0
+            self.opening += 1
+
+    def play(self):
+        with self.lock:
+            if not self.media:
+                return -1
+            if self.state == vlc.State.Paused:
+                self._sync_clock()
+                self.state = vlc.State.Playing
+                self.instance.schedule(0, self._emit_playing, self.opening)
+                return 0
+            if self.state in (vlc.State.Opening, vlc.State.Playing):
+                return 0
+            self.state = vlc.State.Opening
+            self.instance.schedule(self.instance.open_delay, self._opened, self.opening)
+            return 0
+
+    def _opened(self, opening: int):
+        with self.lock:
+            if opening != self.opening or self.state != vlc.State.Opening:
+                return
+            self.updated = time.monotonic()
+            self.state = vlc.State.Paused if ':start-paused' in self.media.options else vlc.State.Playing
+            playing = self.state == vlc.State.Playing
+        self.events.emit(vlc.EventType.MediaPlayerBuffering, new_cache=100.0)
+        if playing:
+            self._emit_playing(opening)
+
+    def _emit_playing(self, opening: int):
+        if opening == self.opening:
+            self.events.emit(vlc.EventType.MediaPlayerPlaying)
+
+    def pause(self):
+        with self.lock:
+            self._sync_clock()
+            if self.state == vlc.State.Playing:
+                self.state = vlc.State.Paused
+            elif self.state == vlc.State.Paused:
+                self.state = vlc.State.Playing
+                self.instance.schedule(0, self._emit_playing, self.opening)
+
+    def stop(self):
+        with self.lock:
+            self.state = vlc.State.Stopped
+            self.time_ms = 0.0
+            self.opening += 1
+
+    def get_state(self):
+        return self.state
+
+    def get_time(self) -> int:
+        with self.lock:
+            if not self.media or self.state in (vlc.State.NothingSpecial, vlc.State.Opening, vlc.State.Stopped):
+                return -1
+            self._sync_clock()
+            return int(self.time_ms)
+
+    def set_time(self, time_ms: int):
+        with self.lock:
+            self._sync_clock()
+            self.time_ms = float(time_ms)
+        self.instance.schedule(self.instance.seek_delay, self.events.emit, vlc.EventType.MediaPlayerTimeChanged,
+                               new_time=float(time_ms))
+
+    def get_length(self) -> int:
+        return 240000 if self.media else 0
+
+    def get_rate(self) -> float:
+        return self.rate
+
+    def set_rate(self, rate: float):
+        with self.lock:
+            self._sync_clock()
+            self.rate = rate
+
+    def audio_get_mute(self) -> bool:
+        return self.muted
+
+    def audio_set_mute(self, muted: bool):
+        self.muted = bool(muted)
+
+    def audio_toggle_mute(self):
+        self.muted = not self.muted
+
+    def set_xwindow(self, window_id: int):
+        pass
+
+    def set_hwnd(self, window_id: int):
+        pass
+
+    def set_nsobject(self, window_id: int):
+        pass
+
+
+class NullVLCInstance:
+    """
+    Stands in for vlc.Instance. Media "open" after open_delay and seeks land after seek_delay, with the
+    events delivered from one background thread the way VLC delivers them from its own threads.
+    """
+
+    def __init__(self, open_delay: float = 0.05, seek_delay: float = 0.02):
+        self.open_delay = open_delay
+        self.seek_delay = seek_delay
+        self.pending = []
+        self.sequence = 0
+        self.condition = threading.Condition()
+        threading.Thread(target=self._run, name='null-vlc', daemon=True).start()
+
+    def media_new(self, mrl: str) -> NullMedia:
+        return NullMedia(mrl)
+
+    def media_player_new(self) -> NullMediaPlayer:
+        return NullMediaPlayer(self)
+
+    def schedule(self, delay: float, callback, *args, **kwargs):
+        with self.condition:
+            self.sequence += 1
+            heapq.heappush(self.pending, (time.monotonic() + delay, self.sequence, callback, args, kwargs))
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending or self.pending[0][0] > time.monotonic():
+                    self.condition.wait(self.pending[0][0] - time.monotonic() if self.pending else None)
+                _, _, callback, args, kwargs = heapq.heappop(self.pending)
+            try:
+                callback(*args, **kwargs)
+            except Exception as e:
+                logger.error("Error in simulated VLC event: %s", e)
@@ -1,25 +1,69 @@
+import logging
 import os
+import requests
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
+from spotipy.exceptions import SpotifyException
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib3.util.retry import Retry
 from SettingsPanel import get_settings, cache_location
+from PollScheduler import AdaptivePollScheduler, PollMetrics, SharedRateLimiter
+from StartupProfile import profiler
+from PlaybackClock import PlaybackClock
+from Metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+def create_session() -> requests.Session:
+    """
+    Returns the HTTP session for the Spotify client. It retries 5xx errors with backoff as spotipy does, but not
+    429s, which are left to the poll scheduler and rate limiter so every zone backs off together.
+    """
+    retry = Retry(total=3, connect=None, read=False, allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+                  status=3, backoff_factor=0.3, status_forcelist=(500, 502, 503, 504), respect_retry_after_header=False)
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
 
 class SpotifyPlayer:
     """ Manages interaction with the Spotify API, tracks currently playing songs,and notifies listeners about changes in playback state."""
-    def __init__(self):
+    def __init__(self, autostart: bool = True, client=None, zone: str = None, rate_limiter: SharedRateLimiter = None):
+        """
+        Args:
+            autostart (bool): Start polling Spotify right away.
+            client: A spotipy.Spotify compatible client to use instead of logging in, e.g. Simulation.FakeSpotify.
+            zone (str): In multi-zone mode, the zone whose Spotify account this player follows.
+            rate_limiter (SharedRateLimiter): Spreads the API requests of all zones within the rate limit.
+        """
         settings = get_settings()
         cid = settings.get('CLIENT_ID', '')
         csecret = settings.get('CLIENT_SECRET', '')
         self.refresh_timeout = float(settings.get('REFRESH_TIMEOUT', 1))
-        self.cache_path = cache_location()
+        self.scheduler = AdaptivePollScheduler(self.refresh_timeout)
+        self.poll_metrics = PollMetrics()
+        self.zone = zone
+        self.rate_limiter = rate_limiter
+        labels = f'{{zone="{zone}"}}' if zone else ''
+        metrics.add_gauges(lambda: {f"spotify_{name}{labels}": value for name, value in self.poll_metrics.snapshot().items()
+                                    if not name.endswith('_ms')})
+        self.clock = PlaybackClock()
+        self.scrub_threshold_ms = float(settings.get('SCRUB_THRESHOLD_MS', 2000))
+        self.cache_path = cache_location(zone)
         scope = "user-read-currently-playing user-read-playback-state user-modify-playback-state user-library-read user-library-modify"
-        self.sp = spotipy.Spotify(auth_manager=SpotifyOAuth(client_id=cid, client_secret=csecret, redirect_uri="http://localhost:8990/callback", scope=scope, cache_path=self.cache_path))
+        self.sp = client or spotipy.Spotify(auth_manager=SpotifyOAuth(client_id=cid, client_secret=csecret, redirect_uri="http://localhost:8990/callback", scope=scope, cache_path=self.cache_path), requests_session=create_session())
         self.currentlyPlaying = None
         self.is_playing = None
         self.listeners = []
         self.last_audio_volume = None
-        self.start_track_updater()
+        self.updater_thread = None
+        # Controls wait their turn at the rate limiter off the Qt thread, one at a time so key presses keep their order
+        self.controls = ThreadPoolExecutor(max_workers=1, thread_name_prefix='spotify-control')
+        if autostart:
+            self.start_track_updater()
 
     def add_listener(self, listener):
         self.listeners.append(listener)
@@ -27,9 +71,18 @@ class SpotifyPlayer:
     def remove_listener(self, listener):
         self.listeners.remove(listener)
 
+    def throttle(self):
+        """Waits until the rate limiter, if any, allows an API request."""
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+
     def toggle_mute(self):
         """Toggles mute/unmute on the currently active Spotify device."""
+        self.controls.submit(self._toggle_mute)
+
+    def _toggle_mute(self):
         try:
+            self.throttle()
             current_playback = self.sp.current_playback()
             
             if not current_playback or not current_playback.get('device'):
@@ -38,39 +91,49 @@ class SpotifyPlayer:
             current_device = current_playback['device']
             current_volume = current_device['volume_percent']
             
+            self.throttle()
             if current_volume == 0 and (self.last_audio_volume is None or self.last_audio_volume == 0):
                 # User may have set volume to 0, unmute to a default or last known volume
                 new_volume = 50 if self.last_audio_volume is None else self.last_audio_volume
                 self.sp.volume(new_volume)
+                self.poll_now()
                 self.notify_listeners('unmute')
             elif current_volume == 0 and self.last_audio_volume != 0:
                 # If currently muted, unmute to the last known volume
                 self.sp.volume(self.last_audio_volume)
+                self.poll_now()
                 self.notify_listeners('unmute')
             else:
                 # If not muted, mute the audio and save the current volume
                 self.last_audio_volume = current_volume
                 self.sp.volume(0)
+                self.poll_now()
                 self.notify_listeners('mute')
 
         except Exception as e:
-            print(f"Error occurred while trying to toggle mute: {str(e)}")
+            logger.error("Error occurred while trying to toggle mute: %s", e)
 
     def next_song(self):
         """Skips to the next song in the user's Spotify queue."""
-        try:
-            self.sp.next_track()
-            self.notify_listeners('skip')
-        except Exception as e:
-            print(f"Error occurred while trying to skip to the next song: {str(e)}")
+        self.controls.submit(self._skip, self.sp.next_track, 'skip', "skip to the next song")
 
     def previous_song(self):
         """Skips to the previous song in the user's Spotify queue."""
+        self.controls.submit(self._skip, self.sp.previous_track, 'previous', "skip to the previous song")
+
+    def _skip(self, request, event_type: str, description: str):
         try:
-            self.sp.previous_track()
-            self.notify_listeners('previous')
+            self.throttle()
+            request()
+            self.poll_now()
+            self.notify_listeners(event_type)
         except Exception as e:
-            print(f"Error occurred while trying to skip to the previous song: {str(e)}")
+            logger.error("Error occurred while trying to %s: %s", description, e)
+
+    def poll_now(self):
+        """Polls Spotify immediately, used after local control actions."""
+        self.poll_metrics.record_immediate()
+        self.scheduler.poll_now()
 
     def notify_listeners(self, event_type):
         """
@@ -81,72 +144,162 @@ class SpotifyPlayer:
         for listener in self.listeners:
             listener.notify(event_type, self.currentlyPlaying)
 
+    @staticmethod
+    def track_from_item(item: dict) -> dict:
+        """Builds the track dict passed to listeners from a Spotify track object."""
+        album = item.get('album') or {}
+        return {
+            "artists": [artist['name'] for artist in item['artists']],
+            "artist_ids": [artist.get('id') for artist in item['artists']],
+            "track": item['name'],
+            "album": album.get('name'),
+            "album_id": album.get('id'),
+            "isrc": (item.get('external_ids') or {}).get('isrc'),
+            "duration_ms": item['duration_ms'],
+            "track_id": item['id']
+        }
+
     def get_current_track(self) -> dict or None:
         """Retrieves the currently playing track from the Spotify API."""
         track = self.sp.current_playback()
         if track and track['item']:
             return {
+                **self.track_from_item(track['item']),
                 "time_of_update": time.time(),
                 "timestamp": track['timestamp'],
                 "progress_ms": track['progress_ms'],
-                "artists": [artist['name'] for artist in track['item']['artists']],
-                "track": track['item']['name'],
-                "album": track['item']['album']['name'],
-                "duration_ms": track['item']['duration_ms'],
                 "is_playing": track['is_playing'],
-                "track_id": track['item']['id']
+                "shuffle": track.get('shuffle_state', False),
+                "context_uri": (track.get('context') or {}).get('uri')
             }
         return None
 
-    def did_scrub(self, track_update):
-        """Determines if the user has scrubbed through the track."""
-        current_time = time.time()
-        
-        # Extract old and new update times and progress
-        old_update_time = self.currentlyPlaying['time_of_update']
-        old_seek_time = self.currentlyPlaying['progress_ms'] / 1000  
-        new_update_time = track_update['time_of_update']
-        new_seek_time = track_update['progress_ms'] / 1000 
-        
-        # Calculate the expected new seek time based on old seek time and elapsed time
-        time_elapsed = new_update_time - old_update_time
-        expected_seek_time = old_seek_time + time_elapsed
-        
-        # Determine the actual difference in seek time
-        time_difference = new_seek_time - expected_seek_time
-        
-        # Threshold for determining a skip (this can be adjusted as needed)
-        skip_threshold = 5  # seconds
-        
-        # Check if the difference exceeds the threshold, indicating a skip
-        if time_difference > skip_threshold or time_difference < -skip_threshold:
-            return True
+    def get_context_tracks(self, context_uri: str, after_track_id: str, limit: int) -> list:
+        """
+        Returns up to `limit` tracks that follow a track in an album or playlist context. Pages are read until
+        the track and enough tracks after it are found, so positions past the first page are found too.
+        """
+        context_type = context_uri.split(':')[1] if context_uri else None
+        if context_type not in ('playlist', 'album'):
+            return []
+        self.throttle()
+        if context_type == 'playlist':
+            page = self.sp.playlist_items(context_uri, additional_types=('track',))
+            unwrap = lambda item: item.get('track')
         else:
+            page = self.sp.album_tracks(context_uri)
+            unwrap = lambda item: item
+        head, tracks, found = [], [], False
+        while page:
+            for item in map(unwrap, page['items']):
+                if not item or not item.get('id'):
+                    continue
+                if found:
+                    tracks.append(self.track_from_item(item))
+                elif item['id'] == after_track_id:
+                    found = True
+                elif len(head) < limit:
+                    head.append(self.track_from_item(item))
+            if len(tracks) >= limit or not page.get('next'):
+                break
+            self.throttle()
+            page = self.sp.next(page)
+        # Start from the beginning of the context when the track isn't in it
+        return tracks[:limit] if found else head
+
+    def get_upcoming_tracks(self, limit: int = 3) -> list:
+        """Returns the next tracks in the user's queue, topped up from the rest of the current context."""
+        try:
+            self.throttle()
+            queue = self.sp.queue()
+            tracks = [self.track_from_item(item) for item in queue.get('queue', []) if item and item.get('type') == 'track']
+            current = self.currentlyPlaying
+            # With shuffle on the context order isn't the play order, so only the queue is used
+            if len(tracks) < limit and current and current.get('context_uri') and not current.get('shuffle'):
+                after_track_id = tracks[-1]['track_id'] if tracks else current['track_id']
+                tracks += self.get_context_tracks(current['context_uri'], after_track_id, limit - len(tracks))
+            return tracks[:limit]
+        except Exception as e:
+            logger.error("Error occurred while reading the Spotify queue: %s", e)
+            return []
+
+    def did_scrub(self, track_update, sample_time: float = None):
+        """
+        Determines if the user has scrubbed through the track, by comparing the reported position
+        with the one the playback clock predicts. Scrubs while paused are not reported, the video catches up
+        through the sync with Spotify once playback resumes.
+        Args:
+            track_update (dict): The newly polled track.
+            sample_time (float): time.monotonic() at which the position was sampled.
+        """
+        if not track_update['is_playing']:
+            return False
+        expected_position = self.clock.position(sample_time)
+        if expected_position is None or self.clock.track_id != track_update['track_id']:
             return False
+        return abs(track_update['progress_ms'] - expected_position) > self.scrub_threshold_ms
 
     def update_currently_playing(self):
         """Continuously monitors the currently playing track and notifies listeners of changes."""
         while True:
-            current_track = self.get_current_track()
+            self.throttle()
+            started = time.monotonic()
+            try:
+                current_track = self.get_current_track()
+                finished = time.monotonic()
+                self.poll_metrics.record_poll(finished - started)
+                metrics.observe('spotify_poll_seconds', finished - started)
+                if self.poll_metrics.polls == 1:
+                    profiler.mark("first Spotify poll")
+            except SpotifyException as e:
+                rate_limited = e.http_status == 429
+                self.poll_metrics.record_error(rate_limited)
+                if rate_limited:
+                    retry_after = self.scheduler.retry_after(e.headers)
+                    logger.warning("Spotify rate limit hit, retrying in %.0fs", retry_after)
+                    if self.rate_limiter:
+                        self.rate_limiter.backoff(retry_after)
+                    else:
+                        time.sleep(retry_after)
+                else:
+                    logger.error("Error polling Spotify: %s", e)
+                    self.scheduler.wait(self.scheduler.idle_interval)
+                continue
+            except Exception as e:
+                self.poll_metrics.record_error()
+                logger.error("Error polling Spotify: %s", e)
+                self.scheduler.wait(self.scheduler.idle_interval)
+                continue
             if current_track:
-                if self.currentlyPlaying and current_track['track_id'] == self.currentlyPlaying['track_id'] and self.did_scrub(current_track):
+                scrubbed = self.did_scrub(current_track, (started + finished) / 2)
+                self.clock.update(current_track, started, finished)
+                if self.currentlyPlaying and current_track['track_id'] == self.currentlyPlaying['track_id'] and scrubbed:
                     self.currentlyPlaying['progress_ms'] = current_track['progress_ms']
                     self.currentlyPlaying['time_of_update'] = current_track['time_of_update']
                     self.notify_listeners('track_scrub')
                 track_id = current_track['track_id']
                 if not self.currentlyPlaying or track_id != self.currentlyPlaying['track_id']:
+                    # How far into the track Spotify already was when the poll noticed the change
+                    if self.currentlyPlaying and current_track['is_playing']:
+                        metrics.observe('track_change_detection_seconds', current_track['progress_ms'] / 1000,
+                                        track_id=track_id)
+                    metrics.begin_track(track_id, zone=self.zone)
                     self.currentlyPlaying = current_track
                     self.notify_listeners('track_update')
+                self.currentlyPlaying['shuffle'] = current_track['shuffle']
                 if current_track['is_playing'] != self.is_playing:
                     self.is_playing = current_track['is_playing']
                     self.notify_listeners('play' if self.is_playing else 'pause')
             else:
                 self.is_playing = False
                 self.currentlyPlaying = None
-            time.sleep(self.refresh_timeout)
+                self.clock.clear()
+            self.scheduler.wait(self.scheduler.next_interval(current_track))
 
     def start_track_updater(self):
-        """Starts the background thread to update the currently playing track."""
-        thread = threading.Thread(target=self.update_currently_playing)
-        thread.daemon = True
-        thread.start()
+        """Starts the background thread to update the currently playing track. Only one is ever started."""
+        if self.updater_thread and self.updater_thread.is_alive():
+            return
+        self.updater_thread = threading.Thread(target=self.update_currently_playing)
+        self.updater_thread.daemon = True
+        self.updater_thread.start()
@@ -0,0 +1,46 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfiler:
+    """Records how long each import and initialisation phase of startup takes."""
+
+    def __init__(self):
+        self.enabled = False
+        self.started = time.perf_counter()
+        self.phases = []
+        self.lock = threading.Lock()
+
+    def record(self, name: str, duration: float):
+        # Always recorded, as module level imports run before the command line is parsed
+        with self.lock:
+            self.phases.append((name, threading.current_thread().name, time.perf_counter() - self.started, duration))
+
+    @contextmanager
+    def phase(self, name: str):
+        """Times the enclosed block as one startup phase."""
+        phase_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - phase_start)
+
+    def mark(self, name: str):
+        """Records a milestone, such as the window being shown, with its time since process start."""
+        self.record(name, 0.0)
+
+    def report(self):
+        if not self.enabled:
+            return
+        with self.lock:
+            phases = sorted(self.phases, key=lambda phase: phase[2])
+        logger.info("Startup profile (ended at / duration, ms):")
+        for name, thread_name, ended_at, duration in phases:
+            logger.info("  %9.1f %9.1f  %s [%s]", ended_at * 1000, duration * 1000, name, thread_name)
+
+
+profiler = StartupProfiler()
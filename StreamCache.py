@@ -0,0 +1,120 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from SettingsPanel import get_settings
+from QualityController import Quality, DEFAULT_QUALITY
+
+logger = logging.getLogger(__name__)
+
+
+class StreamCache:
+    """In-memory cache of resolved stream URLs keyed by (video id, quality) that refreshes them before they expire."""
+    EXPIRE_PATTERN = re.compile(r'[?&/]expire[=/](\d+)')
+
+    def __init__(self, resolver, max_entries: int = None, expiry_margin: float = None, refresh_interval: float = 60,
+                 refresh_window: float = None):
+        """
+        Args:
+            resolver (callable): Called as resolver(video_url, max_height, codecs, light_codec) and returns
+                (video, audio, combined) URLs.
+            max_entries (int): Number of recently played videos kept and refreshed in the background.
+            expiry_margin (float): Seconds before a URL expires at which it is treated as stale.
+            refresh_interval (float): Seconds between background refresh passes.
+            refresh_window (float): Only entries used within this many seconds are refreshed, the rest are left
+                to expire. STREAM_REFRESH_WINDOW, default 6 hours, about how long YouTube stream URLs last.
+        """
+        settings = get_settings()
+        self.resolver = resolver
+        self.max_entries = int(max_entries or settings.get('STREAM_CACHE_SIZE', 50))
+        self.expiry_margin = float(expiry_margin or settings.get('STREAM_EXPIRY_MARGIN', 300))
+        self.default_ttl = 3600
+        self.refresh_interval = refresh_interval
+        self.refresh_window = float(refresh_window or settings.get('STREAM_REFRESH_WINDOW', 6 * 3600))
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.start_refresher()
+
+    def expires_at(self, streams: tuple) -> float:
+        """Returns the earliest expiry time of the given stream URLs."""
+        expiries = []
+        for url in streams:
+            match = self.EXPIRE_PATTERN.search(url or '')
+            if match:
+                expiries.append(int(match.group(1)))
+        return min(expiries) if expiries else time.time() + self.default_ttl
+
+    def get(self, video_id: str, quality: Quality = DEFAULT_QUALITY) -> tuple or None:
+        """Returns the cached stream URLs if they are still fresh."""
+        with self.lock:
+            entry = self.entries.get((video_id, quality))
+            if not entry or time.time() > entry['expires_at'] - self.expiry_margin:
+                return None
+            entry['last_used'] = time.time()
+            self.entries.move_to_end((video_id, quality))
+            return entry['streams']
+
+    def put(self, video_id: str, video_url: str, streams: tuple, quality: Quality = DEFAULT_QUALITY):
+        if not streams or not any(streams):
+            return
+        with self.lock:
+            self.entries[(video_id, quality)] = {
+                'url': video_url,
+                'streams': streams,
+                'expires_at': self.expires_at(streams),
+                'last_used': time.time(),
+            }
+            self.entries.move_to_end((video_id, quality))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_streams(self, video_id: str, video_url: str, quality: Quality = DEFAULT_QUALITY) -> tuple:
+        """Returns the (video, audio, combined) stream URLs for a video, resolving them on a cache miss."""
+        streams = self.get(video_id, quality)
+        if streams:
+            logger.debug("Stream cache hit: %s", video_id)
+            return streams
+        streams = self.resolver(video_url, quality.height, quality.codecs, quality.light_codec)
+        self.put(video_id, video_url, streams, quality)
+        return streams if streams else (None, None, None)
+
+    def refresh_stale(self):
+        """
+        Re-resolves entries used within the refresh window that will expire before the next refresh pass,
+        and drops expired entries that haven't been used within it.
+        """
+        now = time.time()
+        deadline = now + self.expiry_margin + self.refresh_interval
+        with self.lock:
+            recent = {key for key, entry in self.entries.items() if now - entry['last_used'] < self.refresh_window}
+            for key in [key for key, entry in self.entries.items() if key not in recent and entry['expires_at'] < now]:
+                del self.entries[key]
+            stale = [(key, entry['url']) for key, entry in self.entries.items()
+                     if key in recent and entry['expires_at'] < deadline]
+        for (video_id, quality), video_url in stale:
+            streams = self.resolver(video_url, quality.height, quality.codecs, quality.light_codec)
+            with self.lock:
+                entry = self.entries.get((video_id, quality))
+                if not entry:
+                    continue
+                if streams and any(streams):
+                    entry['streams'] = streams
+                    entry['expires_at'] = self.expires_at(streams)
+                elif entry['expires_at'] < time.time():
+                    del self.entries[(video_id, quality)]
+
+    def run_refresher(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh_stale()
+            except Exception as e:
+                logger.warning("Error refreshing stream cache: %s", e)
+
+    def start_refresher(self):
+        """Starts the background thread that keeps recently played streams fresh."""
+        thread = threading.Thread(target=self.run_refresher)
+        thread.daemon = True
+        thread.start()
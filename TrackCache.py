@@ -0,0 +1,183 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from SettingsPanel import get_settings, data_location
+
+logger = logging.getLogger(__name__)
+
+
+class TrackCache:
+    """
+    Persistent LRU cache mapping Spotify track ids to the YouTube video picked for them. It also remembers
+    videos whose streams could not be extracted, e.g. age-gated or region-locked ones, so they are skipped.
+    """
+    FIELDS = ('id', 'url', 'title', 'channel', 'duration', 'rank', 'score_breakdown', 'search_tier')
+
+    def __init__(self, path: str = None, max_entries: int = None, ttl: float = None, save_delay: float = None):
+        """
+        Args:
+            save_delay (float): Seconds to gather new matches and failures for before writing them,
+                TRACK_CACHE_SAVE_DELAY, default 2. 0 writes every change straight away.
+        """
+        settings = get_settings()
+        self.path = path or data_location('track_cache.json')
+        self.max_entries = int(max_entries or settings.get('TRACK_CACHE_SIZE', 2000))
+        self.ttl = float(ttl or settings.get('TRACK_CACHE_TTL', 30 * 24 * 3600))
+        self.failed_ttl = float(settings.get('FAILED_VIDEO_TTL', 7 * 24 * 3600))
+        self.entries = OrderedDict()
+        self.failed = {}  # video id -> time its streams failed
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.save_delay = float(save_delay if save_delay is not None else settings.get('TRACK_CACHE_SAVE_DELAY', 2))
+        self.save_timer = None
+        self.load()
+        atexit.register(self.flush)
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            # Entries are stored least recently used first. Expired ones are dropped and the rest trimmed to
+            # max_entries, as TRACK_CACHE_TTL or TRACK_CACHE_SIZE may have changed since the file was written.
+            now = time.time()
+            self.entries = OrderedDict((entry['track_id'], entry) for entry in data.get('entries', [])
+                                       if now - entry.get('cached_at', 0) <= self.ttl)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.failed = {video_id: failed_at for video_id, failed_at in data.get('failed', {}).items()
+                           if now - failed_at <= self.failed_ttl}
+        except (OSError, IOError, KeyError) as e:
+            logger.warning("Error reading track cache: %s", e)
+        except json.JSONDecodeError as e:
+            logger.warning("Error parsing track cache: %s", e)
+
+    def save(self):
+        if not self.path:
+            return
+        # Saves from different threads share the temporary file, so only one may write at a time. The snapshot is
+        # taken inside the same lock, so an older snapshot can't be written after a newer one.
+        with self.save_lock:
+            with self.lock:
+                data = {'entries': list(self.entries.values()), 'failed': dict(self.failed)}
+                self.save_timer = None
+            try:
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.path)
+            except (OSError, IOError) as e:
+                logger.error("Error writing track cache: %s", e)
+
+    def schedule_save(self):
+        """Saves after save_delay seconds, so a burst of changes, e.g. while prefetching, is written once."""
+        if self.save_delay <= 0:
+            self.save()
+            return
+        with self.lock:
+            if self.save_timer:
+                return
+            self.save_timer = threading.Timer(self.save_delay, self.save)
+            self.save_timer.daemon = True
+            self.save_timer.start()
+
+    def flush(self):
+        """Writes any changes still waiting for a scheduled save."""
+        with self.lock:
+            timer, self.save_timer = self.save_timer, None
+        if timer:
+            timer.cancel()
+            self.save()
+
+    def get(self, track_id: str) -> dict or None:
+        """Returns the cached video for a track, or None if it is missing or expired."""
+        if not track_id:
+            return None
+        with self.lock:
+            entry = self.entries.get(track_id)
+            if not entry or not entry.get('video'):
+                return None
+            if time.time() - entry['cached_at'] > self.ttl:
+                del self.entries[track_id]
+                return None
+            if self._has_failed(entry['video']['id']):
+                return None
+            self.entries.move_to_end(track_id)
+            return dict(entry['video'])
+
+    def rejected(self, track_id: str) -> list:
+        """Returns the video ids that were marked as wrong matches for a track."""
+        with self.lock:
+            entry = self.entries.get(track_id)
+            return list(entry.get('rejected', [])) if entry else []
+
+    def _has_failed(self, video_id: str) -> bool:
+        failed_at = self.failed.get(video_id)
+        if failed_at is None:
+            return False
+        if time.time() - failed_at > self.failed_ttl:
+            del self.failed[video_id]
+            return False
+        return True
+
+    def failed_videos(self) -> list:
+        """Returns the ids of videos whose streams recently failed to extract."""
+        with self.lock:
+            return [video_id for video_id in list(self.failed) if self._has_failed(video_id)]
+
+    def mark_failed(self, video_id: str):
+        """Remembers that a video's streams could not be extracted, for FAILED_VIDEO_TTL seconds."""
+        with self.lock:
+            self.failed[video_id] = time.time()
+        self.schedule_save()
+
+    def put(self, track_id: str, video: dict):
+        """Stores the winning video for a track, evicting the least recently used entries."""
+        if not track_id or not video:
+            return
+        with self.lock:
+            previous = self.entries.get(track_id) or {}
+            self.entries[track_id] = {
+                'track_id': track_id,
+                'cached_at': time.time(),
+                'video': {key: video.get(key) for key in self.FIELDS},
+                'rejected': previous.get('rejected', []),
+            }
+            self.entries.move_to_end(track_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        self.schedule_save()
+
+    def invalidate(self, track_id: str, video_id: str = None) -> bool:
+        """
+        Marks the match for a track as wrong so the next play searches and ranks again without it.
+        Args:
+            track_id (str): The Spotify track id.
+            video_id (str): The rejected video id, defaults to the cached match.
+        """
+        if not track_id:
+            return False
+        with self.lock:
+            entry = self.entries.setdefault(track_id, {'track_id': track_id, 'video': None, 'rejected': []})
+            video_id = video_id or (entry['video'] or {}).get('id')
+            if not video_id:
+                return False
+            if video_id not in entry['rejected']:
+                entry['rejected'].append(video_id)
+            entry['video'] = None
+            entry['cached_at'] = time.time()
+            self.entries.move_to_end(track_id)
+        self.save()
+        return True
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.failed.clear()
+        self.save()
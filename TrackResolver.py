@@ -0,0 +1,173 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+from SettingsPanel import get_settings
+from YoutubeSearcher import YoutubeSearcher
+from TrackCache import TrackCache
+from StreamCache import StreamCache
+from QualityController import Quality, QualityController, DEFAULT_QUALITY
+
+logger = logging.getLogger(__name__)
+
+NO_STREAMS = (None, None, None)
+
+
+class TrackResolver:
+    """Resolves Spotify tracks to a YouTube video and its stream URLs through the track and stream caches."""
+
+    def __init__(self, youtube_searcher: YoutubeSearcher, track_cache: TrackCache = None, stream_cache: StreamCache = None,
+                 candidates: int = None, quality: QualityController = None, workers: int = None):
+        """
+        Args:
+            candidates (int): Number of top ranked videos whose streams are extracted at once, so a video
+                that can't be played (age-gated, region-locked) falls through to the next. STREAM_CANDIDATES, default 3.
+            quality (QualityController): Picks the resolution and codecs streams are resolved at.
+            workers (int): Threads extracting streams, defaults to two tracks' worth of candidates.
+        """
+        self.youtube_searcher = youtube_searcher
+        self.track_cache = track_cache or TrackCache()
+        self.stream_cache = stream_cache or StreamCache(self.youtube_searcher.get_video_streams)
+        self.quality = quality
+        self.candidates = int(candidates or get_settings().get('STREAM_CANDIDATES', 3))
+        self.executor = ThreadPoolExecutor(max_workers=workers or self.candidates * 2, thread_name_prefix='streams')
+        self.in_flight = {}  # (track id, quality) -> the resolution in progress, shared by everyone asking for it
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def playable(streams: tuple) -> bool:
+        video_stream, audio_stream, combined_stream = streams
+        return bool(combined_stream or (video_stream and audio_stream))
+
+    def search_candidates(self, track: dict) -> list:
+        """Searches YouTube for the best matching videos, leaving out rejected matches and known-bad videos."""
+        logger.info("Searching YouTube for: %s by %s", track['track'], track['artists'])
+        rejected = self.track_cache.rejected(track['track_id'])
+        exclude = rejected + self.track_cache.failed_videos()
+        # A track whose earlier match was wrong is ambiguous, so it skips straight to the full search
+        return self.youtube_searcher.search_candidates(track, self.candidates, exclude=exclude, tiered=not rejected)
+
+    def find_video(self, track: dict) -> dict or None:
+        """Returns the video for a track, from the track cache when possible, otherwise by searching YouTube."""
+        cached = self.track_cache.get(track['track_id'])
+        if cached:
+            logger.debug("Track cache hit: %s (Rank: %s)", cached['title'], cached['rank'])
+            return cached
+        candidates = self.search_candidates(track)
+        if candidates:
+            self.track_cache.put(track['track_id'], candidates[0])
+        return candidates[0] if candidates else None
+
+    def current_quality(self) -> Quality:
+        return self.quality.current() if self.quality else DEFAULT_QUALITY
+
+    def get_streams(self, video: dict, quality: Quality = None) -> tuple:
+        """Returns the (video, audio, combined) stream URLs for a video, at the current quality unless given one."""
+        return self.stream_cache.get_streams(video['id'], video['url'], quality or self.current_quality())
+
+    def first_playable(self, candidates: list, cancelled=None, quality: Quality = None) -> tuple:
+        """
+        Extracts the streams of all candidates at once and returns the best ranked one that is playable, as soon as
+        every better ranked candidate has failed. Extractions that are no longer needed are cancelled.
+        Returns (video, streams, ids of the candidates that failed).
+        """
+        futures = [self.executor.submit(self.get_streams, candidate, quality) for candidate in candidates]
+        results = {}
+        try:
+            for future in as_completed(futures):
+                index = futures.index(future)
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    logger.warning("Error extracting streams for %s: %s", candidates[index]['id'], e)
+                    results[index] = NO_STREAMS
+                failed = [candidates[i]['id'] for i in sorted(results) if not self.playable(results[i])]
+                for i in range(len(candidates)):
+                    if i not in results:
+                        break
+                    if self.playable(results[i]):
+                        if failed:
+                            logger.info("Falling back to %s, no playable streams for %s", candidates[i]['title'], failed)
+                        return candidates[i], results[i], failed
+                if cancelled and cancelled():
+                    break
+            return None, NO_STREAMS, [candidate['id'] for i, candidate in enumerate(candidates)
+                                      if i in results and not self.playable(results[i])]
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def resolve(self, track: dict, cancelled=None, quality: Quality = None) -> tuple:
+        """
+        Returns the video for a track and its stream URLs, or (None, (None, None, None)). Concurrent calls for the
+        same track, from the prefetcher or from several zones, share one resolution, which is only cancelled once
+        every caller has cancelled.
+        Args:
+            track (dict): The track to resolve.
+            cancelled (callable): Returns True once the result is no longer wanted, checked between stages.
+            quality (Quality): The stream quality, defaults to the quality controller's current choice.
+        """
+        quality = quality or self.current_quality()
+        key = (track['track_id'], quality)
+        with self.lock:
+            flight = self.in_flight.get(key)
+            owner = flight is None
+            if owner:
+                flight = {'future': Future(), 'checks': [], 'cancelled': False}
+                self.in_flight[key] = flight
+            flight['checks'].append(cancelled)
+        if not owner:
+            result = flight['future'].result()
+            if flight['cancelled'] and not (cancelled and cancelled()):
+                # Joined a resolution that the callers before it gave up on, so it is started again
+                return self.resolve(track, cancelled, quality)
+            return result
+
+        def is_cancelled():
+            # Latches, as the resolution stops at the first check that finds every caller has cancelled
+            flight['cancelled'] = flight['cancelled'] or all(check and check() for check in flight['checks'])
+            return flight['cancelled']
+
+        try:
+            result = self._resolve(track, is_cancelled, quality)
+        except Exception as e:
+            self._land(key)
+            flight['future'].set_exception(e)
+            raise
+        flight['cancelled'] = flight['cancelled'] and result[0] is None
+        # Landed before the result is published, so a caller starting again doesn't join this flight
+        self._land(key)
+        flight['future'].set_result(result)
+        return result
+
+    def _land(self, key: tuple):
+        with self.lock:
+            del self.in_flight[key]
+
+    def _resolve(self, track: dict, cancelled, quality: Quality) -> tuple:
+        failed = []
+        cached = self.track_cache.get(track['track_id'])
+        if cached:
+            logger.debug("Track cache hit: %s (Rank: %s)", cached['title'], cached['rank'])
+            streams = self.get_streams(cached, quality)
+            if self.playable(streams):
+                return cached, streams
+            failed.append(cached['id'])
+        if cancelled():
+            return None, NO_STREAMS
+        candidates = [candidate for candidate in self.search_candidates(track) if candidate['id'] not in failed]
+        if cancelled():
+            return None, NO_STREAMS
+        video, streams, candidate_failures = self.first_playable(candidates, cancelled, quality)
+        if not video:
+            # When nothing plays the network is the likelier culprit, so the failures are not remembered
+            return None, NO_STREAMS
+        for video_id in failed + candidate_failures:
+            self.track_cache.mark_failed(video_id)
+        self.track_cache.put(track['track_id'], video)
+        return video, streams
+
+    def reject(self, track: dict, video: dict):
+        """Marks a video as a wrong match for a track so the next resolution re-ranks without it."""
+        self.track_cache.invalidate(track['track_id'], video['id'])
+        self.youtube_searcher.search_tiers.reject(video.get('search_tier'))
@@ -1,20 +1,44 @@
+import logging
 import sys
 import os
 import vlc
 from PyQt5 import QtWidgets, QtGui, QtCore
 import time
+from collections import deque
 from SpotifyPlayer import SpotifyPlayer
 from SettingsPanel import show_settings_panel, get_settings
+from AVSync import AVSyncEngine, PlayerClock
+from MediaProxy import MediaProxy
+from Metrics import metrics
+
+logger = logging.getLogger(__name__)
 
 
 class MusicVideoPlayer(QtWidgets.QMainWindow):
     """A music video player using VLC and PyQt5 with support for separate video and audio streams."""
     media_loaded = QtCore.pyqtSignal(str)
     seek_complete = QtCore.pyqtSignal()
-
-    def __init__(self, spotify_player=None, master=None):
+    player_event = QtCore.pyqtSignal(object, str, float)
+    rerank_requested = QtCore.pyqtSignal()
+    preload_requested = QtCore.pyqtSignal(tuple)
+    swap_requested = QtCore.pyqtSignal(str)
+    track_stats_ready = QtCore.pyqtSignal(dict)
+    # VLC's hardware decoder for each platform, 'any' lets VLC probe VA-API or VDPAU on Linux
+    HW_DECODERS = {'win32': 'd3d11va', 'darwin': 'videotoolbox'}
+
+    def __init__(self, spotify_player=None, master=None, vlc_instance=None, media_proxy=None, zone: str = None):
+        """
+        Args:
+            vlc_instance: The vlc.Instance to create players on, shared between zones in multi-zone mode.
+            media_proxy (MediaProxy): A running caching proxy to share, instead of starting one per window.
+            zone (str): The zone name shown in the window title in multi-zone mode.
+        """
         super().__init__(master)
         self.spotify_player = spotify_player
+        self.vlc_instance = vlc_instance
+        self.media_proxy = media_proxy
+        self.zone = zone
+        self.title = f"{zone} - Music Video Player" if zone else "Music Video Player"
         self._load_settings()
         self._initialize_players()
         self._create_ui()
@@ -26,10 +50,17 @@ class MusicVideoPlayer(QtWidgets.QMainWindow):
         settings = get_settings()
         self.start_muted = settings.get('START_MUTED', True)
         self.start_fullscreen = settings.get('START_FULLSCREEN', False)
-        
+        self.double_buffer = settings.get('DOUBLE_BUFFER', False)
+        self.sync_to_spotify = settings.get('SYNC_TO_SPOTIFY', True)
+        self.sync_tolerance_ms = float(settings.get('SYNC_TOLERANCE_MS', 150))
+        self.sync_seek_threshold_ms = float(settings.get('SYNC_SEEK_THRESHOLD_MS', 2000))
+        self.use_media_proxy = settings.get('MEDIA_PROXY', False)
+        self.hw_decoding = settings.get('HW_DECODING', True)
+        self.prefer_separate_streams = settings.get('PREFER_SEPARATE_STREAMS', False)
+
 
     def _initialize_players(self):
-        self.instance = vlc.Instance('--no-xlib')
+        self.instance = self.vlc_instance or vlc.Instance('--no-xlib')
         self.video_player = self.instance.media_player_new()
         self.audio_player = self.instance.media_player_new()
         self.isPaused = False
@@ -37,20 +68,52 @@ class MusicVideoPlayer(QtWidgets.QMainWindow):
         self.audio_media = None
         self.media_name = None
         self.paused_before_seek = False
-        self.seek_timer = QtCore.QTimer()
-        self.seek_timer.timeout.connect(self._check_seek_complete)
         self.seek_start_time = None
+        self.target_seek_time = None
+        self.intro_offset_ms = 0.0  # Where the song starts in the current video
+        self.pending_seek = None
+        self.seek_latencies = deque(maxlen=100)
+        self.awaiting_first_frame = False
+        self.track_stats = None
+        self.stalled = False
+        self.seek_debounce_timer = QtCore.QTimer()
+        self.seek_debounce_timer.setSingleShot(True)
+        self.seek_debounce_timer.setInterval(50)
+        self.seek_debounce_timer.timeout.connect(self._apply_seek)
+        self.seek_timeout_timer = QtCore.QTimer()
+        self.seek_timeout_timer.setSingleShot(True)
+        self.seek_timeout_timer.setInterval(10000)
+        self.seek_timeout_timer.timeout.connect(self._on_seek_timeout)
+        # Hidden players that pre-buffer the predicted next video
+        self.standby_video_player = self.instance.media_player_new()
+        self.standby_audio_player = self.instance.media_player_new()
+        self.standby = None
+        for player in (self.video_player, self.audio_player, self.standby_video_player, self.standby_audio_player):
+            self._attach_player_events(player)
+        self.sync_engine = AVSyncEngine()
+        self.video_clock = PlayerClock()
+        if self.use_media_proxy and not self.media_proxy:
+            try:
+                self.media_proxy = MediaProxy()
+                self.media_proxy.start()
+            except OSError as e:
+                logger.warning("Error starting media proxy: %s", e)
+                self.media_proxy = None
 
     def _create_ui(self):
-        self.setWindowTitle("Music Video Player")
+        self.setWindowTitle(self.title)
         central_widget = QtWidgets.QWidget(self)
         self.setCentralWidget(central_widget)
 
         self.videoframe = self._create_video_frame()
-        
+        self.standby_frame = self._create_video_frame()
+        self.frames = QtWidgets.QStackedWidget()
+        self.frames.addWidget(self.videoframe)
+        self.frames.addWidget(self.standby_frame)
+
         layout = QtWidgets.QVBoxLayout()
         layout.setContentsMargins(0, 0, 0, 0)
-        layout.addWidget(self.videoframe)
+        layout.addWidget(self.frames)
         central_widget.setLayout(layout)
 
         self.timer = QtCore.QTimer(self)
@@ -69,6 +132,9 @@ class MusicVideoPlayer(QtWidgets.QMainWindow):
     def _setup_signals(self):
         self.media_loaded.connect(self._on_media_loaded)
         self.seek_complete.connect(self._on_seek_complete)
+        self.player_event.connect(self._on_player_event)
+        self.preload_requested.connect(self._on_preload_requested)
+        self.swap_requested.connect(self._on_swap_requested)
         self.shortcut_fullscreen = QtWidgets.QShortcut(QtGui.QKeySequence("F"), self)
         self.shortcut_fullscreen.activated.connect(self.toggle_fullscreen)
         self.shortcut_mute = QtWidgets.QShortcut(QtGui.QKeySequence("M"), self)
@@ -83,6 +149,8 @@ class MusicVideoPlayer(QtWidgets.QMainWindow):
         self.shortcut_toggle_spotify_mute.activated.connect(self.spotify_player.previous_song)
         self.shortcut_settings = QtWidgets.QShortcut(QtGui.QKeySequence("H"), self)
         self.shortcut_settings.activated.connect(self.show_settings)
+        self.shortcut_rerank = QtWidgets.QShortcut(QtGui.QKeySequence("R"), self)
+        self.shortcut_rerank.activated.connect(self.rerank_requested.emit)
         
     def show_settings(self):
         if show_settings_panel(self):
@@ -107,7 +175,7 @@ class MusicVideoPlayer(QtWidgets.QMainWindow):
         if hasattr(self, 'spotify_player'):
             self.spotify_player.toggle_mute()
         else:
-            print("Spotify player not initialized")
+            logger.warning("Spotify player not initialized")
 
     def toggle_play_pause(self):
         if not self.isPaused:
@@ -137,67 +205,146 @@ class MusicVideoPlayer(QtWidgets.QMainWindow):
             audio_time = self.audio_player.get_time()
             if abs(video_time - audio_time) > 50: 
                 self.audio_player.set_time(video_time)
-        
+            self.sync_engine.reset(self.audio_player)
+
     def toggle_mute(self):
         self.audio_player.audio_toggle_mute()
 
-    def get_buffered_amount(self):
-        video_buffered = 0
-        audio_buffered = 0
-        
-        if self.video_player:
-            video_stats = self.video_player.get_stats()
-            video_demux_read_bytes = video_stats.get('demux_read_bytes', 0)
-            video_input_bitrate = video_stats.get('input_bitrate', 0)
-            
-            if video_input_bitrate > 0:
-                video_buffered = (video_demux_read_bytes * 8) / (video_input_bitrate * 1000) * 1000
-
-        if self.audio_media and self.audio_player:
-            audio_stats = self.audio_player.get_stats()
-            audio_demux_read_bytes = audio_stats.get('demux_read_bytes', 0)
-            audio_input_bitrate = audio_stats.get('input_bitrate', 0)
-            
-            if audio_input_bitrate > 0:
-                audio_buffered = (audio_demux_read_bytes * 8) / (audio_input_bitrate * 1000) * 1000
-
-        return (video_buffered, audio_buffered if self.audio_media else None)
+    def spotify_position(self) -> float or None:
+        """Returns Spotify's estimated playback position in ms, or None if it is unknown."""
+        clock = getattr(self.spotify_player, 'clock', None)
+        return clock.position() if clock else None
+
+    def sync_with_spotify(self):
+        """Keeps the video within the sync tolerance of Spotify, nudging its rate for small errors and seeking for large ones."""
+        song_position = self.spotify_position()
+        if song_position is None or self.is_seeking or self.isPaused or self.video_player.get_state() != vlc.State.Playing:
+            return
+        target = song_position + self.intro_offset_ms
+        length = self.video_player.get_length()
+        if length > 0 and target >= length:
+            return
+        position = self.video_clock.position(self.video_player, time.monotonic())
+        if position is None:
+            return
+
+        error = position - target
+        rate = self.video_player.get_rate()
+        if abs(error) > self.sync_seek_threshold_ms:
+            logger.info("Video is %.0f ms off Spotify, seeking", error)
+            self.video_player.set_rate(1.0)
+            self.seek(int(song_position))
+            return
+        if abs(error) > self.sync_tolerance_ms:
+            rate = 1.0 - max(-0.08, min(0.08, error / 2000))
+        elif abs(error) < self.sync_tolerance_ms / 2:
+            rate = 1.0
+        if abs(rate - self.video_player.get_rate()) >= 0.002:
+            self.video_player.set_rate(rate)
+
+    def _attach_player_events(self, player):
+        """Forwards the VLC events the seek subsystem needs to the Qt thread."""
+        events = player.event_manager()
+        for event_type in (vlc.EventType.MediaPlayerBuffering, vlc.EventType.MediaPlayerTimeChanged,
+                           vlc.EventType.MediaPlayerPlaying):
+            events.event_attach(event_type, self._on_vlc_event, player)
+
+    def _on_vlc_event(self, event, player):
+        # Called on a VLC thread
+        if event.type == vlc.EventType.MediaPlayerBuffering:
+            self.player_event.emit(player, 'buffering', float(event.u.new_cache))
+        elif event.type == vlc.EventType.MediaPlayerTimeChanged:
+            self.player_event.emit(player, 'time', float(event.u.new_time))
+        else:
+            self.player_event.emit(player, 'playing', 0.0)
+
+    @QtCore.pyqtSlot(object, str, float)
+    def _on_player_event(self, player, event_name, value):
+        if event_name == 'playing' and player is self.video_player and self.awaiting_first_frame:
+            self.awaiting_first_frame = False
+            metrics.track_stage('first_frame', end=True, zone=self.zone)
+        if event_name == 'buffering' and player is self.video_player and self.track_stats:
+            # Buffering after the first frame and outside a seek means the stream can't keep up
+            stalled = value < 100 and not self.awaiting_first_frame and not self.is_seeking
+            if stalled and not self.stalled:
+                self.track_stats['stalls'] += 1
+            self.stalled = stalled
+        if not self.pending_seek:
+            return
+        state = self.pending_seek['players'].get(id(player))
+        if state is None:
+            return
+        if event_name == 'buffering':
+            state['buffering'] = value < 100
+        elif event_name == 'time':
+            state['on_target'] = abs(value - self.pending_seek['target']) < 500
+        elif event_name == 'playing':
+            state['buffering'] = False
+        if all(player_state['on_target'] and not player_state['buffering']
+               for player_state in self.pending_seek['players'].values()):
+            self._finish_seek(timed_out=False)
 
     def seek(self, time_ms):
-        if self.video_media:
+        """
+        Seeks both players to a position in the song, shifted by the intro offset of the video.
+        Seeks requested in quick succession are merged into one.
+        """
+        if not self.video_media:
+            logger.error("No media loaded.")
+            return
+        if not self.is_seeking:
             self.is_seeking = True
             self.paused_before_seek = self.isPaused
-            self.target_seek_time = time_ms
-            self.video_player.set_time(time_ms)
-            if self.audio_media:
-                self.audio_player.set_time(time_ms)
-            
-            self.seek_start_time = time.time()
-            QtCore.QTimer.singleShot(200, self._check_seek_complete)
-        else:
-            print("Error: No media loaded.")
-
-    def _check_seek_complete(self):
-        current_video_time = self.video_player.get_time()
-        video_buffered, audio_buffered = self.get_buffered_amount()
-        
-        video_seek_complete = abs(current_video_time - self.target_seek_time) < 500 and video_buffered > 2000
-        audio_seek_complete = True  # Default to True if there's no audio
-
-        if self.audio_media:
-            current_audio_time = self.audio_player.get_time()
-            audio_seek_complete = abs(current_audio_time - self.target_seek_time) < 500 and audio_buffered > 2000
-
-        if video_seek_complete and audio_seek_complete:
-            if self.video_player.get_state() in [vlc.State.Playing, vlc.State.Paused]:
-                self.seek_complete.emit()
-                return
-
-        if time.time() - self.seek_start_time > 10:  # 10 second timeout
-            print("Seek timeout")
-            self.seek_complete.emit()
-        else:
-            QtCore.QTimer.singleShot(100, self._check_seek_complete)
+            self.seek_start_time = time.perf_counter()
+        self.target_seek_time = max(0, int(time_ms + self.intro_offset_ms))
+        # Restarting the debounce timer merges repeated seeks into the last one
+        self.seek_debounce_timer.start()
+
+    def set_intro_offset(self, offset_ms: float):
+        """Sets where the song starts in the current video and moves the video to match."""
+        change = offset_ms - self.intro_offset_ms
+        self.intro_offset_ms = offset_ms
+        if abs(change) < self.sync_tolerance_ms or not self.video_media:
+            return
+        position = self.spotify_position()
+        if position is None:
+            position = self.video_player.get_time() - offset_ms + change
+        logger.info("Shifting video by %.0f ms to where the song starts", change)
+        self.seek(int(position))
+
+    def _apply_seek(self):
+        players = [self.video_player] + ([self.audio_player] if self.audio_media else [])
+        self.pending_seek = {
+            'target': self.target_seek_time,
+            'players': {id(player): {'on_target': False, 'buffering': False} for player in players},
+        }
+        for player in players:
+            player.set_time(self.target_seek_time)
+        self.seek_timeout_timer.start()
+
+    def _on_seek_timeout(self):
+        logger.warning("Seek timeout")
+        self._finish_seek(timed_out=True)
+
+    def _finish_seek(self, timed_out: bool):
+        self.seek_timeout_timer.stop()
+        self.pending_seek = None
+        if not timed_out:
+            self.seek_latencies.append(time.perf_counter() - self.seek_start_time)
+            logger.debug("Seek completed in %.0f ms", self.seek_latencies[-1] * 1000)
+        self.seek_complete.emit()
+
+    def seek_stats(self) -> dict:
+        """Returns statistics of the recent seek completion times, in ms."""
+        latencies = sorted(latency * 1000 for latency in self.seek_latencies)
+        if not latencies:
+            return {'count': 0}
+        return {
+            'count': len(latencies),
+            'mean': sum(latencies) / len(latencies),
+            'median': latencies[len(latencies) // 2],
+            'max': latencies[-1],
+        }
 
     @QtCore.pyqtSlot()
     def _on_seek_complete(self):
@@ -220,24 +367,32 @@ class MusicVideoPlayer(QtWidgets.QMainWindow):
         video_stream, audio_stream = streams
 
         if not video_stream or not audio_stream:
-            print("Both video and audio streams must be provided.")
+            logger.warning("Both video and audio streams must be provided.")
             return
 
-        self.video_media = self.instance.media_new(video_stream)
-        self.audio_media = self.instance.media_new(audio_stream)
+        metrics.track_stage('play_media', zone=self.zone)
+        self.awaiting_first_frame = True
+        self.intro_offset_ms = 0.0
+        if self._take_standby(video_stream):
+            return
 
-        self.video_media.add_option('avcodec-hw=d3d11va')
-        self.audio_media.add_option('avcodec-hw=d3d11va')
+        with metrics.span('play_media_seconds'):
+            self.video_media = self.instance.media_new(self._proxied(video_stream))
+            self.audio_media = self.instance.media_new(self._proxied(audio_stream))
 
-        self.video_player.set_media(self.video_media)
-        self.audio_player.set_media(self.audio_media)
+            self.video_media.add_option(self._hw_decoding_option())
 
-        try:
-            self.video_player.play()
-            self.audio_player.play()
-            self.media_loaded.emit(video_stream)
-        except Exception as e:
-            print(f"Error playing streams: {e}")
+            self.video_player.set_media(self.video_media)
+            self.audio_player.set_media(self.audio_media)
+            self.sync_engine.reset(self.audio_player)
+            self._start_track_stats()
+
+            try:
+                self.video_player.play()
+                self.audio_player.play()
+                self.media_loaded.emit(video_stream)
+            except Exception as e:
+                logger.error("Error playing streams: %s", e)
 
     @QtCore.pyqtSlot(str)
     def _on_media_loaded(self, media_path):
@@ -248,39 +403,198 @@ class MusicVideoPlayer(QtWidgets.QMainWindow):
                 self.audio_player.play()
             self.timer.start()
         except Exception as e:
-            print(f"Error in _on_media_loaded: {e}")
+            logger.error("Error in _on_media_loaded: %s", e)
 
     def play_media(self, media_path: str, song_name: str = None):
         if not media_path:
             return
 
         self.media_name = song_name
-        self.setWindowTitle(f"Music Video Player - {song_name}" if song_name else "Music Video Player")
+        self.setWindowTitle(f"{self.title} - {song_name}" if song_name else self.title)
+
+        metrics.track_stage('play_media', zone=self.zone)
+        self.awaiting_first_frame = True
+        self.intro_offset_ms = 0.0
+        if self._take_standby(media_path):
+            return
 
         try:
-            media = self.instance.media_new(media_path)
-            self.video_player.set_media(media)
-            self.video_media = media
-            self.audio_media = None  # Reset audio_media for combined streams
-            self.video_media.parse()
-            self.media_loaded.emit(media_path)
+            with metrics.span('play_media_seconds'):
+                media = self.instance.media_new(self._proxied(media_path))
+                media.add_option(self._hw_decoding_option())
+                self.video_player.set_media(media)
+                self.video_media = media
+                self.audio_media = None  # Reset audio_media for combined streams
+                self._start_track_stats()
+                self.media_loaded.emit(media_path)
         except Exception as e:
-            print(f"Error playing media: {e}")
+            logger.error("Error playing media: %s", e)
+
+    def pick_streams(self, streams: tuple) -> tuple or None:
+        """
+        Picks which of the resolved (video, audio, combined) streams to play: (combined, None), or (video, audio)
+        for separate streams, or None if nothing is playable. The first stream is the key the standby is held under.
+        """
+        video_stream, audio_stream, combined_stream = streams
+        separate = (video_stream, audio_stream) if video_stream and audio_stream else None
+        if self.prefer_separate_streams and separate:
+            return separate
+        if combined_stream:
+            return combined_stream, None
+        return separate
+
+    def preload(self, streams: tuple):
+        """
+        Opens the predicted next video on the hidden standby players so it is buffered and paused on its first frame.
+        Args:
+            streams (tuple): The (video, audio, combined) stream URLs, played the same way the listener would.
+        """
+        if not self.double_buffer:
+            return
+        picked = self.pick_streams(streams)
+        if not picked or (self.standby and self.standby['key'] == picked[0]):
+            return
+        key, audio_stream = picked
+        self.standby_video_player.stop()
+        self.standby_audio_player.stop()
+        video_media = self.instance.media_new(self._proxied(key))
+        video_media.add_option(':start-paused')
+        video_media.add_option(self._hw_decoding_option())
+        audio_media = None
+        if audio_stream:
+            audio_media = self.instance.media_new(self._proxied(audio_stream))
+            audio_media.add_option(':start-paused')
+        self.standby_video_player.set_media(video_media)
+        self.standby_video_player.audio_set_mute(True)
+        self._set_platform_specific_window(self.standby_video_player, self.standby_frame)
+        self.standby_video_player.play()
+        if audio_media:
+            self.standby_audio_player.set_media(audio_media)
+            self.standby_audio_player.play()
+        self.standby = {'key': key, 'video_media': video_media, 'audio_media': audio_media}
+
+    @QtCore.pyqtSlot(tuple)
+    def _on_preload_requested(self, streams):
+        try:
+            self.preload(streams)
+        except Exception as e:
+            logger.error("Error preloading streams: %s", e)
+
+    def _hw_decoding_option(self) -> str:
+        decoder = self.HW_DECODERS.get(sys.platform, 'any') if self.hw_decoding else 'none'
+        return f":avcodec-hw={decoder}"
+
+    def _start_track_stats(self):
+        """Reports the statistics of the previous track and starts collecting them for the new one."""
+        self._finish_track_stats()
+        self.stalled = False
+        self.track_stats = {
+            'media': self.video_media,
+            'sampled_at': time.perf_counter(),
+            'cpu_started': time.process_time(),
+            'wall_started': time.perf_counter(),
+            'seconds': 0.0,
+            'stalls': 0,
+            'input_bps': [],
+            'vlc': None,
+        }
+
+    def _sample_track_stats(self):
+        stats = self.track_stats
+        if not stats or stats['media'] is not self.video_media:
+            return
+        now = time.perf_counter()
+        playing = self.video_player.get_state() == vlc.State.Playing
+        if playing and not self.stalled:
+            stats['seconds'] += now - stats['sampled_at']
+        stats['sampled_at'] = now
+        media_stats = vlc.MediaStats()
+        if playing and self.video_media.get_stats(media_stats):
+            # VLC reports rates in bytes per microsecond. It reads nothing while its buffer is full, so those samples
+            # say nothing about the bandwidth.
+            if media_stats.input_bitrate > 0:
+                stats['input_bps'].append(media_stats.input_bitrate * 1e6)
+            stats['vlc'] = media_stats
+
+    def _finish_track_stats(self):
+        stats, self.track_stats = self.track_stats, None
+        if not stats or not stats['vlc'] or not stats['seconds']:
+            return
+        media_stats = stats['vlc']
+        frames = media_stats.displayed_pictures + media_stats.lost_pictures
+        wall = time.perf_counter() - stats['wall_started']
+        self.track_stats_ready.emit({
+            'seconds': stats['seconds'],
+            'drop_ratio': media_stats.lost_pictures / frames if frames else 0.0,
+            'cpu': (time.process_time() - stats['cpu_started']) / wall / (os.cpu_count() or 1) if wall else 0.0,
+            'stalls': stats['stalls'],
+            # The mean, as a single burst from the proxy's cache would make the peak look like plenty of bandwidth
+            'input_bps': sum(stats['input_bps']) / len(stats['input_bps']) if stats['input_bps'] else 0.0,
+            'media_bps': media_stats.demux_read_bytes / stats['seconds'],
+        })
+
+    def _proxied(self, url: str) -> str:
+        """Routes remote streams through the local caching proxy when it is enabled."""
+        if self.media_proxy and url.startswith(('http://', 'https://')):
+            return self.media_proxy.url_for(url)
+        return url
+
+    def _take_standby(self, key: str) -> bool:
+        """Requests a swap to the standby players if they hold the given stream."""
+        if self.double_buffer and self.standby and self.standby['key'] == key:
+            self.swap_requested.emit(key)
+            return True
+        return False
 
-    def _set_platform_specific_window(self):
+    @QtCore.pyqtSlot(str)
+    def _on_swap_requested(self, key):
+        if not self.standby or self.standby['key'] != key:
+            return
+        # The incoming players take over the outgoing ones' mute state, the standby video having been preloaded muted
+        video_muted = self.video_player.audio_get_mute()
+        audio_muted = self.audio_player.audio_get_mute()
+        self.video_player, self.standby_video_player = self.standby_video_player, self.video_player
+        self.audio_player, self.standby_audio_player = self.standby_audio_player, self.audio_player
+        self.videoframe, self.standby_frame = self.standby_frame, self.videoframe
+        self.video_media = self.standby['video_media']
+        self.audio_media = self.standby['audio_media']
+        self.standby = None
+        self._start_track_stats()
+
+        self.frames.setCurrentWidget(self.videoframe)
+        self.video_player.audio_set_mute(video_muted)
+        self.audio_player.audio_set_mute(audio_muted)
+        self.video_player.play()
+        if self.audio_media:
+            self.audio_player.play()
+        # The standby player is already playing, so its Playing event may have passed
+        if self.awaiting_first_frame:
+            self.awaiting_first_frame = False
+            metrics.track_stage('first_frame', end=True, zone=self.zone)
+        self.standby_video_player.stop()
+        self.standby_audio_player.stop()
+        self.sync_engine.reset(self.audio_player)
+        self.isPaused = False
+        self.timer.start()
+
+    def _set_platform_specific_window(self, player=None, frame=None):
+        player = player or self.video_player
+        frame = frame or self.videoframe
         if sys.platform.startswith('linux'):
-            self.video_player.set_xwindow(int(self.videoframe.winId()))
+            player.set_xwindow(int(frame.winId()))
         elif sys.platform == "win32":
-            self.video_player.set_hwnd(int(self.videoframe.winId()))
+            player.set_hwnd(int(frame.winId()))
         elif sys.platform == "darwin":
-            self.video_player.set_nsobject(int(self.videoframe.winId()))
+            player.set_nsobject(int(frame.winId()))
         else:
             raise RuntimeError(f"Unsupported platform: {sys.platform}")
 
     def update_ui(self):
         if not QtCore.QThread.currentThread() == QtCore.QCoreApplication.instance().thread():
             return
-        base_title = f"{self.media_name}" if self.media_name else "Music Video Player"
+        base_title = f"{self.media_name}" if self.media_name else self.title
+        if self.zone and self.media_name:
+            base_title = f"{self.zone} - {base_title}"
         status = "Paused" if self.isPaused else "Seeking" if self.is_seeking else "Playing"
         self.setWindowTitle(f"{base_title} ({status})")
         
@@ -291,11 +605,20 @@ class MusicVideoPlayer(QtWidgets.QMainWindow):
             self.isPaused = (video_state == vlc.State.Paused)
         
         if video_state == vlc.State.Error:
-            print("Video playback error detected. Attempting to reset...")
+            logger.warning("Video playback error detected. Attempting to reset...")
             self.video_player.stop()
             self.video_player.play()
         
         if self.audio_media and self.audio_player.get_state() == vlc.State.Error:
-            print("Audio playback error detected. Attempting to reset...")
+            logger.warning("Audio playback error detected. Attempting to reset...")
             self.audio_player.stop()
             self.audio_player.play()
+
+        if self.sync_to_spotify:
+            self.sync_with_spotify()
+
+        self._sample_track_stats()
+
+        # Keep separate audio in step with the video between seeks
+        if self.audio_media and not self.is_seeking and not self.isPaused:
+            self.sync_engine.tick(self.video_player, self.audio_player)
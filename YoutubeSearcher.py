@@ -1,10 +1,161 @@
+import logging
+import math
+import queue
+import threading
+from contextlib import contextmanager
 from typing import List, Dict, Any
 
-import yt_dlp
-from yt_dlp.utils import DownloadError
-from janome.tokenizer import Tokenizer
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from SettingsPanel import get_settings
+from StartupProfile import profiler
+from Metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# numpy, scikit-learn, janome and yt-dlp are imported where they are first used, so importing this module
+# stays cheap and the window can show before they load. YoutubeSearcher.warm_up loads them in the background.
+
+_tokenizers = threading.local()
+_tokenizer_lock = threading.Lock()
+
+
+def get_tokenizer():
+    """
+    Returns this thread's Janome tokenizer. A tokenizer can't be used by two threads at once, but all of them
+    share the system dictionary, so only the first one is slow to create.
+    """
+    tokenizer = getattr(_tokenizers, 'tokenizer', None)
+    if tokenizer is None:
+        # Serialized so concurrent first searches don't each load the dictionary
+        with _tokenizer_lock:
+            from janome.tokenizer import Tokenizer
+            tokenizer = _tokenizers.tokenizer = Tokenizer()
+    return tokenizer
+
+
+def pairwise_tfidf_similarity(docs, others):
+    """
+    Cosine similarity of TF-IDF vectors for each row pair of two count matrices, where the IDF of every
+    pair is fitted on just those two documents, as TfidfVectorizer().fit_transform([doc, other]) would.
+    Args:
+        docs: Sparse term counts, one row per document.
+        others: Sparse term counts over the same vocabulary, one row per document to compare against.
+    """
+    import numpy as np
+
+    docs = docs.astype(np.float64)
+    others = others.astype(np.float64)
+    # With smooth_idf over two documents a shared term has idf 1 and any other term 1 + ln(1.5)
+    unique_weight = (1 + math.log(1.5)) ** 2
+    shared = (docs > 0).multiply(others > 0)
+
+    def norms(counts):
+        squared = counts.multiply(counts)
+        total = np.asarray(squared.sum(axis=1)).ravel()
+        in_shared = np.asarray(squared.multiply(shared).sum(axis=1)).ravel()
+        return np.sqrt(unique_weight * total - (unique_weight - 1) * in_shared)
+
+    dot = np.asarray(docs.multiply(others).sum(axis=1)).ravel()
+    denominator = norms(docs) * norms(others)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, dot / denominator, 0.0)
+
+
+class YoutubeDLPool:
+    """
+    Pool of reusable YoutubeDL instances created with the same options. A YoutubeDL instance is not safe to
+    share between threads, so each caller borrows one for the duration of a call. Reusing instances keeps
+    their initialised extractors and their HTTP session, and with it keep-alive connections and cookies.
+    """
+
+    def __init__(self, opts: dict, size: int = 2, extractors: tuple = (), factory=None):
+        self.opts = opts
+        self.size = size
+        self.extractors = extractors
+        self.factory = factory
+        self.idle = queue.LifoQueue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def _create(self):
+        if self.factory:
+            ydl = self.factory(self.opts)
+        else:
+            import yt_dlp
+
+            ydl = yt_dlp.YoutubeDL(self.opts)
+        for extractor in self.extractors:
+            ydl.get_info_extractor(extractor)
+        return ydl
+
+    def _create_counted(self):
+        """Creates an instance already counted in created, taking it off the count again if creating it fails."""
+        try:
+            return self._create()
+        except Exception:
+            with self.lock:
+                self.created -= 1
+            raise
+
+    def prewarm(self):
+        """Creates instances up to the pool size ahead of the first request."""
+        while True:
+            with self.lock:
+                if self.created >= self.size:
+                    return
+                self.created += 1
+            self.idle.put(self._create_counted())
+
+    @contextmanager
+    def borrow(self):
+        """Lends out an idle instance, creating one while the pool is below its size, otherwise waiting for one."""
+        try:
+            ydl = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                create = self.created < self.size
+                if create:
+                    self.created += 1
+            ydl = self._create_counted() if create else self.idle.get()
+        try:
+            yield ydl
+        finally:
+            self.idle.put(ydl)
+
+
+class SearchTiers:
+    """
+    Counts, for each search tier, how often it was tried, how often it answered the search and how often its
+    answer was rejected as a wrong match, and serves them as gauges for tuning the tiers.
+    """
+    SPANS = {'targeted': 'youtube_targeted_search_seconds', 'quick': 'youtube_quick_search_seconds',
+             'full': 'youtube_search_seconds'}
+
+    def __init__(self):
+        self.counts = {tier: {'tried': 0, 'hits': 0, 'rejected': 0} for tier in self.SPANS}
+        self.lock = threading.Lock()
+        metrics.add_gauges(self.gauges)
+
+    def record(self, tier: str, hit: bool) -> bool:
+        """Counts a search of a tier. Returns whether the tier answered it."""
+        with self.lock:
+            self.counts[tier]['tried'] += 1
+            self.counts[tier]['hits'] += hit
+        return hit
+
+    def reject(self, tier: str):
+        if tier in self.counts:
+            with self.lock:
+                self.counts[tier]['rejected'] += 1
+
+    def gauges(self) -> dict:
+        gauges = {}
+        with self.lock:
+            for tier, counts in self.counts.items():
+                for name, value in counts.items():
+                    gauges[f'youtube_search_tier_{name}{{tier="{tier}"}}'] = value
+                if counts['tried']:
+                    gauges[f'youtube_search_tier_hit_rate{{tier="{tier}"}}'] = counts['hits'] / counts['tried']
+        return gauges
 
 
 class YoutubeSearcher:
@@ -14,20 +165,112 @@ class YoutubeSearcher:
         'default_search': 'ytsearchviewcount', 'prefer_insecure': True,
         'extract_flat': True,
     }
+    STREAM_OPTS = {
+        'format': 'bestvideo+bestaudio/best',
+        'no_warnings': True,
+        'quiet': True,
+        'no_check_certificate': True,
+        'prefer_insecure': True,
+        'nocheckcertificate': True,
+    }
 
-    def __init__(self):
-        self.ydl = yt_dlp.YoutubeDL(self.YDL_OPTS)
+    def __init__(self, warm_up: bool = True, ydl_factory=None, pool_size: int = None):
+        """
+        Args:
+            warm_up (bool): Load the heavy dependencies on a background thread right away.
+            ydl_factory: Callable creating a YoutubeDL compatible object from options, in place of yt_dlp.YoutubeDL.
+            pool_size (int): YoutubeDL instances per pool, YTDL_POOL_SIZE by default.
+        """
+        settings = get_settings()
+        pool_size = int(pool_size or settings.get('YTDL_POOL_SIZE', 3))
+        self.targeted_search = settings.get('TARGETED_SEARCH', True)
+        self.targeted_search_count = int(settings.get('TARGETED_SEARCH_COUNT', 5))
+        self.exact_duration_tolerance = float(settings.get('EXACT_DURATION_TOLERANCE', 3))
+        self.quick_search_count = int(settings.get('QUICK_SEARCH_COUNT', 5))
+        self.search_confidence = float(settings.get('SEARCH_CONFIDENCE', 145))
+        self.search_confidence_margin = float(settings.get('SEARCH_CONFIDENCE_MARGIN', 30))
+        self.search_tiers = SearchTiers()
+        self.search_pool = YoutubeDLPool(self.YDL_OPTS, pool_size, extractors=('YoutubeSearch',), factory=ydl_factory)
+        self.stream_pool = YoutubeDLPool(self.STREAM_OPTS, pool_size, extractors=('Youtube',), factory=ydl_factory)
+        if warm_up:
+            threading.Thread(target=self.warm_up, daemon=True).start()
+
+    def warm_up(self):
+        """Imports the heavy dependencies and loads the Janome dictionary and YoutubeDL pools before the first track needs them."""
+        with profiler.phase("import yt_dlp"):
+            import yt_dlp  # noqa: F401
+        with profiler.phase("import numpy"):
+            import numpy  # noqa: F401
+        with profiler.phase("import sklearn"):
+            import sklearn.feature_extraction.text  # noqa: F401
+            import sklearn.metrics.pairwise  # noqa: F401
+        with profiler.phase("load janome dictionary"):
+            get_tokenizer()
+        with profiler.phase("warm yt-dlp search pool"):
+            self.search_pool.prewarm()
+        with profiler.phase("warm yt-dlp stream pool"):
+            self.stream_pool.prewarm()
 
     def tokenize_japanese(self, text):
-        tokenizer = Tokenizer()
-        tokens = tokenizer.tokenize(text)
+        tokens = get_tokenizer().tokenize(text)
         return " ".join([token.surface for token in tokens])
 
+    @staticmethod
+    def is_japanese(text: str) -> bool:
+        return any('\u3040' <= char <= '\u309F' or '\u30A0' <= char <= '\u30FF' or '\u4E00' <= char <= '\u9FAF'
+                   for char in text)
+
+    def similarity_scores(self, entries: List[Dict[str, Any]], track: Dict[str, Any]) -> List[float]:
+        """Computes text_similarity for all entries at once with one vocabulary and batched sparse matrix operations."""
+        from sklearn.feature_extraction.text import CountVectorizer
+
+        if not entries:
+            return []
+        japanese = [self.is_japanese(entry['title']) for entry in entries]
+        track_plain = (track['track'].lower(), track['artists'][0].lower())
+        track_japanese = None
+        if any(japanese):
+            track_japanese = (self.tokenize_japanese(track['track']), self.tokenize_japanese(track['artists'][0]))
+
+        titles, channels, track_titles, track_channels = [], [], [], []
+        for entry, is_japanese in zip(entries, japanese):
+            if is_japanese:
+                titles.append(self.tokenize_japanese(entry['title']))
+                channels.append(self.tokenize_japanese(entry['channel']))
+                track_title, track_channel = track_japanese
+            else:
+                titles.append(entry['title'].lower())
+                channels.append(entry['channel'].lower())
+                track_title, track_channel = track_plain
+            track_titles.append(track_title)
+            track_channels.append(track_channel)
+        combos = [f"{title} - {channel}" for title, channel in zip(titles, channels)]
+        track_combos = [f"{title} - {channel}" for title, channel in zip(track_titles, track_channels)]
+
+        vectorizer = CountVectorizer()
+        try:
+            vectorizer.fit(titles + channels + track_titles + track_channels)
+        except ValueError:
+            # Nothing but single characters and punctuation, so nothing can match
+            return [0.0] * len(entries)
+
+        sim_title = pairwise_tfidf_similarity(vectorizer.transform(titles), vectorizer.transform(track_titles))
+        sim_channel = pairwise_tfidf_similarity(vectorizer.transform(channels), vectorizer.transform(track_channels))
+        sim_combo = pairwise_tfidf_similarity(vectorizer.transform(combos), vectorizer.transform(track_combos))
+
+        scores = []
+        for title, channel, combo, is_japanese in zip(sim_title, sim_channel, sim_combo, japanese):
+            sim_individual = round(title * 50) + round(channel * 50)
+            scores.append(max(sim_individual, round(combo * 100)) * (1.8 if is_japanese else 1.2))
+        return scores
+
     def text_similarity(self, data: dict, track: dict) -> str:
+        """Scores a single entry. Reference implementation for similarity_scores."""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.metrics.pairwise import cosine_similarity
+
         lang = ""
-        is_japanese = any(
-            '\u3040' <= char <= '\u309F' or '\u30A0' <= char <= '\u30FF' or '\u4E00' <= char <= '\u9FAF' for char in
-            data['title'])
+        is_japanese = self.is_japanese(data['title'])
 
         if is_japanese:
             lang = "Japanese"
@@ -59,22 +302,30 @@ class YoutubeSearcher:
         else:
             return max(sim_individual, sim_combo) * 1.2
 
+    @staticmethod
+    def add_score(item: dict, reason: str, points: float):
+        """Adjusts an entry's rank and records the adjustment in its score breakdown."""
+        item['rank'] += points
+        breakdown = item.setdefault('score_breakdown', {})
+        breakdown[reason] = breakdown.get(reason, 0) + points
+
     def rank_videos(self, results: Dict[str, Any], track: Dict[str, Any]) -> List[Dict[str, Any]]:
-        for result in results['entries']:
-            result['rank'] = self.text_similarity(result, track)
+        for result, score in zip(results['entries'], self.similarity_scores(results['entries'], track)):
+            result['rank'] = score
+            result['score_breakdown'] = {'similarity': score}
 
         results = [result for result in results['entries'] if result['rank'] >= 50]
 
         # Adjust ranks based on view count
         results.sort(key=lambda x: x['view_count'], reverse=True)
         for i, item in enumerate(results[:3]):
-            item['rank'] += [10, 6, 3][i]
+            self.add_score(item, 'views', [10, 6, 3][i])
 
         # Adjust ranks based on duration similarity
         results = [item for item in results if abs(item['duration'] - track['duration_ms'] / 1000) <= 40]
         results.sort(key=lambda x: abs(x['duration'] - track['duration_ms'] / 1000))
         for i, item in enumerate(results[:3]):
-            item['rank'] -= [6, 4, 2][i]
+            self.add_score(item, 'duration', -[6, 4, 2][i])
 
         # Adjust ranks based on good words in the title
         good_words = {"official": 12, "music video": 18, "mv": 15, "lyric": 8, 'live': -10, "Official HD Video": 12,
@@ -82,7 +333,7 @@ class YoutubeSearcher:
         for item in results:
             for word, score in good_words.items():
                 if word.lower() in item['title'].lower():
-                    item['rank'] += score
+                    self.add_score(item, 'title_words', score)
 
         # Filter out results with bad words in the title
         bad_words = ["歌ってみた", 'sped up', "fan-made", "acoustic ver", "remix", "cover", "live", "instrumental",
@@ -93,81 +344,181 @@ class YoutubeSearcher:
         # Adjust rank if the channel matches the artist
         for item in results:
             if track['artists'][0].lower() in item['channel'].lower():
-                item['rank'] += 20
+                self.add_score(item, 'channel_match', 20)
 
         # Adjust ranks if the channel is verified
         for item in results:
             if item.get('channel_is_verified', True):
-                item['rank'] += 30
+                self.add_score(item, 'verified', 30)
 
                 # New score modifier: increase score if the searched title is in the video title
                 for item in results:
                     if track['track'].lower() in item['title'].lower():
-                        item['rank'] += 20  # Adjust this score as needed
+                        self.add_score(item, 'title_match', 20)  # Adjust this score as needed
 
         results.sort(key=lambda x: x['rank'], reverse=True)
 
         for item in results:
-            print(f"Title: {item['title']}, Rank: {item['rank']}")
+            logger.debug("Title: %s, Rank: %s", item['title'], item['rank'])
 
         return results
 
-    def search(self, track: dict, rank: bool = True, search_count: int = 20) -> dict or None:
-        if not isinstance(track, dict):
-            raise ValueError("Invalid track")
+    @staticmethod
+    def search_query(track: dict, search_count: int = 20) -> str:
+        return f"ytsearch{search_count}:{track['artists'][0]} {track['track']} official music video"
 
-        query = f"ytsearch{search_count}:{track['artists'][0]} {track['track']} official music video"
+    @staticmethod
+    def targeted_query(track: dict, search_count: int = 5) -> str or None:
+        """A small search for the track's exact recording by its ISRC, which YouTube indexes for licensed uploads."""
+        if not track.get('isrc'):
+            return None
+        return f'ytsearch{search_count}:"{track["isrc"]}"'
+
+    def is_exact_match(self, entry: dict, track: dict) -> bool:
+        """
+        Whether a video is the track's own recording on the artist's channel, judging by its metadata alone: the
+        channel, the title and a duration within EXACT_DURATION_TOLERANCE seconds of Spotify's. Auto-generated
+        Topic uploads are left out, as they show a still image rather than a video.
+        """
+        channel = (entry.get('channel') or entry.get('uploader') or '').lower()
+        return (track['artists'][0].lower() in channel and not channel.endswith(' - topic')
+                and track['track'].lower() in entry['title'].lower()
+                and entry.get('duration') is not None
+                and abs(entry['duration'] - track['duration_ms'] / 1000) <= self.exact_duration_tolerance)
 
-        try:
-            results = self.ydl.extract_info(query, download=False)
-            valid_entries = [r for r in results.get('entries', []) if r.get('title') and r.get('uploader')]
-            # strip all the entries that have a url that starts with https://www.youtube.com/shorts/
-            valid_entries = [r for r in valid_entries if not r.get('url', '').startswith('https://www.youtube.com/shorts/')]
+    @staticmethod
+    def filter_entries(results: dict, exclude: list = None) -> List[Dict[str, Any]]:
+        """Drops search results that can't be ranked or played: untitled entries, shorts and excluded ids."""
+        valid_entries = [r for r in results.get('entries', []) if r.get('title') and r.get('uploader')]
+        # strip all the entries that have a url that starts with https://www.youtube.com/shorts/
+        valid_entries = [r for r in valid_entries if not r.get('url', '').startswith('https://www.youtube.com/shorts/')]
+        if exclude:
+            valid_entries = [r for r in valid_entries if r.get('id') not in exclude]
+        return valid_entries
+
+    def search(self, track: dict, rank: bool = True, search_count: int = 20, exclude: list = None) -> dict or None:
+        candidates = self.search_candidates(track, 1, rank, search_count, exclude)
+        return candidates[0] if candidates else None
+
+    def search_candidates(self, track: dict, count: int = 3, rank: bool = True, search_count: int = 20,
+                          exclude: list = None, tiered: bool = True) -> List[Dict[str, Any]]:
+        """
+        Returns up to `count` of the best matching videos for a track, best first. Ranked searches go through
+        tiers of growing size and stop at the first one that answers confidently: a search for the ISRC that
+        finds an exact match, then the first few results, then all `search_count` of them.
+        Args:
+            tiered (bool): Try the smaller tiers first. Off for tracks whose earlier answer was rejected.
+        """
+        from yt_dlp.utils import DownloadError
 
-            if not valid_entries:
-                print("No suitable videos found.")
-                return None
+        if not isinstance(track, dict):
+            raise ValueError("Invalid track")
 
+        try:
+            if rank and tiered:
+                query = self.targeted_query(track, self.targeted_search_count) if self.targeted_search else None
+                if query:
+                    ranked = self.search_tier('targeted', query, track, exclude)
+                    if self.search_tiers.record('targeted', bool(ranked) and self.is_exact_match(ranked[0], track)):
+                        logger.debug("Exact match from targeted search: %s", ranked[0]['title'])
+                        return ranked[:count]
+                if 0 < self.quick_search_count < search_count:
+                    ranked = self.search_tier('quick', self.search_query(track, self.quick_search_count), track, exclude)
+                    if self.search_tiers.record('quick', self.is_confident(ranked)):
+                        return ranked[:count]
+
+            valid_entries = self.search_tier('full', self.search_query(track, search_count), track, exclude, rank)
             if rank:
-                ranked_results = self.rank_videos({'entries': valid_entries}, track)
-                return ranked_results[0] if ranked_results else None
-            else:
-                return valid_entries[0]
+                self.search_tiers.record('full', bool(valid_entries))
+            if not valid_entries:
+                logger.warning("No suitable videos found.")
+            return valid_entries[:count]
         except DownloadError as e:
-            print(f"Error during YouTube search: {e}")
-            return None
+            logger.error("Error during YouTube search: %s", e)
+            return []
+
+    def search_tier(self, tier: str, query: str, track: dict, exclude: list = None, rank: bool = True) -> List[Dict[str, Any]]:
+        """Runs one tier's search and returns its usable results, ranked unless `rank` is False."""
+        with metrics.span(SearchTiers.SPANS[tier]), self.search_pool.borrow() as ydl:
+            results = ydl.extract_info(query, download=False)
+        entries = self.filter_entries(results or {}, exclude)
+        if not rank or not entries:
+            return entries
+        with metrics.span('rank_videos_seconds'):
+            ranked = self.rank_videos({'entries': entries}, track)
+        for item in ranked:
+            item['search_tier'] = tier
+        return ranked
 
     @staticmethod
-    def get_video_streams(youtube_url: str, desired_resolution: int = 720) -> tuple[str, str, str] or None:
-        """Get the direct stream URLs for video, audio, and combined stream of a given YouTube video URL."""
+    def confidence_score(item: dict) -> float:
+        """
+        A video's rank without the adjustments that depend on the rest of the results, such as being among the
+        three most viewed, so it means the same in a search of 5 results as in one of 20. The title match bonus
+        is added by rank_videos once per verified result in the batch, so it is counted once here.
+        """
+        breakdown = item.get('score_breakdown', {})
+        title_match = breakdown.get('title_match', 0)
+        return item['rank'] - breakdown.get('views', 0) - breakdown.get('duration', 0) - title_match + \
+            (20 if title_match else 0)
+
+    def is_confident(self, ranked: List[Dict[str, Any]]) -> bool:
+        """
+        Whether the best ranked video's confidence score clears SEARCH_CONFIDENCE and leads every other
+        result's by SEARCH_CONFIDENCE_MARGIN.
+        """
+        if not ranked:
+            return False
+        best = self.confidence_score(ranked[0])
+        runner_up = max((self.confidence_score(item) for item in ranked[1:]), default=None)
+        return best >= self.search_confidence and \
+            (runner_up is None or best - runner_up >= self.search_confidence_margin)
+
+    def get_video_streams(self, youtube_url: str, desired_resolution: int = 720, codecs: tuple = (),
+                          light_codec: bool = False) -> tuple[str, str, str] or None:
+        """
+        Get the direct stream URLs for video, audio, and combined stream of a given YouTube video URL.
+        Args:
+            desired_resolution (int): The maximum video height.
+            codecs (tuple): Video codec prefixes (avc1, vp09, av01) in order of preference, other codecs come last.
+                They pick between streams of the same height.
+            light_codec (bool): Prefer the codecs over a greater height, for decoders that can't keep up.
+        """
+        from yt_dlp.utils import DownloadError
+
+        def codec_rank(f):
+            vcodec = f.get('vcodec') or ''
+            return next((rank for rank, codec in enumerate(codecs) if vcodec.startswith(codec)), len(codecs))
+
+        def preference(f):
+            height = f.get('height') or 0
+            return (-codec_rank(f), height) if light_codec else (height, -codec_rank(f))
 
         def get_best_streams(info):
             video_streams = [f for f in info['formats'] if f.get('vcodec') != 'none' and f.get('acodec') == 'none']
             audio_streams = [f for f in info['formats'] if f.get('acodec') != 'none' and f.get('vcodec') == 'none']
-            combined_streams = [f for f in info['formats'] if f.get('format_id') == '18']
+            # HLS (m3u8) formats also carry both, but VLC seeks and starts them slowly and they skip the media proxy
+            combined_streams = [f for f in info['formats']
+                                if f.get('vcodec') not in (None, 'none') and f.get('acodec') not in (None, 'none')
+                                and f.get('protocol', 'https') in ('https', 'http')]
 
             best_video = max(
-                (f for f in video_streams if f.get('height', 0) <= desired_resolution),
-                key=lambda f: (f.get('height', 0), f.get('vbr', 0)),
+                (f for f in video_streams if (f.get('height') or 0) <= desired_resolution),
+                key=lambda f: (*preference(f), f.get('vbr') or 0),
                 default=None
             )
 
             best_audio = max(audio_streams, key=lambda f: (f.get('abr') or 0), default=None)
 
-            combined_stream = combined_streams[0] if combined_streams else None
+            # The best combined stream within the resolution, or format 18 (360p) when none fits
+            fitting = [f for f in combined_streams if (f.get('height') or 0) <= desired_resolution]
+            combined_stream = max(fitting, key=preference, default=None) \
+                or next((f for f in combined_streams if f.get('format_id') == '18'), None)
 
             return best_video, best_audio, combined_stream
 
-        ydl_opts = {
-            'format': 'bestvideo+bestaudio/best',
-            'no_warnings': True,
-            'quiet': True,
-            'no_check_certificate': True,
-            'prefer_insecure': True,
-            'nocheckcertificate': True,
-        }
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with metrics.span('get_video_streams_seconds'), self.stream_pool.borrow() as ydl:
                 info = ydl.extract_info(youtube_url, download=False)
                 if info and 'formats' in info:
                     video_stream, audio_stream, combined_stream = get_best_streams(info)
@@ -176,11 +527,11 @@ class YoutubeSearcher:
                         audio_stream['url'] if audio_stream else None,
                         combined_stream['url'] if combined_stream else None
                     )
-                print("No suitable video and audio formats found.")
+                logger.warning("No suitable video and audio formats found.")
                 return None, None, None
         except DownloadError as e:
-            print(f"Error extracting video URL: {e}")
+            logger.error("Error extracting video URL: %s", e)
             return None, None, None
         except Exception as e:
-            print(f"Unexpected error in get_video_streams: {e}")
+            logger.error("Unexpected error in get_video_streams: %s", e)
             return None, None, None
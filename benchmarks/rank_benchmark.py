@@ -0,0 +1,186 @@
+"""
+Offline benchmark for YoutubeSearcher's search ranking.
+
+Replays recorded yt-dlp search results from a corpus and reports per-track ranking latency,
+throughput and top-1 accuracy against the labelled expected video ids.
+
+    python benchmarks/rank_benchmark.py
+    python benchmarks/rank_benchmark.py --json results.json
+    python benchmarks/rank_benchmark.py --baseline results.json
+    python benchmarks/rank_benchmark.py --record    (needs network, refreshes the recorded search results)
+"""
+import argparse
+import copy
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from YoutubeSearcher import YoutubeSearcher  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus.json')
+
+
+def load_corpus(path: str) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def rank_case(searcher: YoutubeSearcher, case: dict) -> list:
+    """Ranks a case's recorded results the same way YoutubeSearcher.search does."""
+    entries = searcher.filter_entries(copy.deepcopy(case['search_results']))
+    if not entries:
+        return []
+    return searcher.rank_videos({'entries': entries}, case['track'])
+
+
+def benchmark(searcher: YoutubeSearcher, cases: list, iterations: int) -> dict:
+    results = []
+    started = time.perf_counter()
+    for case in cases:
+        timings = []
+        ranked = []
+        for _ in range(iterations):
+            case_started = time.perf_counter()
+            ranked = rank_case(searcher, case)
+            timings.append((time.perf_counter() - case_started) * 1000)
+        top = ranked[0]['id'] if ranked else None
+        results.append({
+            'name': case['name'],
+            'tags': case.get('tags', []),
+            'expected_id': case['expected_id'],
+            'top_id': top,
+            'correct': top == case['expected_id'],
+            'median_ms': statistics.median(timings),
+            'max_ms': max(timings),
+        })
+    elapsed = time.perf_counter() - started
+    return {
+        'cases': results,
+        'accuracy': sum(result['correct'] for result in results) / len(results) if results else 0.0,
+        'throughput': len(cases) * iterations / elapsed if elapsed else 0.0,
+        'median_ms': statistics.median(result['median_ms'] for result in results) if results else 0.0,
+    }
+
+
+def quick_tier(searcher: YoutubeSearcher, cases: list, count: int) -> dict:
+    """
+    Replays the quick search tier on the first `count` recorded results of each case. Reports how often it is
+    confident enough to skip the full search and how often it is right when it does. It also replays each case
+    with the expected video left out, where any confident answer is wrong, as when the right video is ranked
+    below the quick tier's results on YouTube.
+    """
+    confident = correct = confident_without = 0
+    for case in cases:
+        entries = searcher.filter_entries({'entries': copy.deepcopy(case['search_results']['entries'][:count])})
+        ranked = searcher.rank_videos({'entries': entries}, case['track']) if entries else []
+        if searcher.is_confident(ranked):
+            confident += 1
+            correct += ranked[0]['id'] == case['expected_id']
+        entries = searcher.filter_entries({'entries': copy.deepcopy(case['search_results']['entries'])},
+                                          exclude=[case['expected_id']])[:count]
+        ranked = searcher.rank_videos({'entries': entries}, case['track']) if entries else []
+        confident_without += searcher.is_confident(ranked)
+    return {
+        'count': count,
+        'confidence': searcher.search_confidence,
+        'hit_rate': confident / len(cases) if cases else 0.0,
+        'precision': correct / confident if confident else None,
+        'false_confidence': confident_without / len(cases) if cases else 0.0,
+    }
+
+
+def check_reference(searcher: YoutubeSearcher, cases: list) -> int:
+    """Counts entries where the batched similarity scores differ from the per-entry reference implementation."""
+    mismatches = 0
+    for case in cases:
+        entries = searcher.filter_entries(copy.deepcopy(case['search_results']))
+        for entry, score in zip(entries, searcher.similarity_scores(entries, case['track'])):
+            if searcher.text_similarity(entry, case['track']) != score:
+                mismatches += 1
+                print(f"Similarity mismatch in {case['name']}: {entry['title']}")
+    return mismatches
+
+
+def record(searcher: YoutubeSearcher, corpus: dict, search_count: int):
+    """Replaces each case's recorded search results with live ones."""
+    with searcher.search_pool.borrow() as ydl:
+        for case in corpus['cases']:
+            print(f"Recording {case['name']}")
+            results = ydl.extract_info(searcher.search_query(case['track'], search_count), download=False)
+            keys = ('id', 'url', 'title', 'channel', 'uploader', 'view_count', 'duration', 'channel_is_verified')
+            case['search_results'] = {'entries': [{key: entry[key] for key in keys if key in entry}
+                                                  for entry in results.get('entries', [])]}
+
+
+def report(results: dict, baseline: dict = None):
+    print(f"{'case':<24} {'tags':<12} {'median ms':>10} {'max ms':>8}  top-1")
+    for result in results['cases']:
+        mark = 'ok' if result['correct'] else f"MISS (got {result['top_id']})"
+        print(f"{result['name']:<24} {','.join(result['tags']):<12} {result['median_ms']:>10.2f} {result['max_ms']:>8.2f}  {mark}")
+    print(f"\nTop-1 accuracy: {results['accuracy']:.0%}")
+    print(f"Median ranking latency: {results['median_ms']:.2f} ms")
+    print(f"Throughput: {results['throughput']:.1f} tracks/s")
+    quick = results.get('quick_tier')
+    if quick:
+        precision = f"{quick['precision']:.0%}" if quick['precision'] is not None else "n/a"
+        print(f"Quick tier (first {quick['count']} results, confidence {quick['confidence']:g}): answers "
+              f"{quick['hit_rate']:.0%} of tracks, {precision} of them correctly, "
+              f"and {quick['false_confidence']:.0%} when the right video is missing")
+    if baseline:
+        print(f"Baseline: accuracy {baseline['accuracy']:.0%}, median {baseline['median_ms']:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark search ranking against recorded search results.")
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help="Corpus of tracks with recorded search results.")
+    parser.add_argument('--iterations', type=int, default=20, help="Times each track is ranked.")
+    parser.add_argument('--json', metavar='PATH', help="Write the results as JSON, e.g. to use as a baseline.")
+    parser.add_argument('--baseline', metavar='PATH', help="Fail if accuracy drops or latency regresses against these results.")
+    parser.add_argument('--max-slowdown', type=float, default=1.5, help="Allowed median latency ratio against the baseline.")
+    parser.add_argument('--record', action='store_true', help="Re-record the search results from YouTube (needs network).")
+    parser.add_argument('--search-count', type=int, default=20, help="Results to record per track.")
+    parser.add_argument('--quick-count', type=int, help="Results in the quick search tier, QUICK_SEARCH_COUNT by default.")
+    parser.add_argument('--confidence', type=float, help="Quick tier confidence threshold, SEARCH_CONFIDENCE by default.")
+    args = parser.parse_args()
+
+    searcher = YoutubeSearcher(warm_up=False)
+    corpus = load_corpus(args.corpus)
+    if args.record:
+        record(searcher, corpus, args.search_count)
+        with open(args.corpus, 'w', encoding='utf-8') as f:
+            json.dump(corpus, f, ensure_ascii=False, indent=1)
+        return 0
+
+    # Load the tokenizer and imports up front so they don't count towards the first track
+    searcher.similarity_scores([{'title': 'warm up 準備', 'channel': 'warm up'}], {'track': '準備', 'artists': ['warm']})
+    mismatches = check_reference(searcher, corpus['cases'])
+    results = benchmark(searcher, corpus['cases'], args.iterations)
+    if args.confidence is not None:
+        searcher.search_confidence = args.confidence
+    results['quick_tier'] = quick_tier(searcher, corpus['cases'], args.quick_count or searcher.quick_search_count)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+
+    failed = mismatches > 0
+    if baseline:
+        if results['accuracy'] < baseline['accuracy']:
+            print("Regression: top-1 accuracy dropped")
+            failed = True
+        if results['median_ms'] > baseline['median_ms'] * args.max_slowdown:
+            print("Regression: ranking is slower than the baseline allows")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
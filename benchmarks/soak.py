@@ -0,0 +1,231 @@
+"""
+Headless soak test of the full player against simulated Spotify, YouTube and VLC backends.
+
+Spotify follows a scripted timeline of rapid skips, pauses and scrubs over the tracks in the fixture corpus,
+searches are answered from the corpus' recorded results, and VLC is replaced by a null player. Memory use
+and thread counts are sampled throughout, and event handling latencies are reported at the end.
+
+    python benchmarks/soak.py --duration 3600
+    python benchmarks/soak.py --duration 300 --skip-interval 0.5 --json soak.json
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5 import QtCore, QtWidgets  # noqa: E402
+
+from EventBus import EventBus  # noqa: E402
+from Metrics import metrics, configure_logging  # noqa: E402
+from OfflineDownloader import OfflineManifest  # noqa: E402
+from Prefetcher import Prefetcher  # noqa: E402
+from SettingsPanel import set_data_dir  # noqa: E402
+from Simulation import FakeSpotify, FixtureYoutube, NullVLCInstance  # noqa: E402
+from SpotifyPlayer import SpotifyPlayer  # noqa: E402
+from StreamCache import StreamCache  # noqa: E402
+from TrackCache import TrackCache  # noqa: E402
+from TrackResolver import TrackResolver  # noqa: E402
+from VideoPlayer import MusicVideoPlayer  # noqa: E402
+from YoutubeSearcher import YoutubeSearcher  # noqa: E402
+from main import MyListener  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus.json')
+
+
+def build_timeline(duration: float, skip_interval: float, pause_every: int, scrub_every: int, seed: int) -> list:
+    """Skips every skip_interval seconds, with a pause and resume every pause_every skips and a scrub every scrub_every."""
+    rng = random.Random(seed)
+    timeline = []
+    at, count = skip_interval, 0
+    while at < duration:
+        count += 1
+        if pause_every and count % pause_every == 0:
+            timeline += [(at, 'pause', None), (at + skip_interval / 2, 'resume', None)]
+        elif scrub_every and count % scrub_every == 0:
+            timeline.append((at, 'scrub', rng.randint(10000, 120000)))
+        else:
+            timeline.append((at, 'skip' if rng.random() > 0.1 else 'previous', None))
+        at += skip_interval
+    return timeline
+
+
+def memory_mb() -> float:
+    """Returns the resident set size in MB, or the peak size where the current one can't be read."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024
+
+
+def growth_per_hour(samples: list, key: str, warm_up: float = 0) -> float:
+    """Least squares slope of a sampled value per hour, ignoring samples taken during the warm-up."""
+    samples = [sample for sample in samples if sample['elapsed'] >= warm_up]
+    if len(samples) < 2:
+        return 0.0
+    times = [sample['elapsed'] for sample in samples]
+    values = [sample[key] for sample in samples]
+    mean_time, mean_value = statistics.mean(times), statistics.mean(values)
+    variance = sum((t - mean_time) ** 2 for t in times)
+    if not variance:
+        return 0.0
+    return sum((t - mean_time) * (v - mean_value) for t, v in zip(times, values)) / variance * 3600
+
+
+class LatencyProbe:
+    """Listener measuring the time from Spotify changing track to the track_update reaching the Qt thread."""
+
+    def __init__(self, spotify: FakeSpotify):
+        self.spotify = spotify
+        self.latencies = []
+
+    def notify(self, event_type: str, currently_playing: dict):
+        if event_type != 'track_update' or not currently_playing:
+            return
+        changed_at, track_id = self.spotify.last_change()
+        if track_id == currently_playing['track_id']:
+            self.latencies.append(time.monotonic() - changed_at)
+
+
+def percentile(values: list, q: float) -> float or None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak test the player headless against simulated backends.")
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help="Fixture tracks and recorded search results.")
+    parser.add_argument('--duration', type=float, default=600, help="Seconds to run for.")
+    parser.add_argument('--skip-interval', type=float, default=2.0, help="Seconds between scripted actions.")
+    parser.add_argument('--pause-every', type=int, default=7, help="Pause and resume every N actions, 0 for never.")
+    parser.add_argument('--scrub-every', type=int, default=5, help="Scrub every N actions, 0 for never.")
+    parser.add_argument('--spotify-latency', type=float, default=0.05, help="Seconds per simulated Spotify API call.")
+    parser.add_argument('--search-latency', type=float, default=0.5, help="Seconds per simulated YouTube search.")
+    parser.add_argument('--extract-latency', type=float, default=0.3, help="Seconds per simulated stream lookup.")
+    parser.add_argument('--track-cache-size', type=int, default=2, help="Small by default so searches keep happening.")
+    parser.add_argument('--sample-interval', type=float, default=10, help="Seconds between memory and thread samples.")
+    parser.add_argument('--warm-up', type=float, default=60,
+                        help="Seconds of start-up, while dependencies load and caches fill, left out of the growth rates.")
+    parser.add_argument('--tracemalloc', action='store_true', help="Also sample Python heap usage (slower).")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', metavar='PATH', help="Write the samples and results as JSON.")
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+    # Neither the user's settings nor their caches and metrics log are touched
+    scratch = tempfile.TemporaryDirectory()
+    set_data_dir(scratch.name)
+    configure_logging(args.log_level)
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    app = QtWidgets.QApplication(sys.argv[:1])
+    youtube = FixtureYoutube.from_file(args.corpus, search_latency=args.search_latency,
+                                       extract_latency=args.extract_latency)
+    timeline = build_timeline(args.duration, args.skip_interval, args.pause_every, args.scrub_every, args.seed)
+    spotify = FakeSpotify(youtube.tracks(), timeline, latency=args.spotify_latency)
+
+    spotify_player = SpotifyPlayer(autostart=False, client=spotify)
+    video_player = MusicVideoPlayer(spotify_player, vlc_instance=NullVLCInstance())
+    youtube_searcher = YoutubeSearcher(warm_up=False, ydl_factory=youtube.factory)
+    resolver = TrackResolver(youtube_searcher,
+                             TrackCache(os.path.join(scratch.name, 'track_cache.json'), args.track_cache_size),
+                             StreamCache(youtube_searcher.get_video_streams, max_entries=args.track_cache_size))
+    listener = MyListener(resolver, video_player, OfflineManifest(os.path.join(scratch.name, 'offline')))
+    prefetcher = Prefetcher(spotify_player, resolver, video_player)
+    probe = LatencyProbe(spotify)
+    event_bus = EventBus()
+    for event_listener in (probe, listener, prefetcher):
+        event_bus.add_listener(event_listener)
+    spotify_player.add_listener(event_bus)
+
+    started = time.monotonic()
+    samples = []
+
+    def sample():
+        entry = {'elapsed': time.monotonic() - started, 'rss_mb': memory_mb(), 'threads': threading.active_count()}
+        if args.tracemalloc:
+            entry['heap_mb'] = tracemalloc.get_traced_memory()[0] / 2 ** 20
+        samples.append(entry)
+
+    sampler = QtCore.QTimer()
+    sampler.setInterval(int(args.sample_interval * 1000))
+    sampler.timeout.connect(sample)
+    sampler.start()
+    sample()
+    spotify_player.start_track_updater()
+    QtCore.QTimer.singleShot(int(args.duration * 1000), app.quit)
+    app.exec_()
+    sample()
+    # Let background work drain before the Qt objects it reports to go away
+    spotify_player.remove_listener(event_bus)
+    prefetcher.executor.shutdown(wait=True, cancel_futures=True)
+    listener.pipeline.executor.shutdown(wait=True, cancel_futures=True)
+    for player in (video_player.video_player, video_player.audio_player,
+                   video_player.standby_video_player, video_player.standby_audio_player):
+        player.stop()
+
+    first_frame = metrics.histogram('track_change_to_first_frame_seconds')
+    results = {
+        'duration': samples[-1]['elapsed'],
+        'track_changes': len(spotify.changes) - 1,
+        'spotify_calls': spotify.calls,
+        'searches': youtube.searches,
+        'extractions': youtube.extractions,
+        'event_latency_ms': {'count': len(probe.latencies),
+                             'p50': (percentile(probe.latencies, 0.5) or 0) * 1000,
+                             'p95': (percentile(probe.latencies, 0.95) or 0) * 1000,
+                             'max': max(probe.latencies, default=0) * 1000},
+        'first_frame_ms': {'count': first_frame.count,
+                           'p50': (first_frame.quantile(0.5) or 0) * 1000,
+                           'p95': (first_frame.quantile(0.95) or 0) * 1000},
+        'rss_mb': {'start': samples[0]['rss_mb'], 'end': samples[-1]['rss_mb'],
+                   'max': max(sample['rss_mb'] for sample in samples),
+                   'growth_per_hour': growth_per_hour(samples, 'rss_mb', args.warm_up)},
+        'threads': {'start': samples[0]['threads'], 'end': samples[-1]['threads'],
+                    'max': max(sample['threads'] for sample in samples)},
+        'seeks': video_player.seek_stats(),
+        'search_tiers': youtube_searcher.search_tiers.counts,
+        'samples': samples,
+    }
+    if args.tracemalloc:
+        results['heap_mb'] = {'end': samples[-1]['heap_mb'], 'growth_per_hour': growth_per_hour(samples, 'heap_mb', args.warm_up)}
+
+    print(f"Ran {results['duration']:.0f}s: {results['track_changes']} track changes, "
+          f"{results['searches']} searches, {results['extractions']} stream lookups, {results['spotify_calls']} Spotify calls")
+    latency = results['event_latency_ms']
+    print(f"Track change to Qt thread: p50 {latency['p50']:.0f} ms, p95 {latency['p95']:.0f} ms, "
+          f"max {latency['max']:.0f} ms over {latency['count']} changes")
+    frame = results['first_frame_ms']
+    print(f"Track change detected to first frame: p50 {frame['p50']:.0f} ms, p95 {frame['p95']:.0f} ms "
+          f"over {frame['count']} changes")
+    rss = results['rss_mb']
+    print(f"RSS: {rss['start']:.1f} -> {rss['end']:.1f} MB (max {rss['max']:.1f}), {rss['growth_per_hour']:+.1f} MB/hour")
+    if args.tracemalloc:
+        print(f"Python heap: {results['heap_mb']['end']:.1f} MB, {results['heap_mb']['growth_per_hour']:+.1f} MB/hour")
+    print("Search tiers: " + ", ".join(f"{tier} {counts['hits']}/{counts['tried']}"
+                                       for tier, counts in results['search_tiers'].items()))
+    threads = results['threads']
+    print(f"Threads: {threads['start']} -> {threads['end']} (max {threads['max']})")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+    resolver.track_cache.flush()
+    scratch.cleanup()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,92 +1,289 @@
+from StartupProfile import profiler
+import argparse
+import logging
 import sys
 import threading
 import time
-from PyQt5 import QtWidgets, QtCore
-from SpotifyPlayer import SpotifyPlayer
-from YoutubeSearcher import YoutubeSearcher
-from VideoPlayer import MusicVideoPlayer
+from concurrent.futures import ThreadPoolExecutor
+with profiler.phase("import PyQt5"):
+    from PyQt5 import QtWidgets, QtCore
+with profiler.phase("import spotipy"):
+    from SpotifyPlayer import SpotifyPlayer
+with profiler.phase("import vlc"):
+    import vlc
+    from VideoPlayer import MusicVideoPlayer
+with profiler.phase("import app modules"):
+    from YoutubeSearcher import YoutubeSearcher
+    from TrackResolver import TrackResolver
+    from Prefetcher import Prefetcher
+    from EventBus import EventBus
+    from ResolutionPipeline import ResolutionPipeline
+    from OfflineDownloader import OfflineDownloader, OfflineManifest
+    from Metrics import metrics, configure_logging, start_metrics_server
+    from QualityController import QualityController
+    from PollScheduler import SharedRateLimiter
+    from MediaProxy import MediaProxy
+    from ResolverService import ResolverService, RemoteResolver
+    from IntroAligner import IntroAligner
 import os
 from SettingsPanel import show_settings_panel, get_settings
 
+logger = logging.getLogger(__name__)
+
 
 
 class MyListener:
-    def __init__(self, youtube_searcher: YoutubeSearcher, video_player: MusicVideoPlayer):
-        self.youtube_searcher = youtube_searcher
+    def __init__(self, resolver: TrackResolver, video_player: MusicVideoPlayer, offline_manifest: OfflineManifest = None,
+                 executor=None, aligner: IntroAligner = None):
+        self.resolver = resolver
         self.video_player = video_player
+        self.offline_manifest = offline_manifest or OfflineManifest()
+        self.current_track = None
+        self.current_video = None
+        self.pipeline = ResolutionPipeline(resolver, executor=executor)
+        self.pipeline.resolved.connect(self.play_resolved)
+        self.video_player.rerank_requested.connect(self.rerank_current_track)
+        self.aligner = aligner
+        self.aligning = None  # (track id, video id) of the video playing
+        if self.aligner:
+            self.aligner.aligned.connect(self.apply_intro_offset)
 
     def notify(self, event_type: str, currently_playing: dict):
         if event_type == 'track_update' and currently_playing:
-            print(f"Received Spotify event: {event_type}")
+            logger.debug("Received Spotify event: %s", event_type)
             self.handle_new_track(currently_playing)
         elif event_type == 'play':
-            print(f"Received Spotify event: {event_type}")
+            logger.debug("Received Spotify event: %s", event_type)
             self.video_player.play()
         elif event_type == 'pause':
-            print(f"Received Spotify event: {event_type}")
+            logger.debug("Received Spotify event: %s", event_type)
             self.video_player.pause()
         elif event_type == 'track_scrub' and currently_playing:
-            print(f"Received Spotify event: {event_type}")
+            logger.debug("Received Spotify event: %s", event_type)
             self.handle_track_scrub(currently_playing)
         else:
-            print(f"Received Spotify event: {event_type}")
+            logger.debug("Received Spotify event: %s", event_type)
 
     def handle_track_scrub(self, track_update: dict):
         if track_update:
-            print(f"Scrubbing to {track_update['progress_ms']} ms")
-            current_time = time.time()
-            seek_time = track_update['progress_ms'] / 1000
-            seek_to_time = max(0, current_time - track_update['time_of_update'] + seek_time)
-            self.video_player.seek(int(seek_to_time * 1000))
+            logger.info("Scrubbing to %s ms", track_update['progress_ms'])
+            # Prefer the latency compensated clock over the raw progress of the poll
+            position = self.video_player.spotify_position()
+            if position is None:
+                current_time = time.time()
+                seek_time = track_update['progress_ms'] / 1000
+                position = max(0, current_time - track_update['time_of_update'] + seek_time) * 1000
+            self.video_player.seek(int(position))
+
+    def rerank_current_track(self):
+        """Marks the current video as a wrong match and searches again for the current track."""
+        track, video = self.current_track, self.current_video
+        if not track or not video:
+            return
+        logger.info("Re-ranking: %s rejected for %s", video['title'], track['track'])
+        self.resolver.reject(track, video)
+        self.handle_new_track(track)
 
     def handle_new_track(self, track: dict):
-        print(f"Searching YouTube for: {track['track']} by {track['artists']}")
-        search_result = self.youtube_searcher.search(track, rank=True)
+        """Hands the track to the resolution pipeline, superseding any track still being resolved."""
+        self.current_track = track
+        self.current_video = None
+        self.aligning = None
+        metrics.track_stage('dispatched', zone=self.video_player.zone)
+        local_file = self.offline_manifest.local_file(track['track_id'])
+        if local_file:
+            logger.info("Playing downloaded video: %s", local_file)
+            self.pipeline.cancel()
+            self.video_player.play_media(local_file, f"{track['artists'][0]} - {track['track']}")
+            entry = self.offline_manifest.get(track['track_id'])
+            if entry.get('video_id'):
+                self.align(track, {'id': entry['video_id'], 'title': local_file}, local_file)
+            return
+        self.pipeline.submit(track)
+
+    def play_resolved(self, track: dict, search_result: dict, streams: tuple):
+        """Plays the resolved video for the newest track. Called on the Qt thread."""
+        self.current_video = search_result
+        metrics.track_stage('resolved', zone=self.video_player.zone)
         if search_result:
-            video_stream, audio_stream, combined_stream = self.youtube_searcher.get_video_streams(search_result['url'])
-            if  combined_stream:
-                print("Playing combined stream")
-                media_name = f"{track['artists'][0]} - {track['track']}"
-                self.video_player.play_media(combined_stream, media_name)
-            elif video_stream and audio_stream:
-                print("Playing separate video and audio streams")
-                self.video_player.play_streams((video_stream, audio_stream))
+            # The same choice as the standby preload, so a pre-buffered video is swapped in
+            picked = self.video_player.pick_streams(streams)
+            if not picked:
+                logger.warning("No streams available.")
+                return
+            stream, audio_stream = picked
+            if audio_stream:
+                logger.info("Playing separate video and audio streams")
+                self.video_player.play_streams(picked)
             else:
-                print("Error: No streams available.")
+                logger.info("Playing combined stream")
+                media_name = f"{track['artists'][0]} - {track['track']}"
+                self.video_player.play_media(stream, media_name)
+            self.align(track, search_result, audio_stream or stream)
         else:
-            print("Error: Could not find a suitable YouTube video.")
+            logger.warning("Could not find a suitable YouTube video.")
 
-def run_spotify_listener(listener: MyListener):
-    sp = SpotifyPlayer()
-    sp.add_listener(listener)
+    def align(self, track: dict, video: dict, audio_source: str):
+        """Applies the video's known intro offset, or starts detecting it in the background."""
+        self.aligning = (track['track_id'], video['id']) if video else None
+        if not self.aligner or not video:
+            return
+        offset_ms = self.aligner.align(track, video, audio_source)
+        if offset_ms is not None:
+            self.video_player.set_intro_offset(offset_ms)
+
+    def apply_intro_offset(self, track_id: str, video_id: str, offset_ms: float):
+        """Applies a detected intro offset if its video is still playing. Called on the Qt thread."""
+        if (track_id, video_id) == self.aligning:
+            self.video_player.set_intro_offset(offset_ms)
+
+def warm_up(youtube_searcher: YoutubeSearcher):
+    """Loads the heavy search dependencies in the background once the window is up."""
     try:
-        while True:
-            time.sleep(1)
+        youtube_searcher.warm_up()
+    except Exception as e:
+        logger.warning("Error warming up dependencies: %s", e)
+    profiler.mark("warm-up complete")
+    profiler.report()
+
+def create_resolver(quality: QualityController = None):
+    """Returns a RemoteResolver when RESOLVER_URL points at a resolver service, otherwise an in-process TrackResolver."""
+    if get_settings().get('RESOLVER_URL'):
+        resolver = RemoteResolver(quality=quality)
+        logger.info("Resolving tracks through %s", resolver.url)
+        return resolver
+    return TrackResolver(YoutubeSearcher(warm_up=False), quality=quality)
+
+def start_warm_up(resolver):
+    if isinstance(resolver, TrackResolver):
+        threading.Thread(target=warm_up, args=(resolver.youtube_searcher,), name='warm-up', daemon=True).start()
+
+def run_download(source: str, workers: int):
+    """Downloads the videos for a playlist, or for the user's Liked Songs if source is 'liked'."""
+    spotify_player = SpotifyPlayer(autostart=False)
+    downloader = OfflineDownloader(spotify_player, create_resolver(), workers=workers)
+    tracks = downloader.saved_tracks() if source == 'liked' else downloader.playlist_tracks(source)
+    counts = downloader.run(tracks)
+    logger.info("Downloaded %s of %s tracks to %s, %s failed",
+                counts['done'], len(tracks), downloader.manifest.directory, counts['failed'])
+
+def run_resolver_service(address: str):
+    """Serves track resolution to other players over HTTP until interrupted."""
+    host, _, port = address.rpartition(':')
+    youtube_searcher = YoutubeSearcher(warm_up=False, pool_size=int(get_settings().get('RESOLVER_POOL_SIZE', 6)))
+    resolver = TrackResolver(youtube_searcher, workers=int(get_settings().get('RESOLVER_WORKERS', 16)))
+    service = ResolverService(resolver, host or None, int(port) if port else None)
+    start_metrics_server()
+    warm_up(youtube_searcher)
+    try:
+        service.serve_forever()
     except KeyboardInterrupt:
-        print("Exiting Spotify listener...")
+        pass
     finally:
-        sp.remove_listener(listener)
+        service.stop()
+
+def zone_configs(names: str = None) -> list:
+    """Returns the configured zones as dicts with a name and optionally a screen index, from --zones or ZONES."""
+    zones = names.split(',') if names else get_settings().get('ZONES', [])
+    return [{'name': zone.strip()} if isinstance(zone, str) else zone for zone in zones
+            if (zone.strip() if isinstance(zone, str) else zone.get('name'))]
+
+def run_zones(app, zones: list):
+    """
+    Drives one video window per zone, each following its own Spotify account, from a single process.
+    The zones share the resolver and its caches, the resolution workers, VLC and the media proxy, and poll
+    Spotify through a shared rate limiter.
+    """
+    rate_limiter = SharedRateLimiter()
+    vlc_instance = vlc.Instance('--no-xlib')
+    media_proxy = None
+    if get_settings().get('MEDIA_PROXY', False):
+        media_proxy = MediaProxy()
+        media_proxy.start()
+    quality = QualityController()
+    resolver = create_resolver(quality)
+    executor = ThreadPoolExecutor(max_workers=3 * len(zones), thread_name_prefix='resolve')
+    offline_manifest = OfflineManifest()
+    aligner = IntroAligner()
+    screens = app.screens()
+    players = []
+    for zone in zones:
+        spotify_player = SpotifyPlayer(autostart=False, zone=zone['name'], rate_limiter=rate_limiter)
+        video_player = MusicVideoPlayer(spotify_player, vlc_instance=vlc_instance, media_proxy=media_proxy,
+                                        zone=zone['name'])
+        if zone.get('screen') is not None and zone['screen'] < len(screens):
+            video_player.move(screens[zone['screen']].geometry().topLeft())
+        video_player.resize(640, 480)
+        video_player.track_stats_ready.connect(quality.record)
+        event_bus = EventBus()
+        event_bus.add_listener(MyListener(resolver, video_player, offline_manifest, executor=executor, aligner=aligner))
+        event_bus.add_listener(Prefetcher(spotify_player, resolver, video_player, offline_manifest=offline_manifest))
+        spotify_player.add_listener(event_bus)
+        players.append((spotify_player, video_player, event_bus))
+    start_metrics_server()
+    for spotify_player, _, _ in players:
+        spotify_player.start_track_updater()
+    start_warm_up(resolver)
+    return app.exec_()
 
 def main():
-    app = QtWidgets.QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Plays music videos in sync with Spotify playback.")
+    parser.add_argument('--profile-startup', action='store_true', help="Report the time spent in each import and startup phase.")
+    parser.add_argument('--download', metavar='PLAYLIST', help="Download the videos for a playlist (id, URI or URL), or 'liked' for Liked Songs, then exit.")
+    parser.add_argument('--download-workers', type=int, default=3, help="Number of parallel downloads.")
+    parser.add_argument('--zones', metavar='NAMES', help="Comma separated zone names, to drive one window per Spotify account (or set ZONES).")
+    parser.add_argument('--serve-resolver', metavar='[HOST:]PORT', nargs='?', const='',
+                        help="Run only the resolver service for other players. Listens on RESOLVER_HOST (127.0.0.1) and "
+                             "RESOLVER_PORT (8765) by default; pass e.g. 0.0.0.0:8765 to serve players on other machines.")
+    parser.add_argument('--log-level', default='INFO', help="Console log level, e.g. DEBUG to see every ranked video.")
+    args, qt_args = parser.parse_known_args()
+    profiler.enabled = args.profile_startup
+    configure_logging(args.log_level)
+
+    if args.download:
+        run_download(args.download, args.download_workers)
+        return
+
+    if args.serve_resolver is not None:
+        run_resolver_service(args.serve_resolver)
+        return
+
+    with profiler.phase("create QApplication"):
+        app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
     
     if get_settings() == {}:
         show_settings_panel()
+
+    zones = zone_configs(args.zones)
+    if zones:
+        sys.exit(run_zones(app, zones))
         
-    spotify_player = SpotifyPlayer()
-    video_player = MusicVideoPlayer(spotify_player)
-    video_player.show()
-    video_player.resize(640, 480)
-    youtube_searcher = YoutubeSearcher()
-    listener = MyListener(youtube_searcher, video_player)
+    with profiler.phase("create SpotifyPlayer"):
+        spotify_player = SpotifyPlayer(autostart=False)
+    with profiler.phase("create MusicVideoPlayer"):
+        video_player = MusicVideoPlayer(spotify_player)
+        video_player.show()
+        video_player.resize(640, 480)
+    profiler.mark("window shown")
+    quality = QualityController()
+    video_player.track_stats_ready.connect(quality.record)
+    resolver = create_resolver(quality)
+    listener = MyListener(resolver, video_player, aligner=IntroAligner())
+    prefetcher = Prefetcher(spotify_player, resolver, video_player, offline_manifest=listener.offline_manifest)
+    event_bus = EventBus()
+    event_bus.add_listener(listener)
+    event_bus.add_listener(prefetcher)
+    spotify_player.add_listener(event_bus)
+    start_metrics_server()
 
     try:
-        threading.Thread(target=run_spotify_listener, args=(listener,), daemon=True).start()
+        spotify_player.start_track_updater()
+        start_warm_up(resolver)
         sys.exit(app.exec_())
     except Exception as e:
-        print(f"An error occurred: {e}")
+        logger.error("An error occurred: %s", e)
     finally:
-        del youtube_searcher
+        del resolver
         del video_player
         app.quit()
 
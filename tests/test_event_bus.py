@@ -0,0 +1,70 @@
+import pytest
+from PyQt5 import QtCore
+
+from EventBus import EventBus
+
+
+class Listener:
+    def __init__(self):
+        self.events = []
+
+    def notify(self, event_type: str, state: dict):
+        self.events.append((event_type, state and state.get('progress_ms')))
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+@pytest.fixture
+def bus(app):
+    return EventBus()
+
+
+def state(track_id: str = 'a', progress_ms: int = 0) -> dict:
+    return {'track_id': track_id, 'progress_ms': progress_ms}
+
+
+def delivered(app, bus: EventBus) -> list:
+    listener = Listener()
+    bus.add_listener(listener)
+    app.processEvents()
+    return listener.events
+
+
+def test_repeated_events_keep_only_the_latest_state(app, bus):
+    bus.notify('track_scrub', state(progress_ms=1000))
+    bus.notify('track_scrub', state(progress_ms=2000))
+    assert delivered(app, bus) == [('track_scrub', 2000)]
+
+
+def test_scrub_is_folded_into_a_pending_update_for_the_same_track(app, bus):
+    bus.notify('track_update', state(progress_ms=0))
+    bus.notify('track_scrub', state(progress_ms=5000))
+    assert delivered(app, bus) == [('track_update', 5000)]
+
+
+def test_scrub_of_another_track_is_kept(app, bus):
+    bus.notify('track_update', state('a', 0))
+    bus.notify('track_scrub', state('b', 5000))
+    assert delivered(app, bus) == [('track_update', 0), ('track_scrub', 5000)]
+
+
+def test_update_drops_a_pending_scrub(app, bus):
+    bus.notify('track_scrub', state('a', 5000))
+    bus.notify('track_update', state('b', 0))
+    assert delivered(app, bus) == [('track_update', 0)]
+
+
+def test_play_and_pause_cancel_each_other(app, bus):
+    bus.notify('pause', state(progress_ms=1000))
+    bus.notify('play', state(progress_ms=1000))
+    assert delivered(app, bus) == [('play', 1000)]
+
+
+def test_events_keep_their_latest_order(app, bus):
+    bus.notify('pause', state(progress_ms=1000))
+    bus.notify('track_update', state('b', 0))
+    bus.notify('pause', state('b', 10))
+    assert delivered(app, bus) == [('track_update', 0), ('pause', 10)]
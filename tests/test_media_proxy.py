@@ -0,0 +1,200 @@
+import http.client
+import os
+import re
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from MediaProxy import MediaProxy, SegmentCache
+
+SEGMENT_SIZE = 64 * 1024
+DATA = os.urandom(SEGMENT_SIZE * 3 + 1234)
+
+
+class Upstream:
+    """A local HTTP server standing in for YouTube's stream servers."""
+
+    def __init__(self, data: bytes = DATA, honour_ranges: bool = True):
+        self.data = data
+        self.honour_ranges = honour_ranges
+        self.close_after = None  # Bytes of a body sent before the connection is dropped
+        self.requests = []
+        self.release = threading.Event()
+        self.release.set()
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                upstream.requests.append(self.headers.get('Range'))
+                match = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+                if match and upstream.honour_ranges:
+                    start, end = int(match.group(1)), min(int(match.group(2)), len(upstream.data) - 1)
+                    self.send_response(206)
+                    self.send_header('Content-Range', f"bytes {start}-{end}/{len(upstream.data)}")
+                else:
+                    start, end = 0, len(upstream.data) - 1
+                    self.send_response(200)
+                self.send_header('Content-Type', 'video/mp4')
+                self.send_header('Content-Length', str(end - start + 1))
+                self.end_headers()
+                body = upstream.data[start:end + 1]
+                if upstream.close_after is not None:
+                    body = body[:upstream.close_after]
+                try:
+                    # The first 4 KiB go out straight away, the rest once released
+                    self.wfile.write(body[:4096])
+                    self.wfile.flush()
+                    upstream.release.wait(10)
+                    self.wfile.write(body[4096:])
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def url(self, video_id: str = 'abc', itag: int = 18) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/videoplayback?id={video_id}&itag={itag}"
+
+    def close(self):
+        self.release.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def upstream():
+    server = Upstream()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def proxy(tmp_path):
+    proxy = MediaProxy(SegmentCache(str(tmp_path), max_bytes=SEGMENT_SIZE * 10, segment_size=SEGMENT_SIZE))
+    proxy.start()
+    yield proxy
+    proxy.stop()
+
+
+def get(url: str, byte_range: str = None) -> bytes:
+    headers = {'Range': byte_range} if byte_range else {}
+    with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=10) as response:
+        return response.read()
+
+
+def settle(proxy: MediaProxy):
+    """Waits for segments still being written to the cache after their last byte was sent."""
+    deadline = time.monotonic() + 5
+    while proxy.fetch_locks and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_serves_ranges_across_segments(proxy, upstream):
+    url = proxy.url_for(upstream.url())
+    assert get(url) == DATA
+    assert get(url, 'bytes=100-200') == DATA[100:201]
+    start, end = SEGMENT_SIZE - 10, SEGMENT_SIZE * 2 + 10
+    assert get(url, f'bytes={start}-{end}') == DATA[start:end + 1]
+    assert get(url, 'bytes=-50') == DATA[-50:]
+
+
+def test_cached_segments_are_not_fetched_again(proxy, upstream):
+    url = proxy.url_for(upstream.url())
+    get(url)
+    settle(proxy)
+    fetched = len(upstream.requests)
+    assert get(url, f'bytes={SEGMENT_SIZE}-') == DATA[SEGMENT_SIZE:]
+    assert len(upstream.requests) == fetched
+    assert not proxy.fetch_locks
+
+
+def test_upstream_that_ignores_ranges(proxy):
+    upstream = Upstream(honour_ranges=False)
+    try:
+        url = proxy.url_for(upstream.url())
+        assert get(url, f'bytes={SEGMENT_SIZE + 5}-{SEGMENT_SIZE * 2 + 5}') == DATA[SEGMENT_SIZE + 5:SEGMENT_SIZE * 2 + 6]
+    finally:
+        upstream.close()
+
+
+def test_streams_before_the_segment_is_complete(proxy, upstream):
+    url = proxy.url_for(upstream.url())
+    get(url, 'bytes=0-0')
+    upstream.release.clear()
+    with urllib.request.urlopen(urllib.request.Request(url, headers={'Range': f'bytes={SEGMENT_SIZE}-'}),
+                                timeout=5) as response:
+        # Arrives while the upstream is still holding back the rest of the segment
+        assert response.read(1024) == DATA[SEGMENT_SIZE:SEGMENT_SIZE + 1024]
+        upstream.release.set()
+        assert response.read() == DATA[SEGMENT_SIZE + 1024:]
+
+
+def test_truncated_segments_are_not_cached(proxy, upstream):
+    url = proxy.url_for(upstream.url())
+    # The length probe's one byte body still arrives whole
+    upstream.close_after = 1000
+    with pytest.raises(http.client.IncompleteRead):
+        get(url, 'bytes=0-2000')
+    assert proxy.cache.read('abc-18', 0) is None
+    upstream.close_after = None
+    assert get(url, 'bytes=0-2000') == DATA[:2001]
+    assert get(url) == DATA
+
+
+def test_failed_fetch_keeps_its_lock(proxy, upstream):
+    url = proxy.url_for(upstream.url())
+    upstream.close_after = 1000
+    with pytest.raises(http.client.IncompleteRead):
+        get(url, f'bytes={SEGMENT_SIZE}-{SEGMENT_SIZE + 2000}')
+    lock = proxy.fetch_locks[('abc-18', 1)]
+    upstream.close_after = None
+    # Callers after the failure queue on the same lock, which goes once the segment is cached
+    assert proxy._fetch_lock('abc-18', 1) is lock
+    assert get(url, f'bytes={SEGMENT_SIZE}-{SEGMENT_SIZE + 10}') == DATA[SEGMENT_SIZE:SEGMENT_SIZE + 11]
+    settle(proxy)
+    assert ('abc-18', 1) not in proxy.fetch_locks
+
+
+def test_evicting_a_file_removes_its_directory_and_upstream(tmp_path, upstream):
+    proxy = MediaProxy(SegmentCache(str(tmp_path), max_bytes=len(DATA), segment_size=SEGMENT_SIZE))
+    proxy.start()
+    try:
+        first = proxy.url_for(upstream.url('first'))
+        get(first)
+        settle(proxy)
+        second = proxy.url_for(upstream.url('second'))
+        get(second)
+        settle(proxy)
+        assert os.listdir(str(tmp_path)) == ['second-18']
+        assert list(proxy.upstreams) == ['second-18']
+        assert proxy.cache.total_bytes == len(DATA)
+    finally:
+        proxy.stop()
+
+
+def test_upstreams_are_capped(proxy, upstream):
+    proxy.max_upstreams = 3
+    for video_id in 'abcde':
+        proxy.url_for(upstream.url(video_id))
+    assert list(proxy.upstreams) == ['c-18', 'd-18', 'e-18']
+
+
+def test_cache_is_rebuilt_from_disk(tmp_path, upstream):
+    proxy = MediaProxy(SegmentCache(str(tmp_path), max_bytes=SEGMENT_SIZE * 10, segment_size=SEGMENT_SIZE))
+    proxy.start()
+    try:
+        get(proxy.url_for(upstream.url()))
+        settle(proxy)
+    finally:
+        proxy.stop()
+    cache = SegmentCache(str(tmp_path), max_bytes=SEGMENT_SIZE * 10, segment_size=SEGMENT_SIZE)
+    assert cache.total_bytes == len(DATA)
+    assert cache.key_segments == {'abc-18': 4}
+    assert cache.read('abc-18', 3) == DATA[SEGMENT_SIZE * 3:]
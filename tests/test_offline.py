@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+from OfflineDownloader import OfflineDownloader, OfflineManifest
+from Prefetcher import Prefetcher
+
+
+class FakeSpotify:
+    """Stands in for spotipy: serves saved tracks three to a page, recording each request."""
+
+    def __init__(self, log: list, count: int = 7):
+        self.log = log
+        self.items = [{'track': {'id': str(index)}} for index in range(count)]
+
+    def page(self, offset: int) -> dict:
+        self.log.append('request')
+        more = offset + 3 < len(self.items)
+        return {'items': self.items[offset:offset + 3], 'next': more, 'offset': offset}
+
+    def current_user_saved_tracks(self, limit: int = 50) -> dict:
+        return self.page(0)
+
+    def next(self, page: dict) -> dict:
+        return self.page(page['offset'] + 3)
+
+
+class FakeSpotifyPlayer:
+    def __init__(self, upcoming: list = ()):
+        self.log = []
+        self.sp = FakeSpotify(self.log)
+        self.upcoming = list(upcoming)
+
+    def throttle(self):
+        self.log.append('throttle')
+
+    def track_from_item(self, item: dict) -> dict:
+        return {'track_id': item['id'], 'track': item['id']}
+
+    def get_upcoming_tracks(self, count: int) -> list:
+        return self.upcoming[:count]
+
+
+def test_every_page_waits_for_the_rate_limiter(tmp_path):
+    spotify_player = FakeSpotifyPlayer()
+    downloader = OfflineDownloader(spotify_player, resolver=None, manifest=OfflineManifest(str(tmp_path)))
+    assert [track['track_id'] for track in downloader.saved_tracks()] == [str(index) for index in range(7)]
+    assert spotify_player.log == ['throttle', 'request'] * 3
+
+
+def test_downloaded_tracks_are_not_prefetched(tmp_path):
+    manifest = OfflineManifest(str(tmp_path))
+    path = tmp_path / 'downloaded.mp4'
+    path.write_bytes(b'')
+    manifest.update('downloaded', {'status': 'done', 'path': str(path)})
+    upcoming = [{'track_id': 'downloaded', 'track': 'Downloaded'}, {'track_id': 'new', 'track': 'New'}]
+    resolved = []
+    resolver = SimpleNamespace(resolve=lambda track: resolved.append(track['track_id']) or (None, (None, None, None)))
+    prefetcher = Prefetcher(FakeSpotifyPlayer(upcoming), resolver, offline_manifest=manifest)
+    prefetcher.prefetch_queue()
+    prefetcher.executor.shutdown(wait=True)
+    assert resolved == ['new']
@@ -0,0 +1,54 @@
+import pytest
+
+from PlaybackClock import PlaybackClock
+
+
+def poll(track_id: str = 'a', progress_ms: float = 5000, is_playing: bool = True, timestamp: int = 1) -> dict:
+    return {'track_id': track_id, 'progress_ms': progress_ms, 'is_playing': is_playing, 'timestamp': timestamp}
+
+
+def test_sample_is_taken_halfway_through_the_round_trip():
+    clock = PlaybackClock()
+    clock.update(poll(progress_ms=5000), 10.0, 10.2)
+    assert clock.position(10.1) == pytest.approx(5000)
+    assert clock.position(11.1) == pytest.approx(6000)
+    assert clock.latency_ms == pytest.approx(200)
+
+
+def test_small_disagreements_are_smoothed():
+    clock = PlaybackClock(smoothing=0.2)
+    clock.update(poll(progress_ms=5000, timestamp=1), 10.0, 10.0)
+    # 100 ms ahead of the estimate, with a new timestamp as Spotify sends on every poll
+    clock.update(poll(progress_ms=6100, timestamp=2), 11.0, 11.0)
+    assert clock.position(11.0) == pytest.approx(6020)
+
+
+def test_large_disagreements_reset_the_estimate():
+    clock = PlaybackClock(reset_threshold_ms=1500)
+    clock.update(poll(progress_ms=5000), 10.0, 10.0)
+    clock.update(poll(progress_ms=30000), 11.0, 11.0)
+    assert clock.position(11.0) == pytest.approx(30000)
+
+
+def test_track_change_resets_the_estimate():
+    clock = PlaybackClock()
+    clock.update(poll(progress_ms=5000), 10.0, 10.0)
+    clock.update(poll(track_id='b', progress_ms=1100), 11.0, 11.0)
+    assert clock.position(11.0) == pytest.approx(1100)
+    assert clock.track_id == 'b'
+
+
+def test_pause_freezes_and_resume_resets():
+    clock = PlaybackClock()
+    clock.update(poll(progress_ms=5000), 10.0, 10.0)
+    clock.update(poll(progress_ms=6050, is_playing=False), 11.0, 11.0)
+    assert clock.position(20.0) == 6050
+    clock.update(poll(progress_ms=6100), 30.0, 30.0)
+    assert clock.position(31.0) == pytest.approx(7100)
+
+
+def test_clear():
+    clock = PlaybackClock()
+    clock.update(poll(), 10.0, 10.0)
+    clock.clear()
+    assert clock.position(10.0) is None
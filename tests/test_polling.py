@@ -0,0 +1,141 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import spotipy
+
+from PollScheduler import AdaptivePollScheduler, SharedRateLimiter
+from SpotifyPlayer import create_session
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = AdaptivePollScheduler(1.0)
+    scheduler.min_interval = 0.25
+    scheduler.idle_interval = 15.0
+    scheduler.current_idle_interval = 1.0
+    return scheduler
+
+
+def playing(remaining_s: float, is_playing: bool = True) -> dict:
+    return {'is_playing': is_playing, 'time_of_update': time.time(), 'duration_ms': 200000,
+            'progress_ms': 200000 - remaining_s * 1000}
+
+
+def test_steady_interval_while_playing(scheduler):
+    assert scheduler.next_interval(playing(60)) == 1.0
+
+
+def test_wakes_as_the_boundary_window_opens(scheduler):
+    assert scheduler.next_interval(playing(2.5)) == pytest.approx(0.5, abs=0.01)
+
+
+def test_never_polls_faster_than_min_interval_before_the_boundary(scheduler):
+    assert scheduler.next_interval(playing(2.01)) == 0.25
+
+
+def test_polls_just_after_the_boundary(scheduler):
+    assert scheduler.next_interval(playing(0.5)) == pytest.approx(0.75, abs=0.01)
+    assert scheduler.next_interval(playing(-3)) == 0.25
+
+
+def test_backs_off_while_paused(scheduler):
+    intervals = [scheduler.next_interval(playing(60, is_playing=False)) for _ in range(10)]
+    assert intervals[:3] == pytest.approx([1.0, 1.5, 2.25])
+    assert intervals[-1] == 15.0
+    assert scheduler.next_interval(playing(60)) == 1.0
+    assert scheduler.next_interval(None) == 1.0
+
+
+def test_burst_after_poll_now(scheduler):
+    scheduler.poll_now()
+    assert scheduler.next_interval(playing(60)) == 0.25
+
+
+@pytest.mark.parametrize('headers, expected', [
+    ({'Retry-After': '7'}, 7.0),
+    ({'Retry-After': '0'}, 0.25),
+    ({'Retry-After': 'soon'}, 15.0),
+    ({}, 15.0),
+    (None, 15.0),
+])
+def test_retry_after(scheduler, headers, expected):
+    assert scheduler.retry_after(headers) == expected
+
+
+def test_rate_limiter_backoff_pauses_acquire():
+    limiter = SharedRateLimiter(rate=100, burst=5)
+    limiter.acquire()
+    limiter.backoff(0.3)
+    started = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started >= 0.29
+
+
+def test_rate_limiter_spreads_requests():
+    limiter = SharedRateLimiter(rate=20, burst=1)
+    started = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+    # The first token is there already, the other four take 50 ms each
+    assert time.monotonic() - started >= 0.19
+
+
+class FlakyApi:
+    """Answers /flaky with 500 twice before succeeding, and /limited with a 429 and a Retry-After."""
+
+    def __init__(self):
+        self.hits = {'flaky': 0, 'limited': 0}
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                name = self.path.strip('/').split('?')[0]
+                api.hits[name] += 1
+                status = 429 if name == 'limited' else 500 if api.hits[name] <= 2 else 200
+                body = b'{"ok": true}' if status == 200 else b'{"error": {"status": %d, "message": "x"}}' % status
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Retry-After', '7')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def prefix(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+
+@pytest.fixture
+def api():
+    api = FlakyApi()
+    yield api
+    api.server.shutdown()
+    api.server.server_close()
+
+
+def test_session_retries_server_errors(api):
+    sp = spotipy.Spotify(auth='token', requests_session=create_session())
+    sp.prefix = api.prefix
+    assert sp._get('flaky') == {'ok': True}
+    assert api.hits['flaky'] == 3
+
+
+def test_session_leaves_429_to_the_scheduler(api):
+    sp = spotipy.Spotify(auth='token', requests_session=create_session())
+    sp.prefix = api.prefix
+    started = time.monotonic()
+    with pytest.raises(spotipy.SpotifyException) as error:
+        sp._get('limited')
+    assert error.value.http_status == 429
+    assert api.hits['limited'] == 1
+    assert time.monotonic() - started < 1
+    assert AdaptivePollScheduler().retry_after(error.value.headers) == 7.0
@@ -0,0 +1,75 @@
+import copy
+import json
+import os
+
+import pytest
+
+from YoutubeSearcher import YoutubeSearcher
+
+CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'corpus.json')
+
+with open(CORPUS, 'r', encoding='utf-8') as f:
+    CASES = json.load(f)['cases']
+
+
+def baseline_rank(searcher: YoutubeSearcher, entries: list, track: dict) -> list:
+    """The original rank_videos, scoring each entry with text_similarity, which the ranking must keep agreeing with."""
+    for result in entries:
+        result['rank'] = searcher.text_similarity(result, track)
+    results = [result for result in entries if result['rank'] >= 50]
+    results.sort(key=lambda x: x['view_count'], reverse=True)
+    for i, item in enumerate(results[:3]):
+        item['rank'] += [10, 6, 3][i]
+    results = [item for item in results if abs(item['duration'] - track['duration_ms'] / 1000) <= 40]
+    results.sort(key=lambda x: abs(x['duration'] - track['duration_ms'] / 1000))
+    for i, item in enumerate(results[:3]):
+        item['rank'] -= [6, 4, 2][i]
+    good_words = {"official": 12, "music video": 18, "mv": 15, "lyric": 8, 'live': -10, "Official HD Video": 12,
+                  "Official Music Video": 12, "Animated": 10}
+    for item in results:
+        for word, score in good_words.items():
+            if word.lower() in item['title'].lower():
+                item['rank'] += score
+    bad_words = ["歌ってみた", 'sped up', "fan-made", "acoustic ver", "remix", "cover", "live", "instrumental",
+                 "vocal only", "Instrument", "slowed", "reverb"]
+    results = [item for item in results if not any(
+        bad_word.lower() in item['title'].replace(track['track'], '').lower() for bad_word in bad_words)]
+    for item in results:
+        if track['artists'][0].lower() in item['channel'].lower():
+            item['rank'] += 20
+    for item in results:
+        if item.get('channel_is_verified', True):
+            item['rank'] += 30
+            for other in results:
+                if track['track'].lower() in other['title'].lower():
+                    other['rank'] += 20
+    results.sort(key=lambda x: x['rank'], reverse=True)
+    return results
+
+
+@pytest.fixture(scope='module')
+def searcher():
+    return YoutubeSearcher(warm_up=False)
+
+
+def ranked(searcher: YoutubeSearcher, case: dict) -> list:
+    entries = searcher.filter_entries(copy.deepcopy(case['search_results']))
+    return searcher.rank_videos({'entries': entries}, case['track'])
+
+
+@pytest.mark.parametrize('case', CASES, ids=[case['name'] for case in CASES])
+def test_ranking_matches_baseline(searcher, case):
+    entries = searcher.filter_entries(copy.deepcopy(case['search_results']))
+    expected = baseline_rank(searcher, entries, case['track'])
+    actual = ranked(searcher, case)
+    assert [item['id'] for item in actual] == [item['id'] for item in expected]
+    assert [item['rank'] for item in actual] == pytest.approx([item['rank'] for item in expected])
+
+
+@pytest.mark.parametrize('case', CASES, ids=[case['name'] for case in CASES])
+def test_confidence_counts_title_match_once(searcher, case):
+    for item in ranked(searcher, case):
+        breakdown = item['score_breakdown']
+        once = item['rank'] - breakdown.get('views', 0) - breakdown.get('duration', 0) \
+            - breakdown.get('title_match', 0) + (20 if breakdown.get('title_match') else 0)
+        assert searcher.confidence_score(item) == pytest.approx(once)
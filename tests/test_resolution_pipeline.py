@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+from PyQt5 import QtCore
+
+from ResolutionPipeline import ResolutionPipeline
+
+
+class FakeResolver:
+    """Stands in for TrackResolver: holds each resolution until its track is released."""
+
+    def __init__(self):
+        self.releases = {}
+        self.cancelled = {}
+        self.done = {}
+
+    def resolve(self, track: dict, cancelled=None) -> tuple:
+        name = track['track']
+        self.releases.setdefault(name, threading.Event()).wait(5)
+        self.cancelled[name] = cancelled()
+        self.done.setdefault(name, threading.Event()).set()
+        return {'id': name}, (None, None, name)
+
+    def release(self, name: str):
+        self.releases.setdefault(name, threading.Event()).set()
+        self.done.setdefault(name, threading.Event()).wait(5)
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+@pytest.fixture
+def resolver():
+    return FakeResolver()
+
+
+@pytest.fixture
+def pipeline(app, resolver):
+    pipeline = ResolutionPipeline(resolver, workers=2)
+    pipeline.delivered = []
+    pipeline.resolved.connect(lambda track, video, streams: pipeline.delivered.append(track['track']))
+    yield pipeline
+    pipeline.executor.shutdown(wait=False)
+
+
+def track(name: str) -> dict:
+    return {'track_id': name, 'track': name}
+
+
+def process(app):
+    """Runs the Qt event loop briefly so results queued from worker threads are delivered."""
+    deadline = time.monotonic() + 0.2
+    while time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+
+
+def test_current_track_is_delivered(app, resolver, pipeline):
+    pipeline.submit(track('a'))
+    resolver.release('a')
+    process(app)
+    assert pipeline.delivered == ['a']
+    assert resolver.cancelled == {'a': False}
+
+
+def test_superseded_resolution_is_cancelled_and_discarded(app, resolver, pipeline):
+    pipeline.submit(track('a'))
+    pipeline.submit(track('b'))
+    resolver.release('a')
+    resolver.release('b')
+    process(app)
+    assert pipeline.delivered == ['b']
+    assert resolver.cancelled == {'a': True, 'b': False}
+
+
+def test_result_queued_before_a_newer_submit_is_discarded(app, resolver, pipeline):
+    pipeline.submit(track('a'))
+    resolver.release('a')
+    # Finished but not yet delivered on the main thread
+    time.sleep(0.05)
+    pipeline.submit(track('b'))
+    resolver.release('b')
+    process(app)
+    assert pipeline.delivered == ['b']
+
+
+def test_cancel_discards_pending_work(app, resolver, pipeline):
+    pipeline.submit(track('a'))
+    pipeline.cancel()
+    resolver.release('a')
+    process(app)
+    assert pipeline.delivered == []
+    assert resolver.cancelled == {'a': True}
@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+from YoutubeSearcher import YoutubeSearcher, get_tokenizer
+
+LATIN_TRACK = {'track': 'Bohemian Rhapsody', 'artists': ['Queen'], 'duration_ms': 354000, 'track_id': 'latin'}
+JAPANESE_TRACK = {'track': '夜に駆ける', 'artists': ['YOASOBI'], 'duration_ms': 261000, 'track_id': 'japanese'}
+
+LATIN_ENTRIES = [
+    {'title': 'Queen – Bohemian Rhapsody (Official Video Remastered)', 'channel': 'Queen Official'},
+    {'title': 'Bohemian Rhapsody (Live Aid 1985)', 'channel': 'Queen Official'},
+    {'title': 'bohemian rhapsody piano cover', 'channel': 'Some Pianist'},
+    {'title': 'Queen - Bohemian Rhapsody (Lyrics)', 'channel': 'Lyric Uploads'},
+    {'title': 'Wayne\'s World headbang scene', 'channel': 'Movieclips'},
+    {'title': '!!', 'channel': '?'},
+]
+JAPANESE_ENTRIES = [
+    {'title': 'YOASOBI「夜に駆ける」 Official Music Video', 'channel': 'Ayase / YOASOBI'},
+    {'title': 'YOASOBI - 夜に駆ける / THE FIRST TAKE', 'channel': 'THE FIRST TAKE'},
+    {'title': '夜に駆ける / YOASOBI 歌ってみた', 'channel': 'Utaite Channel'},
+    {'title': 'Racing Into The Night (English Cover)', 'channel': 'Cover Artist'},
+    {'title': '【歌詞付き】夜に駆ける', 'channel': '歌詞チャンネル'},
+]
+
+
+@pytest.fixture(scope='module')
+def searcher():
+    return YoutubeSearcher(warm_up=False)
+
+
+@pytest.mark.parametrize('track, entries', [
+    (LATIN_TRACK, LATIN_ENTRIES),
+    (JAPANESE_TRACK, JAPANESE_ENTRIES),
+    (JAPANESE_TRACK, LATIN_ENTRIES + JAPANESE_ENTRIES),
+], ids=['latin', 'japanese', 'mixed'])
+def test_batched_scores_match_reference(searcher, track, entries):
+    batched = searcher.similarity_scores(entries, track)
+    reference = [searcher.text_similarity(entry, track) for entry in entries]
+    assert batched == pytest.approx(reference)
+
+
+def test_no_entries(searcher):
+    assert searcher.similarity_scores([], LATIN_TRACK) == []
+
+
+def test_tokenizer_per_thread():
+    tokenizers = []
+    threads = [threading.Thread(target=lambda: tokenizers.append(get_tokenizer())) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert tokenizers[0] is not tokenizers[1]
+    assert get_tokenizer() is get_tokenizer()
@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from QualityController import Quality
+from StreamCache import StreamCache
+
+
+class Extractor:
+    """Stands in for yt-dlp: returns stream URLs expiring ttl seconds from now and counts the calls."""
+
+    def __init__(self, ttl: float = 3600):
+        self.ttl = ttl
+        self.calls = []
+
+    def __call__(self, video_url: str, max_height: int, codecs: tuple, light_codec: bool) -> tuple:
+        self.calls.append((video_url, max_height))
+        expire = int(time.time() + self.ttl)
+        return (f'https://rr1.googlevideo.com/videoplayback?expire={expire}&itag=137',
+                f'https://rr1.googlevideo.com/videoplayback/expire/{expire + 100}/itag/140',
+                None)
+
+
+@pytest.fixture
+def extractor():
+    return Extractor()
+
+
+@pytest.fixture
+def cache(extractor):
+    return StreamCache(extractor, max_entries=2, expiry_margin=300, refresh_interval=3600, refresh_window=600)
+
+
+def test_expiry_is_parsed_from_query_and_path_urls(cache):
+    streams = ('https://host/videoplayback?id=1&expire=2000&itag=18', 'https://host/videoplayback/expire/1500/itag/140')
+    assert cache.expires_at(streams) == 1500
+    assert cache.expires_at((None, 'https://host/videoplayback?id=1&expire=1750', None)) == 1750
+
+
+def test_urls_without_an_expiry_get_the_default_ttl(cache):
+    assert cache.expires_at(('https://host/video.mp4',)) == pytest.approx(time.time() + cache.default_ttl, abs=2)
+
+
+def test_streams_are_resolved_once_per_quality(cache, extractor):
+    low, high = Quality(360, ()), Quality(1080, ())
+    first = cache.get_streams('a', 'url-a', low)
+    assert cache.get_streams('a', 'url-a', low) == first
+    cache.get_streams('a', 'url-a', high)
+    assert extractor.calls == [('url-a', 360), ('url-a', 1080)]
+
+
+def test_streams_within_the_margin_are_stale(cache, extractor):
+    extractor.ttl = 200
+    cache.get_streams('a', 'url-a')
+    cache.get_streams('a', 'url-a')
+    assert len(extractor.calls) == 2
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    for video_id in 'abc':
+        cache.get_streams(video_id, f'url-{video_id}')
+    assert [video_id for video_id, _ in cache.entries] == ['b', 'c']
+
+
+def test_only_recently_used_entries_are_refreshed(cache, extractor):
+    extractor.ttl = 1000
+    cache.get_streams('recent', 'url-recent')
+    cache.get_streams('idle', 'url-idle')
+    cache.entries[('idle', Quality(720, ()))]['last_used'] -= cache.refresh_window + 1
+    extractor.calls.clear()
+    cache.refresh_stale()
+    assert extractor.calls == [('url-recent', 720)]
+
+
+def test_expired_idle_entries_are_dropped(cache):
+    cache.get_streams('a', 'url-a')
+    entry = cache.entries[('a', Quality(720, ()))]
+    entry['last_used'] -= cache.refresh_window + 1
+    entry['expires_at'] = time.time() - 1
+    cache.refresh_stale()
+    assert not cache.entries
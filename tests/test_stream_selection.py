@@ -0,0 +1,75 @@
+import pytest
+
+from YoutubeSearcher import YoutubeSearcher, YoutubeDLPool
+
+FORMATS = [
+    {'format_id': '137', 'url': 'vp09-1080', 'vcodec': 'vp09.00.40.08', 'acodec': 'none', 'height': 1080, 'vbr': 2500},
+    {'format_id': '136', 'url': 'avc1-720', 'vcodec': 'avc1.4d401f', 'acodec': 'none', 'height': 720, 'vbr': 1500},
+    {'format_id': '247', 'url': 'vp09-720', 'vcodec': 'vp09.00.31.08', 'acodec': 'none', 'height': 720, 'vbr': 1200},
+    {'format_id': '140', 'url': 'audio', 'vcodec': 'none', 'acodec': 'mp4a.40.2', 'abr': 128},
+    {'format_id': '22', 'url': 'combined-720', 'vcodec': 'vp09.00.31.08', 'acodec': 'opus', 'height': 720},
+    {'format_id': '18', 'url': 'combined-360', 'vcodec': 'avc1.42001E', 'acodec': 'mp4a.40.2', 'height': 360},
+]
+
+
+class FakeYoutubeDL:
+    """Stands in for yt_dlp.YoutubeDL, returning a fixed list of formats."""
+
+    def __init__(self, opts: dict):
+        self.opts = opts
+
+    def get_info_extractor(self, name: str):
+        return None
+
+    def extract_info(self, url: str, download: bool = False) -> dict:
+        return {'formats': FORMATS}
+
+
+@pytest.fixture
+def searcher():
+    return YoutubeSearcher(warm_up=False, ydl_factory=FakeYoutubeDL)
+
+
+def test_height_comes_before_the_codec_preference(searcher):
+    video, audio, combined = searcher.get_video_streams('url', 1080, ('avc1', 'vp09'))
+    assert (video, audio, combined) == ('vp09-1080', 'audio', 'combined-720')
+
+
+def test_codec_preference_breaks_ties_within_a_height(searcher):
+    assert searcher.get_video_streams('url', 720, ('avc1', 'vp09'))[0] == 'avc1-720'
+    assert searcher.get_video_streams('url', 720, ('vp09', 'avc1'))[0] == 'vp09-720'
+
+
+def test_light_codec_comes_before_the_height(searcher):
+    video, _, combined = searcher.get_video_streams('url', 1080, ('avc1',), light_codec=True)
+    assert (video, combined) == ('avc1-720', 'combined-360')
+
+
+def test_pool_slot_is_freed_when_creating_an_instance_fails():
+    attempts = []
+
+    def factory(opts: dict):
+        attempts.append(opts)
+        if len(attempts) == 1:
+            raise RuntimeError('no network')
+        return FakeYoutubeDL(opts)
+
+    pool = YoutubeDLPool({}, size=1, factory=factory)
+    with pytest.raises(RuntimeError):
+        with pool.borrow():
+            pass
+    assert pool.created == 0
+    # Without the slot back the next borrow would wait forever for an idle instance
+    with pool.borrow() as ydl:
+        assert isinstance(ydl, FakeYoutubeDL)
+    assert pool.created == 1
+
+
+def test_prewarm_stops_counting_failed_instances():
+    def factory(opts: dict):
+        raise RuntimeError('no network')
+
+    pool = YoutubeDLPool({}, size=2, factory=factory)
+    with pytest.raises(RuntimeError):
+        pool.prewarm()
+    assert pool.created == 0
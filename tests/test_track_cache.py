@@ -0,0 +1,91 @@
+import json
+import time
+
+import pytest
+
+from TrackCache import TrackCache
+
+
+def video(video_id: str) -> dict:
+    return {'id': video_id, 'url': f'https://www.youtube.com/watch?v={video_id}', 'title': video_id, 'rank': 100}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'track_cache.json')
+
+
+def test_least_recently_used_entries_are_evicted(path):
+    cache = TrackCache(path, max_entries=2, save_delay=0)
+    cache.put('a', video('1'))
+    cache.put('b', video('2'))
+    assert cache.get('a')['id'] == '1'
+    cache.put('c', video('3'))
+    assert cache.get('b') is None
+    assert cache.get('a')['id'] == '1'
+    assert cache.get('c')['id'] == '3'
+
+
+def test_expired_entries_are_missed(path):
+    cache = TrackCache(path, ttl=60, save_delay=0)
+    cache.put('a', video('1'))
+    cache.entries['a']['cached_at'] -= 61
+    assert cache.get('a') is None
+    assert 'a' not in cache.entries
+
+
+def test_invalidate_rejects_the_cached_match(path):
+    cache = TrackCache(path, save_delay=0)
+    cache.put('a', video('1'))
+    assert cache.invalidate('a')
+    assert cache.get('a') is None
+    assert cache.rejected('a') == ['1']
+    # A new match keeps the earlier rejections
+    cache.put('a', video('2'))
+    assert cache.get('a')['id'] == '2'
+    assert cache.rejected('a') == ['1']
+    assert not cache.invalidate('unknown')
+
+
+def test_failed_videos_are_skipped_until_they_expire(path):
+    cache = TrackCache(path, save_delay=0)
+    cache.put('a', video('1'))
+    cache.mark_failed('1')
+    assert cache.get('a') is None
+    assert cache.failed_videos() == ['1']
+    cache.failed['1'] -= cache.failed_ttl + 1
+    assert cache.failed_videos() == []
+    assert cache.get('a')['id'] == '1'
+
+
+def test_entries_survive_a_reload(path):
+    cache = TrackCache(path, save_delay=0)
+    cache.put('a', video('1'))
+    cache.put('b', video('2'))
+    cache.invalidate('b')
+    cache.mark_failed('3')
+    reloaded = TrackCache(path, save_delay=0)
+    assert reloaded.get('a')['id'] == '1'
+    assert reloaded.rejected('b') == ['2']
+    assert reloaded.failed_videos() == ['3']
+
+
+def test_load_applies_the_ttl_and_size_limits(path):
+    now = time.time()
+    entries = [{'track_id': track_id, 'cached_at': cached_at, 'video': video(track_id), 'rejected': []}
+               for track_id, cached_at in [('old', now - 120), ('a', now), ('b', now), ('c', now)]]
+    with open(path, 'w') as f:
+        json.dump({'entries': entries, 'failed': {'stale': now - 10 ** 8, 'fresh': now}}, f)
+    cache = TrackCache(path, max_entries=2, ttl=60, save_delay=0)
+    assert list(cache.entries) == ['b', 'c']
+    assert cache.failed_videos() == ['fresh']
+
+
+def test_scheduled_saves_are_written_on_flush(path):
+    cache = TrackCache(path, save_delay=60)
+    cache.put('a', video('1'))
+    cache.put('b', video('2'))
+    assert cache.save_timer is not None
+    cache.flush()
+    assert cache.save_timer is None
+    assert TrackCache(path, save_delay=0).get('b')['id'] == '2'
@@ -0,0 +1,163 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from StreamCache import StreamCache
+from TrackCache import TrackCache
+from TrackResolver import TrackResolver, NO_STREAMS
+
+TRACK = {'track_id': 'track', 'track': 'Song', 'artists': ['Artist'], 'duration_ms': 200000}
+
+
+def video(video_id: str) -> dict:
+    return {'id': video_id, 'url': f'https://www.youtube.com/watch?v={video_id}', 'title': video_id, 'rank': 100}
+
+
+def streams(video_id: str) -> tuple:
+    return None, None, f'https://fixture.invalid/{video_id}?expire={int(time.time()) + 3600}'
+
+
+class FakeSearcher:
+    """Stands in for YoutubeSearcher: returns fixed candidates, optionally holding searches until released."""
+
+    def __init__(self, candidates: list):
+        self.candidates = candidates
+        self.searches = 0
+        self.release = threading.Event()
+        self.release.set()
+        self.search_tiers = SimpleNamespace(reject=lambda tier: None)
+
+    def search_candidates(self, track: dict, count: int, exclude: list = (), tiered: bool = True) -> list:
+        self.searches += 1
+        self.release.wait(5)
+        return [candidate for candidate in self.candidates if candidate['id'] not in exclude][:count]
+
+
+@pytest.fixture
+def searcher():
+    return FakeSearcher([video('a'), video('b'), video('c')])
+
+
+def make_resolver(tmp_path, searcher: FakeSearcher, extract) -> TrackResolver:
+    track_cache = TrackCache(str(tmp_path / 'track_cache.json'), 100, save_delay=0)
+    stream_cache = StreamCache(lambda url, height, codecs, light_codec: extract(url.rsplit('=', 1)[-1]), max_entries=100)
+    return TrackResolver(searcher, track_cache, stream_cache, candidates=3, workers=6)
+
+
+def wait_for(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert condition()
+
+
+def test_concurrent_calls_share_one_resolution(tmp_path, searcher):
+    resolver = make_resolver(tmp_path, searcher, streams)
+    searcher.release.clear()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(resolver.resolve(TRACK))) for _ in range(4)]
+    threads[0].start()
+    wait_for(lambda: resolver.in_flight)
+    for thread in threads[1:]:
+        thread.start()
+    wait_for(lambda: len(next(iter(resolver.in_flight.values()))['checks']) == 4)
+    searcher.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert searcher.searches == 1
+    assert [result[0]['id'] for result in results] == ['a'] * 4
+    assert not resolver.in_flight
+
+
+def test_cancelled_only_once_every_caller_cancelled(tmp_path, searcher):
+    resolver = make_resolver(tmp_path, searcher, streams)
+    searcher.release.clear()
+    results = {}
+    owner_cancelled = threading.Event()
+    owner = threading.Thread(target=lambda: results.update(owner=resolver.resolve(TRACK, owner_cancelled.is_set)))
+    joiner = threading.Thread(target=lambda: results.update(joiner=resolver.resolve(TRACK, cancelled=lambda: False)))
+    owner.start()
+    wait_for(lambda: resolver.in_flight)
+    joiner.start()
+    wait_for(lambda: len(next(iter(resolver.in_flight.values()))['checks']) == 2)
+    owner_cancelled.set()
+    searcher.release.set()
+    owner.join(5)
+    joiner.join(5)
+    assert results['owner'][0]['id'] == 'a'
+    assert results['joiner'][0]['id'] == 'a'
+    assert searcher.searches == 1
+
+
+def test_joining_a_cancelled_resolution_resolves_again(tmp_path, searcher):
+    resolver = make_resolver(tmp_path, searcher, streams)
+    searcher.release.clear()
+    results = {}
+    land = resolver._land
+
+    def land_after_a_late_join(key):
+        # The owner has given up; a caller that still wants the track arrives before the result is published
+        flight = resolver.in_flight[key]
+        joiner = threading.Thread(target=lambda: results.update(joiner=resolver.resolve(TRACK)))
+        joiner.start()
+        wait_for(lambda: len(flight['checks']) == 2)
+        results['joiner_thread'] = joiner
+        resolver._land = land
+        land(key)
+
+    resolver._land = land_after_a_late_join
+    owner_cancelled = threading.Event()
+    owner = threading.Thread(target=lambda: results.update(owner=resolver.resolve(TRACK, owner_cancelled.is_set)))
+    owner.start()
+    wait_for(lambda: resolver.in_flight)
+    # Cancelled while searching, so the resolution stops once the search returns
+    owner_cancelled.set()
+    searcher.release.set()
+    owner.join(5)
+    results['joiner_thread'].join(5)
+    assert results['owner'] == (None, NO_STREAMS)
+    assert results['joiner'][0]['id'] == 'a'
+    assert searcher.searches == 2
+    assert resolver.track_cache.failed_videos() == []
+    assert not resolver.in_flight
+
+
+def extract_with(delays: dict, unplayable: set = (), errors: set = ()):
+    """Extracts streams after a per-video delay, failing the unplayable videos and raising for the erroring ones."""
+    def extract(video_id: str) -> tuple:
+        time.sleep(delays.get(video_id, 0))
+        if video_id in errors:
+            raise RuntimeError('extraction failed')
+        return (None, None, None) if video_id in unplayable else streams(video_id)
+    return extract
+
+
+def test_best_ranked_playable_candidate_wins_over_a_faster_one(tmp_path, searcher):
+    resolver = make_resolver(tmp_path, searcher, extract_with({'a': 0.2}))
+    chosen, _, failed = resolver.first_playable([video('a'), video('b'), video('c')])
+    assert chosen['id'] == 'a'
+    assert failed == []
+
+
+def test_falls_back_in_rank_order(tmp_path, searcher):
+    resolver = make_resolver(tmp_path, searcher, extract_with({'b': 0.2}, unplayable={'a'}, errors={'c'}))
+    chosen, _, failed = resolver.first_playable([video('a'), video('b'), video('c')])
+    assert chosen['id'] == 'b'
+    # c failed before b was found playable, so it is reported too
+    assert failed == ['a', 'c']
+
+
+def test_failed_candidates_are_remembered_once_one_plays(tmp_path, searcher):
+    resolver = make_resolver(tmp_path, searcher, extract_with({}, unplayable={'a'}, errors={'b'}))
+    chosen, _ = resolver.resolve(TRACK)
+    assert chosen['id'] == 'c'
+    assert sorted(resolver.track_cache.failed_videos()) == ['a', 'b']
+    assert resolver.track_cache.get(TRACK['track_id'])['id'] == 'c'
+
+
+def test_nothing_is_remembered_when_no_candidate_plays(tmp_path, searcher):
+    resolver = make_resolver(tmp_path, searcher, extract_with({}, unplayable={'a', 'b', 'c'}))
+    assert resolver.resolve(TRACK) == (None, NO_STREAMS)
+    assert resolver.track_cache.failed_videos() == []